@@ -1,53 +1,54 @@
 from flask import Flask
 from flask_cors import CORS
 from config import Config
-from werkzeug.security import generate_password_hash
 from extensions import db, cache, mail
-from celery_app import create_celery
-from models import User
+from celery_app import init_celery
+from utils.spot_allocator import spot_allocator
+from commands import register_commands
+from utils.auth import init_token_cache
+from utils.occupancy_events import occupancy_events
+from utils.metrics import init_metrics
+from utils.compression import init_compression
+from utils.db_tuning import configure_engine_options, init_db_tuning
+from migrations import bootstrap
 from routes.auth_routes import auth_bp
 from routes.admin_routes import admin_bp
 from routes.user_routes import user_bp
-# from tasks import schedule_monthly_reports, send_daily_reminders
+from routes.event_routes import events_bp
 
-celery = None 
-def create_app():
-    global celery
+
+def create_app(config_class=Config):
+    """Builds the app without touching the database: run `flask bootstrap`
+    once per deploy to create the schema and the admin account."""
     app = Flask(__name__, static_folder=None)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
 
     CORS(app, resources={r"/api/*": {"origins": ["http://localhost:5173"], "supports_credentials": True}})
 
+    configure_engine_options(app)
     db.init_app(app)
+    init_db_tuning(app)
     cache.init_app(app)
     mail.init_app(app)
 
-    celery = create_celery(app)
-    
-    with app.app_context():
-        db.create_all()
-
-        admin = User.query.filter_by(username=app.config['ADMIN_USERNAME']).first()
-        if not admin:
-            admin = User(
-                username=app.config['ADMIN_USERNAME'],
-                password=generate_password_hash(app.config['ADMIN_PASSWORD']),
-                full_name='Parking Admin',
-                role='admin',
-                email='admin@parkingapp.com'
-            )
-            db.session.add(admin)
-            db.session.commit()
+    init_celery(app)
+
+    spot_allocator.init_app(app)
+    init_token_cache(app)
+    occupancy_events.init_app(app)
+    init_metrics(app)
+    init_compression(app)
+    register_commands(app)
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     app.register_blueprint(user_bp, url_prefix='/api/user')
+    app.register_blueprint(events_bp, url_prefix='/api/events')
 
     return app
 
-# send_daily_reminders.delay()
-# schedule_monthly_reports.delay()
-
 if __name__ == '__main__':
     app = create_app()
+    with app.app_context():
+        bootstrap()
     app.run(debug=True, use_reloader=False)
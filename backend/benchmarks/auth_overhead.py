@@ -0,0 +1,46 @@
+"""Per-request cost of token_required with and without the token cache.
+
+    python -m benchmarks.auth_overhead --requests 5000
+"""
+import argparse
+import time
+from flask import request
+from extensions import db
+from utils.auth import token_required, token_cache
+from benchmarks.common import make_app, seed_users, auth_headers, QueryCounter
+
+
+@token_required
+def whoami():
+    return request.current_user.id
+
+
+def measure(app, headers, n, label):
+    with app.app_context(), QueryCounter(db.engine) as counter:
+        start = time.perf_counter()
+        for _ in range(n):
+            with app.test_request_context(headers=headers):
+                whoami()
+                db.session.remove()
+        elapsed = time.perf_counter() - start
+    print(f'{label:<10} {elapsed / n * 1e6:8.1f} us/request  {counter.count / n:5.2f} queries/request')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        headers = auth_headers(seed_users(1)[0])
+
+    size = token_cache.maxsize
+    token_cache.maxsize = 0
+    measure(app, headers, args.requests, 'uncached')
+    token_cache.maxsize = size
+    measure(app, headers, args.requests, 'cached')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Vehicles/sec through the gate batch endpoints versus one park/unpark request per vehicle.
+
+    python -m benchmarks.batch_park --vehicles 2000 --batch-size 200
+"""
+import argparse
+import time
+from models import User
+from utils.spot_allocator import spot_allocator
+from benchmarks.common import make_app, seed_users, seed_lot, auth_headers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=200)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        lot_id = seed_lot(args.vehicles).id
+        users = seed_users(args.vehicles)
+        user_ids = [u.id for u in users]
+        user_headers = [auth_headers(u) for u in users]
+        admin_headers = auth_headers(User.query.filter_by(role='admin').first())
+        spot_allocator.load_all()
+    client = app.test_client()
+
+    start = time.perf_counter()
+    for headers in user_headers:
+        client.post('/api/user/park', json={'lot_id': lot_id, 'vehicle_number': 'BENCH'}, headers=headers)
+    parked = time.perf_counter() - start
+    start = time.perf_counter()
+    for headers in user_headers:
+        client.post('/api/user/unpark', headers=headers)
+    unparked = time.perf_counter() - start
+    print(f'single   park {args.vehicles / parked:10.1f} vehicles/s   unpark {args.vehicles / unparked:10.1f} vehicles/s')
+
+    batches = [user_ids[i:i + args.batch_size] for i in range(0, len(user_ids), args.batch_size)]
+    ok = 0
+    start = time.perf_counter()
+    session_batches = []
+    for batch in batches:
+        items = [{'user_id': uid, 'lot_id': lot_id, 'vehicle_number': f'BENCH-{uid}'} for uid in batch]
+        results = client.post('/api/admin/gate/park', json={'items': items}, headers=admin_headers).json['results']
+        ok += sum(r['ok'] for r in results)
+        session_batches.append([{'session_id': r['session_id']} for r in results if r['ok']])
+    parked = time.perf_counter() - start
+    start = time.perf_counter()
+    for items in session_batches:
+        client.post('/api/admin/gate/unpark', json={'items': items}, headers=admin_headers)
+    unparked = time.perf_counter() - start
+    print(f'batch {args.batch_size:<4} park {ok / parked:8.1f} vehicles/s   unpark {ok / unparked:10.1f} vehicles/s')
+
+
+if __name__ == '__main__':
+    main()
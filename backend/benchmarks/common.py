@@ -0,0 +1,110 @@
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from sqlalchemy import event, insert
+from werkzeug.security import generate_password_hash
+from config import Config
+from extensions import db
+from models import User, ParkingLot, ParkingSpot, ParkingSession
+from utils.auth import generate_token
+
+
+def bench_config(db_path=None, **overrides):
+    """Config for benchmark runs: a throwaway SQLite file, an in-process cache
+    and in-process occupancy events."""
+    if db_path is None:
+        fd, db_path = tempfile.mkstemp(prefix='parking_bench_', suffix='.db')
+        os.close(fd)
+    attrs = {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'CACHE_TYPE': 'SimpleCache',
+        'OCCUPANCY_EVENTS_REDIS_URL': None,
+        'TESTING': True,
+    }
+    attrs.update(overrides)
+    return type('BenchConfig', (Config,), attrs)
+
+
+def make_app(db_path=None, **overrides):
+    from app import create_app
+    from migrations import bootstrap
+    app = create_app(bench_config(db_path, **overrides))
+    with app.app_context():
+        bootstrap()
+    return app
+
+
+def seed_users(count, prefix='bench_user'):
+    password = generate_password_hash('bench')
+    db.session.execute(insert(User), [{
+        'username': f'{prefix}{i}',
+        'email': f'{prefix}{i}@example.com',
+        'password': password,
+        'role': 'user',
+    } for i in range(count)])
+    db.session.commit()
+    return User.query.filter(User.username.like(f'{prefix}%')).order_by(User.id).all()
+
+
+def seed_lot(capacity, name='Bench Lot', rate=10.0, occupied=0):
+    lot = ParkingLot(name=name, location='Bench', capacity=capacity, rate_per_hour=rate, occupied_count=occupied)
+    db.session.add(lot)
+    db.session.flush()
+    db.session.execute(insert(ParkingSpot), [{
+        'lot_id': lot.id,
+        'spot_number': f'SPOT-{i}',
+        'is_occupied': i <= occupied,
+        'is_active': True,
+    } for i in range(1, capacity + 1)])
+    db.session.commit()
+    return lot
+
+
+def seed_sessions(user_id, lot_id, spot_ids, count, start=None, batch=10000):
+    """Bulk-inserts count completed sessions, one hour apart, cycling through spot_ids."""
+    start = start or datetime(2024, 1, 1)
+    for offset in range(0, count, batch):
+        db.session.execute(insert(ParkingSession), [{
+            'user_id': user_id,
+            'lot_id': lot_id,
+            'spot_id': spot_ids[i % len(spot_ids)],
+            'vehicle_number': f'BENCH-{i % 97}',
+            'entry_time': start + timedelta(hours=i),
+            'exit_time': start + timedelta(hours=i, minutes=45),
+            'amount_paid': 10.0,
+            'status': 'COMPLETED',
+        } for i in range(offset, min(offset + batch, count))])
+        db.session.commit()
+
+
+def auth_headers(user):
+    return {'Authorization': f'Bearer {generate_token(user)}'}
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        self.count = 0
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+@contextmanager
+def timed(label, results=None):
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    if results is not None:
+        results[label] = elapsed
+    print(f'{label:<40} {elapsed * 1000:10.1f} ms')
@@ -0,0 +1,89 @@
+"""Runtime, peak Python memory and query count of the daily reminder run.
+
+Compares the old selection (a correlated EXISTS, every User loaded with
+.all(), messages formatted one by one) with the paged anti-join feeding the
+mail layer. Mail delivery is suppressed under TESTING, so both sides build
+every message and time only the work the task itself does.
+
+    python -m benchmarks.daily_reminders --users 100000 --active 0.3
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from sqlalchemy import insert, not_
+from extensions import db
+from models import User, ParkingLot, ParkingSession, ParkingSpot, TaskRun
+from tasks import send_daily_reminders
+from utils.mailer import build_message, send_messages
+from benchmarks.common import make_app, seed_users, seed_lot, QueryCounter
+
+
+def legacy_reminders():
+    cutoff_date = datetime.utcnow() - timedelta(days=1)
+    recent_parking = db.session.query(ParkingSession).filter(
+        ParkingSession.entry_time >= cutoff_date,
+        ParkingSession.user_id == User.id
+    ).exists()
+    users_to_remind = User.query.filter(User.role != 'admin', not_(recent_parking), User.email != None).all()
+    new_lots = ParkingLot.query.filter(ParkingLot.created_at >= datetime.utcnow().date()).count()
+
+    def reminders():
+        subject = "Need a Parking Spot? 🚗"
+        for u in users_to_remind:
+            if new_lots > 0:
+                msg = f"Hello {u.username},\n\nWe noticed you haven't parked with us lately. We have {new_lots} new parking locations available!\nYou can check it out in our app's dashboard!"
+            else:
+                msg = f"Hello {u.username},\n\nSafe and secure parking is waiting for you. Book a spot today!"
+            yield build_message(u.email, subject, msg)
+
+    return send_messages(reminders())
+
+
+def measure(label, fn, engine):
+    # Timed and traced in separate runs: tracemalloc slows allocation-heavy
+    # code unevenly.
+    with QueryCounter(engine) as counter:
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+    db.session.expunge_all()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.session.expunge_all()
+    print(f'{label:<10} {elapsed:8.2f} s  peak {peak / 1024 / 1024:8.1f} MB  {counter.count:6} queries  {result}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--active', type=float, default=0.3, help='share of users who parked in the last day')
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        lot = seed_lot(10)
+        spot_id = ParkingSpot.query.filter_by(lot_id=lot.id).first().id
+        user_ids = [u.id for u in seed_users(args.users)]
+        now = datetime.utcnow()
+        step = max(1, round(1 / args.active)) if args.active else 0
+        active = user_ids[::step] if step else []
+        for offset in range(0, len(active), 10000):
+            db.session.execute(insert(ParkingSession), [{
+                'user_id': uid, 'lot_id': lot.id, 'spot_id': spot_id, 'vehicle_number': 'BENCH',
+                'entry_time': now - timedelta(hours=2), 'exit_time': now - timedelta(hours=1),
+                'amount_paid': 10.0, 'status': 'COMPLETED'
+            } for uid in active[offset:offset + 10000]])
+        db.session.commit()
+        db.session.expunge_all()
+
+        measure('legacy', legacy_reminders, db.engine)
+        measure('set-based', send_daily_reminders.run, db.engine)
+        run = TaskRun.query.order_by(TaskRun.id.desc()).first()
+        print(f'recorded TaskRun stats: {run.stats}')
+
+
+if __name__ == '__main__':
+    main()
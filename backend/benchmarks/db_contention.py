@@ -0,0 +1,113 @@
+"""Concurrent park/unpark against one SQLite file under each database profile.
+
+Starts --processes worker processes (standing in for gunicorn or Celery
+workers), each with --threads threads that loop POST /user/park and POST
+/user/unpark for --duration seconds, and reports throughput, "database is
+locked" errors and latency per profile:
+
+- default: no pragmas (rollback journal) and pysqlite's deferred BEGIN;
+- wal: the SQLITE_PRAGMAS profile, deferred transactions;
+- tuned: SQLITE_PRAGMAS and BEGIN IMMEDIATE for write requests (Config).
+
+    python -m benchmarks.db_contention --processes 4 --threads 8 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from sqlalchemy.exc import OperationalError
+from config import Config
+from extensions import db
+from benchmarks.common import make_app, seed_users, seed_lot, auth_headers
+
+PROFILES = {
+    'default': {'SQLITE_PRAGMAS': {}, 'SQLITE_IMMEDIATE_WRITES': False},
+    'wal': {'SQLITE_PRAGMAS': Config.SQLITE_PRAGMAS, 'SQLITE_IMMEDIATE_WRITES': False},
+    'tuned': {'SQLITE_PRAGMAS': Config.SQLITE_PRAGMAS, 'SQLITE_IMMEDIATE_WRITES': True},
+}
+
+
+def worker(db_path, overrides, lot_id, headers, start_at, deadline, results):
+    app = make_app(db_path, **overrides)
+    client = app.test_client()
+    time.sleep(max(0.0, start_at - time.time()))
+    ok = locked = failed = 0
+    latencies = []
+
+    def loop(h):
+        nonlocal ok, locked, failed
+        while time.time() < deadline:
+            for path, body in (('/api/user/park', {'lot_id': lot_id, 'vehicle_number': 'BENCH'}),
+                               ('/api/user/unpark', None)):
+                start = time.perf_counter()
+                try:
+                    status = client.post(path, json=body, headers=h).status_code
+                except OperationalError as e:
+                    status = 'locked' if 'locked' in str(e) else 'error'
+                latencies.append(time.perf_counter() - start)
+                if status == 'locked':
+                    locked += 1
+                elif status in (200, 201):
+                    ok += 1
+                else:
+                    failed += 1
+
+    threads = [threading.Thread(target=loop, args=(h,)) for h in headers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results.put((ok, locked, failed, latencies))
+
+
+def run(name, overrides, args):
+    fd, db_path = tempfile.mkstemp(prefix='parking_contention_', suffix='.db')
+    os.close(fd)
+    users = args.processes * args.threads
+    app = make_app(db_path, **overrides)
+    with app.app_context():
+        lot_id = seed_lot(users * 4).id
+        headers = [auth_headers(u) for u in seed_users(users)]
+        journal = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+        db.engine.dispose()
+
+    ctx = multiprocessing.get_context('fork')
+    results = ctx.Queue()
+    # Every process starts its clients together, once all apps are built.
+    start_at = time.time() + 2
+    deadline = start_at + args.duration
+    procs = [ctx.Process(target=worker, args=(db_path, overrides, lot_id,
+                                              headers[i * args.threads:(i + 1) * args.threads], start_at, deadline,
+                                              results))
+             for i in range(args.processes)]
+    for p in procs:
+        p.start()
+    totals = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    os.remove(db_path)
+
+    ok = sum(t[0] for t in totals)
+    locked = sum(t[1] for t in totals)
+    failed = sum(t[2] for t in totals)
+    latencies = sorted(x for t in totals for x in t[3])
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000 if latencies else 0
+    print(f'{name:<8} journal={journal:<7} {ok / args.duration:8.1f} ok/s  locked={locked:<6} other_errors={failed:<6}'
+          f' p50 {latencies[len(latencies) // 2] * 1000 if latencies else 0:7.1f} ms  p99 {p99:7.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per profile')
+    parser.add_argument('--profile', choices=sorted(PROFILES), action='append', help='default: all')
+    args = parser.parse_args()
+    for name in args.profile or PROFILES:
+        run(name, PROFILES[name], args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Peak RSS and runtime of the CSV export, old in-memory build versus streaming.
+
+Seeds one user with --rows sessions, then runs each export mode in its own
+subprocess so the peak RSS of one does not hide the other.
+
+    python -m benchmarks.export_csv --rows 1000000
+"""
+import argparse
+import csv
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from models import ParkingSession, ParkingSpot
+from tasks import write_export_file
+from benchmarks.common import make_app, seed_users, seed_lot, seed_sessions
+
+MODES = ('legacy', 'streaming', 'streaming-gzip')
+
+
+def legacy_export(user_id, file_path):
+    sessions = ParkingSession.query.filter_by(user_id=user_id).order_by(ParkingSession.entry_time.desc()).all()
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Session ID', 'Lot Name', 'Spot Number', 'Vehicle', 'Entry Time', 'Exit Time', 'Fee', 'Status'])
+    for s in sessions:
+        writer.writerow([s.id, s.lot.name, s.spot.spot_number, s.vehicle_number,
+                         s.entry_time, s.exit_time, s.amount_paid, s.status])
+    csv_data = output.getvalue()
+    with open(file_path, 'w') as f:
+        f.write(csv_data)
+    return csv_data
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode, db_path, user_id):
+    app = make_app(db_path)
+    out_dir = tempfile.mkdtemp(prefix='parking_export_')
+    file_path = os.path.join(out_dir, 'export.csv' + ('.gz' if mode == 'streaming-gzip' else ''))
+    with app.app_context():
+        before = peak_rss_mb()
+        start = time.perf_counter()
+        if mode == 'legacy':
+            legacy_export(user_id, file_path)
+        else:
+            write_export_file(user_id, file_path, compress=mode == 'streaming-gzip')
+        elapsed = time.perf_counter() - start
+    size = os.path.getsize(file_path) / 1024 / 1024
+    print(f'{mode:<16} {elapsed:8.2f} s  peak RSS {peak_rss_mb():8.1f} MB (+{peak_rss_mb() - before:.1f})  file {size:.1f} MB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--user-id', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.db, args.user_id)
+        return
+
+    fd, db_path = tempfile.mkstemp(prefix='parking_bench_', suffix='.db')
+    os.close(fd)
+    app = make_app(db_path)
+    with app.app_context():
+        lot = seed_lot(100)
+        user = seed_users(1)[0]
+        spot_ids = [s.id for s in ParkingSpot.query.filter_by(lot_id=lot.id)]
+        seed_sessions(user.id, lot.id, spot_ids, args.rows)
+        user_id = user.id
+    print(f'{args.rows} sessions')
+    for mode in MODES:
+        subprocess.run([sys.executable, '-W', 'ignore', '-m', 'benchmarks.export_csv',
+                        '--mode', mode, '--db', db_path, '--user-id', str(user_id)], check=True)
+
+
+if __name__ == '__main__':
+    main()
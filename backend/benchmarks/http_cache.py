@@ -0,0 +1,84 @@
+"""Response size and latency of the polled read endpoints: full responses,
+compressed responses and 304 revalidations.
+
+Generates a synthetic data set with a few large lots (benchmarks.synthetic),
+then for each endpoint times --runs plain GETs, GETs accepting gzip and br,
+and GETs that send back the ETag of the previous response, reporting p50
+latency, SQL statements and body size of each.
+
+    python -m benchmarks.http_cache --lots 4 --spots 2000 --users 5000 --days 30
+"""
+import argparse
+import statistics
+import time
+from extensions import db
+from models import User, ParkingLot, ParkingSession
+from benchmarks.common import make_app, auth_headers, QueryCounter
+from benchmarks.synthetic import generate
+
+MODES = (
+    ('plain', {}),
+    ('gzip', {'Accept-Encoding': 'gzip'}),
+    ('br', {'Accept-Encoding': 'br, gzip'}),
+)
+
+
+def measure(client, engine, path, headers, runs):
+    samples, queries = [], []
+    for _ in range(runs):
+        with QueryCounter(engine) as counter:
+            start = time.perf_counter()
+            response = client.get(path, headers=headers)
+            body = response.get_data()
+            response.close()
+            samples.append((time.perf_counter() - start) * 1000)
+        queries.append(counter.count)
+    return response, statistics.median(samples), statistics.mean(queries), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--lots', type=int, default=4)
+    parser.add_argument('--spots', type=int, default=2000, help='spots per lot')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--runs', type=int, default=30)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        start = time.perf_counter()
+        counts = generate(args.users, args.lots, args.spots, args.days)
+        print(f'generated {counts} in {time.perf_counter() - start:.1f} s')
+        heavy_id = db.session.query(ParkingSession.user_id).group_by(ParkingSession.user_id)\
+            .order_by(db.func.count().desc()).limit(1).scalar()
+        user = auth_headers(db.session.get(User, heavy_id))
+        admin = auth_headers(User.query.filter_by(role='admin').first())
+        lot_id = ParkingLot.query.order_by(ParkingLot.capacity.desc()).first().id
+        engine = db.engine
+        db.session.remove()
+
+    client = app.test_client()
+    endpoints = [
+        ('/api/user/lots', user),
+        ('/api/user/history?limit=500', user),
+        ('/api/user/summary', user),
+        ('/api/admin/lots', admin),
+        (f'/api/admin/lots/{lot_id}/spots', admin),
+        ('/api/admin/summary', admin),
+    ]
+    print(f"{'endpoint':<34} {'mode':<6} {'p50 ms':>8} {'queries':>8} {'bytes':>10}")
+    for path, headers in endpoints:
+        etag = None
+        for mode, extra in MODES:
+            response, p50, queries, size = measure(client, engine, path, dict(headers, **extra), args.runs)
+            etag = response.headers['ETag']
+            print(f'{path:<34} {mode:<6} {p50:8.2f} {queries:8g} {size:10,}')
+        response, p50, queries, size = measure(client, engine, path, dict(headers, **{'If-None-Match': etag}),
+                                               args.runs)
+        assert response.status_code == 304, (path, response.status_code)
+        print(f"{path:<34} {'304':<6} {p50:8.2f} {queries:8g} {size:10,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""Load test of the lots, park, history and unpark flows over HTTP, reporting
+requests/sec and latency percentiles per endpoint.
+
+Against a running server (gunicorn -c gunicorn.conf.py wsgi:app):
+
+    python -m benchmarks.load_test --url http://localhost:5000 --users 64 --duration 60
+
+Without --url a threaded development server on a throwaway database is
+started in-process, which is only useful for comparing code changes.
+
+Each virtual user registers its own account and loops over GET /user/lots,
+POST /user/park, GET /user/history, POST /user/unpark on one keep-alive
+connection. The admin account (--admin-user/--admin-password) creates the
+lot they park in.
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import urlsplit
+from config import Config
+
+
+class Client:
+    def __init__(self, base_url, token=None):
+        url = urlsplit(base_url)
+        conn_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.conn = conn_class(url.hostname, url.port, timeout=30)
+        self.token = token
+
+    def request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        payload = json.dumps(body) if body is not None else None
+        try:
+            self.conn.request(method, '/api' + path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            return 0, None
+        return response.status, json.loads(data) if data else None
+
+
+class Stats:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, name, elapsed, ok):
+        with self.lock:
+            self.samples[name].append(elapsed)
+            if not ok:
+                self.errors[name] += 1
+
+    def report(self, duration):
+        print(f"{'endpoint':<22}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        total = 0
+        for name, samples in self.samples.items():
+            samples = sorted(samples)
+            total += len(samples)
+
+            def pct(p):
+                return samples[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+            print(f'{name:<22}{len(samples):>9}{self.errors[name]:>8}{len(samples) / duration:>9.1f}'
+                  f'{pct(0.50):>9.1f}{pct(0.90):>9.1f}{pct(0.99):>9.1f}{samples[-1] * 1000:>9.1f}')
+        print(f"{'total':<22}{total:>9}{sum(self.errors.values()):>8}{total / duration:>9.1f}")
+
+
+FLOW = (
+    ('GET /user/lots', 'GET', '/user/lots', None),
+    ('POST /user/park', 'POST', '/user/park', 'park'),
+    ('GET /user/history', 'GET', '/user/history?limit=20', None),
+    ('POST /user/unpark', 'POST', '/user/unpark', None),
+)
+
+
+def virtual_user(base_url, token, lot_id, deadline, think, stats):
+    client = Client(base_url, token)
+    vehicle = f'LT-{uuid.uuid4().hex[:8]}'
+    while time.monotonic() < deadline:
+        for name, method, path, body in FLOW:
+            if body == 'park':
+                body = {'lot_id': lot_id, 'vehicle_number': vehicle}
+            start = time.perf_counter()
+            status, _ = client.request(method, path, body)
+            stats.record(name, time.perf_counter() - start, 200 <= status < 300)
+            if think:
+                time.sleep(think)
+
+
+def setup(base_url, users, admin_user, admin_password):
+    admin = Client(base_url)
+    status, body = admin.request('POST', '/auth/login', {'username': admin_user, 'password': admin_password})
+    if status != 200:
+        raise SystemExit(f'admin login failed ({status}): {body}')
+    admin.token = body['token']
+    run = uuid.uuid4().hex[:6]
+    status, body = admin.request('POST', '/admin/lots', {'name': f'Load test {run}', 'location': 'Load test',
+                                                         'capacity': users, 'rate_per_hour': 10.0})
+    if status != 201:
+        raise SystemExit(f'lot creation failed ({status}): {body}')
+    lot_id = body['id']
+
+    tokens = []
+    client = Client(base_url)
+    for i in range(users):
+        status, body = client.request('POST', '/auth/register', {'username': f'load_{run}_{i}', 'password': 'load-test',
+                                                                 'email': f'load_{run}_{i}@example.com'})
+        if status != 201:
+            raise SystemExit(f'registration failed ({status}): {body}')
+        tokens.append(body['token'])
+    return lot_id, tokens
+
+
+def start_local_server():
+    from werkzeug.serving import make_server, WSGIRequestHandler
+    from benchmarks.common import make_app
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, make_app(), threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='base URL of a running server; default starts one in-process')
+    parser.add_argument('--users', type=int, default=32, help='concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--think', type=float, default=0, help='seconds between a user\'s requests')
+    parser.add_argument('--admin-user', default=Config.ADMIN_USERNAME)
+    parser.add_argument('--admin-password', default=Config.ADMIN_PASSWORD)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server, base_url = start_local_server()
+
+    lot_id, tokens = setup(base_url, args.users, args.admin_user, args.admin_password)
+    stats = Stats()
+    deadline = time.monotonic() + args.duration
+    threads = [threading.Thread(target=virtual_user, args=(base_url, token, lot_id, deadline, args.think, stats))
+               for token in tokens]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - start
+
+    print(f'{args.users} users for {elapsed:.1f} s against {base_url}')
+    stats.report(elapsed)
+    if server:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
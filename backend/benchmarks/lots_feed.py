@@ -0,0 +1,65 @@
+"""Query count and latency of GET /api/user/lots as the number of lots grows.
+
+Compares the old per-lot COUNT loop with the aggregate availability query,
+both uncached and served from the cache.
+
+    python -m benchmarks.lots_feed --lots 10 100 500
+"""
+import argparse
+import time
+from extensions import db, cache
+from models import ParkingLot, ParkingSpot
+from routes import user_routes
+from benchmarks.common import make_app, seed_users, seed_lot, auth_headers, QueryCounter
+
+
+def legacy_lot_availability():
+    lots = []
+    for lot in ParkingLot.query.all():
+        occupied = ParkingSpot.query.filter_by(lot_id=lot.id, is_occupied=True).count()
+        lots.append({'id': lot.id, 'name': lot.name, 'location': lot.location, 'rate': lot.rate_per_hour,
+                     'available': lot.capacity - occupied})
+    return lots
+
+
+def measure(app, headers, label, repeat, clear_cache):
+    client = app.test_client()
+    client.get('/api/user/lots', headers=headers)
+    with app.app_context():
+        with QueryCounter(db.engine) as counter:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                if clear_cache:
+                    cache.clear()
+                client.get('/api/user/lots', headers=headers)
+            elapsed = time.perf_counter() - start
+    print(f'  {label:<12} {elapsed / repeat * 1000:8.2f} ms/req  {counter.count / repeat:8.1f} queries/req')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lots', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--spots', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    for n in args.lots:
+        app = make_app()
+        with app.app_context():
+            for i in range(n):
+                seed_lot(args.spots, name=f'Lot {i}', occupied=i % args.spots)
+            headers = auth_headers(seed_users(1)[0])
+        print(f'{n} lots x {args.spots} spots')
+
+        original = user_routes.lot_availability
+        user_routes.lot_availability = legacy_lot_availability
+        try:
+            measure(app, headers, 'legacy', args.repeat, clear_cache=False)
+        finally:
+            user_routes.lot_availability = original
+        measure(app, headers, 'aggregate', args.repeat, clear_cache=True)
+        measure(app, headers, 'cached', args.repeat, clear_cache=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Mail throughput: one SMTP connection per message versus pooled batches.
+
+Sends to MAIL_SERVER:MAIL_PORT (127.0.0.1:1025 by default). If nothing is
+listening there, a minimal in-process SMTP sink is started on that port.
+
+    python -m benchmarks.mail_throughput --messages 2000
+"""
+import argparse
+import socket
+import socketserver
+import threading
+import time
+from extensions import mail
+from utils.mailer import build_message, send_messages
+from benchmarks.common import make_app
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.wfile.write(b'220 bench ESMTP\r\n')
+        in_data = False
+        for line in self.rfile:
+            if in_data:
+                if line == b'.\r\n':
+                    in_data = False
+                    self.wfile.write(b'250 OK\r\n')
+                continue
+            command = line[:4].upper()
+            if command == b'DATA':
+                in_data = True
+                self.wfile.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+            elif command == b'QUIT':
+                self.wfile.write(b'221 Bye\r\n')
+                return
+            elif command == b'EHLO':
+                self.wfile.write(b'250 bench\r\n')
+            else:
+                self.wfile.write(b'250 OK\r\n')
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def ensure_sink(host, port):
+    try:
+        socket.create_connection((host, port), timeout=0.5).close()
+        return None
+    except OSError:
+        server = SinkServer((host, port), SinkHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    app = make_app(MAIL_SUPPRESS_SEND=False, MAIL_BATCH_SIZE=args.batch_size)
+    with app.app_context():
+        server = ensure_sink(app.config['MAIL_SERVER'], app.config['MAIL_PORT'])
+        messages = [build_message(f'user{i}@example.com', 'Bench', 'Hello') for i in range(args.messages)]
+
+        start = time.perf_counter()
+        for msg in messages:
+            mail.send(msg)
+        elapsed = time.perf_counter() - start
+        print(f'per-message connection {args.messages / elapsed:10.1f} msg/s')
+
+        start = time.perf_counter()
+        sent, failed = send_messages(messages)
+        elapsed = time.perf_counter() - start
+        print(f'pooled (batch {args.batch_size:>4})    {sent / elapsed:10.1f} msg/s  failed={failed}')
+
+        if server:
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Runtime and query count of the monthly report run against a seeded database.
+
+Compares the old one-task-per-user report with the batched build, both
+rendering every report (mail delivery is suppressed under TESTING).
+
+    python -m benchmarks.monthly_reports --users 2000 --sessions 10
+"""
+import argparse
+import time
+from sqlalchemy import insert
+from extensions import db
+from models import User, ParkingSession, ParkingSpot
+from tasks import previous_month, monthly_report_batches, build_monthly_reports
+from benchmarks.common import make_app, seed_users, seed_lot, QueryCounter
+
+
+def legacy_report(user_id, period_start, period_end):
+    user = User.query.get(user_id)
+    sessions = ParkingSession.query.filter(
+        ParkingSession.user_id == user.id,
+        ParkingSession.entry_time >= period_start,
+        ParkingSession.entry_time < period_end
+    ).all()
+    if not sessions:
+        return None
+    html_rows = ""
+    for s in sessions:
+        html_rows += f"<tr><td>{s.lot.name}</td><td>{s.spot.spot_number}</td>" \
+                     f"<td>{s.entry_time.strftime('%d-%m %H:%M')}</td><td>${s.amount_paid}</td></tr>"
+    return html_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--sessions', type=int, default=10, help='sessions per user last month')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    app = make_app()
+    period_start, period_end = previous_month()
+    with app.app_context():
+        lots = [seed_lot(20, name=f'Lot {i}') for i in range(5)]
+        spots = {lot.id: [s.id for s in ParkingSpot.query.filter_by(lot_id=lot.id)] for lot in lots}
+        users = seed_users(args.users)
+        rows = []
+        for n, user in enumerate(users):
+            for k in range(args.sessions):
+                lot_id = lots[(n + k) % len(lots)].id
+                rows.append({'user_id': user.id, 'lot_id': lot_id, 'spot_id': spots[lot_id][k % 20],
+                             'vehicle_number': 'BENCH', 'entry_time': period_start.replace(day=1 + k % 27, hour=k % 24),
+                             'amount_paid': 12.5, 'status': 'COMPLETED'})
+        db.session.execute(insert(ParkingSession), rows)
+        db.session.commit()
+        user_ids = [u.id for u in users]
+
+        with QueryCounter(db.engine) as counter:
+            start = time.perf_counter()
+            sent = sum(1 for uid in user_ids if legacy_report(uid, period_start, period_end))
+            elapsed = time.perf_counter() - start
+        db.session.expunge_all()
+        print(f'legacy   {elapsed:8.2f} s  {counter.count:7} queries  {sent} reports')
+
+        with QueryCounter(db.engine) as counter:
+            start = time.perf_counter()
+            sent = batches = 0
+            for batch in monthly_report_batches(period_start, args.batch_size):
+                sent += len(build_monthly_reports(batch, period_start))
+                batches += 1
+            elapsed = time.perf_counter() - start
+        print(f'batched  {elapsed:8.2f} s  {counter.count:7} queries  {sent} reports in {batches} batches')
+
+
+if __name__ == '__main__':
+    main()
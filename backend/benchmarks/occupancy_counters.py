@@ -0,0 +1,50 @@
+"""Occupancy reads with ParkingLot.occupied_count versus counting spot rows.
+
+    python -m benchmarks.occupancy_counters --lots 200 --spots 1000
+"""
+import argparse
+from sqlalchemy import func
+from extensions import db
+from models import ParkingLot, ParkingSpot
+from utils.availability import reconcile_occupancy
+from benchmarks.common import make_app, seed_lot, timed
+
+
+def count_from_spots():
+    return db.session.query(
+        ParkingLot.id,
+        ParkingLot.capacity,
+        func.count(ParkingSpot.id).filter(ParkingSpot.is_occupied == True)
+    ).outerjoin(ParkingSpot).group_by(ParkingLot.id).all()
+
+
+def count_from_counters():
+    return db.session.query(ParkingLot.id, ParkingLot.capacity, ParkingLot.occupied_count).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lots', type=int, default=200)
+    parser.add_argument('--spots', type=int, default=1000, help='spots per lot')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        with timed(f'seed {args.lots * args.spots} spots'):
+            for i in range(args.lots):
+                seed_lot(args.spots, name=f'Lot {i}', occupied=(i * 37) % args.spots)
+
+        assert sorted(count_from_spots()) == sorted(count_from_counters())
+        with timed(f'lot occupancy from spots x{args.repeat}'):
+            for _ in range(args.repeat):
+                count_from_spots()
+        with timed(f'lot occupancy from counters x{args.repeat}'):
+            for _ in range(args.repeat):
+                count_from_counters()
+        with timed('reconcile (no drift)'):
+            reconcile_occupancy()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Cost of keeping N screens current: polling /api/user/lots versus the occupancy event stream.
+
+    python -m benchmarks.occupancy_push --screens 2000 --events 200
+"""
+import argparse
+import statistics
+import threading
+import time
+from extensions import db
+from utils.occupancy_events import occupancy_events
+from utils.spot_allocator import spot_allocator
+from benchmarks.common import make_app, seed_users, seed_lot, auth_headers, QueryCounter, timed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--screens', type=int, default=2000)
+    parser.add_argument('--events', type=int, default=200)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        lot_id = seed_lot(50).id
+        spot_allocator.load_all()
+        headers = auth_headers(seed_users(1)[0])
+        engine = db.engine
+    client = app.test_client()
+
+    # Polling: every screen pays a full request per interval whether or not
+    # anything changed.
+    with QueryCounter(engine) as polled, timed(f'poll: one round of {args.screens} screens'):
+        for _ in range(args.screens):
+            client.get('/api/user/lots', headers=headers)
+    print(f'poll: {args.screens} requests and {polled.count} queries per interval')
+
+    # Push: every screen holds a subscription and blocks until an event arrives.
+    subs = [occupancy_events.subscribe() for _ in range(args.screens)]
+    received = [0] * args.screens
+    latencies = []
+
+    def screen(i, sub):
+        for frame in occupancy_events.stream(sub):
+            if frame.startswith('event: spot'):
+                received[i] += 1
+
+    for i, sub in enumerate(subs):
+        threading.Thread(target=screen, args=(i, sub), daemon=True).start()
+
+    with QueryCounter(engine) as pushed:
+        for _ in range(args.events):
+            for path, body in (('/api/user/park', {'lot_id': lot_id, 'vehicle_number': 'BENCH'}), ('/api/user/unpark', None)):
+                start = time.perf_counter()
+                client.post(path, json=body, headers=headers)
+                while min(received) < len(latencies) + 1:
+                    time.sleep(0.0001)
+                latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f'push: {args.screens} screens, {len(latencies)} changes: request+fan-out p50 '
+          f'{statistics.median(latencies) * 1000:.2f} ms  p99 {p99 * 1000:.2f} ms')
+    print(f'push: {pushed.count / len(latencies):.1f} queries per change (independent of screens), '
+          f'0 between changes')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Occupancy history and forecast latency over a year of 1,000 lots.
+
+Fills lot_occupancy_day with --days days of synthetic curves for --lots
+lots (what the series would hold after a year), then times
+occupancy_history over 30 days and the whole range, and forecast_occupancy,
+for random lots. For comparison it seeds one lot with --sessions completed
+sessions over the same range and times computing its curve straight from
+the session table, as the endpoint would without the series, and
+rebuild_occupancy for that lot.
+
+    python -m benchmarks.occupancy_series --lots 1000 --days 365
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import insert
+from extensions import db
+from models import ParkingLot, ParkingSession, LotOccupancyDay
+from utils.occupancy_series import (occupancy_history, forecast_occupancy, rebuild_occupancy, occupied_seconds,
+                                    BUCKETS_PER_DAY, BUCKET_SECONDS, _seconds, _day_start)
+from benchmarks.common import make_app, seed_lot, seed_users, seed_sessions
+
+
+def seed_series(lots, days, today, capacity=200, batch=20000):
+    db.session.execute(insert(ParkingLot), [{
+        'name': f'Series Lot {i}', 'location': 'Bench', 'capacity': capacity, 'rate_per_hour': 10.0,
+    } for i in range(lots)])
+    db.session.commit()
+    lot_ids = [lid for (lid,) in db.session.query(ParkingLot.id).order_by(ParkingLot.id)]
+    # A daytime peak with per-day noise, in spot-seconds per bucket.
+    hours = np.arange(BUCKETS_PER_DAY) * BUCKET_SECONDS / 3600
+    shape = capacity * 0.7 * np.exp(-((hours - 13) / 4) ** 2) * BUCKET_SECONDS
+    rng = np.random.default_rng(0)
+    rows = []
+    for lot_id in lot_ids:
+        noise = rng.uniform(0.8, 1.2, size=(days, 1))
+        curves = (shape * noise).astype('<f4')
+        for d in range(days):
+            rows.append({'lot_id': lot_id, 'day': today - timedelta(days=days - d), 'capacity': capacity,
+                         'buckets': curves[d].tobytes()})
+            if len(rows) == batch:
+                db.session.execute(insert(LotOccupancyDay), rows)
+                rows = []
+    if rows:
+        db.session.execute(insert(LotOccupancyDay), rows)
+    db.session.commit()
+    return lot_ids
+
+
+def latency(fn, lot_ids, runs):
+    samples = []
+    for lot_id in random.sample(lot_ids, min(runs, len(lot_ids))):
+        start = time.perf_counter()
+        fn(lot_id)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000
+
+
+def history_from_sessions(lot_id, first_day, last_day):
+    # What the history endpoint would do without the series: every session
+    # overlapping the range, bucketed on each request.
+    start = datetime.combine(first_day, datetime.min.time())
+    rows = db.session.query(ParkingSession.entry_time, ParkingSession.exit_time).filter(
+        ParkingSession.lot_id == lot_id, ParkingSession.exit_time > start).all()
+    n_days = (last_day - first_day).days + 1
+    values = occupied_seconds(_seconds([r.entry_time for r in rows]), _seconds([r.exit_time for r in rows]),
+                              _day_start(first_day), n_days * BUCKETS_PER_DAY)
+    return values.reshape(n_days, BUCKETS_PER_DAY) / BUCKET_SECONDS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lots', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--runs', type=int, default=200, help='lots sampled per measurement')
+    parser.add_argument('--sessions', type=int, default=50000, help='sessions seeded for the comparison lot')
+    args = parser.parse_args()
+    random.seed(0)
+
+    app = make_app()
+    db_path = app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):]
+    today = datetime.utcnow().date()
+    with app.app_context():
+        start = time.perf_counter()
+        lot_ids = seed_series(args.lots, args.days, today)
+        print(f'seeded {args.lots} lots x {args.days} days in {time.perf_counter() - start:.1f} s '
+              f'({os.path.getsize(db_path) / 1e6:.0f} MB)')
+
+        lots = {lot.id: lot for lot in ParkingLot.query.filter(ParkingLot.id.in_(lot_ids))}
+        cases = [
+            ('history 30 days', lambda lid: occupancy_history(lid, today - timedelta(days=29), today)),
+            (f'history {args.days} days', lambda lid: occupancy_history(lid, today - timedelta(days=args.days), today)),
+            ('forecast 24 h / 4 weeks', lambda lid: forecast_occupancy(lots[lid], hours=24, weeks=4)),
+        ]
+        for label, fn in cases:
+            p50, p99 = latency(fn, lot_ids, args.runs)
+            print(f'{label:<26} p50 {p50:7.2f} ms  p99 {p99:7.2f} ms')
+
+        # One lot with raw sessions spread over the same range.
+        lot = seed_lot(20, name='Session Lot')
+        user = seed_users(1)[0]
+        spot_ids = [s.id for s in lot.spots]
+        per_hour = max(1, args.sessions // (args.days * 24))
+        for k in range(per_hour):
+            seed_sessions(user.id, lot.id, spot_ids, args.days * 24,
+                          start=datetime.combine(today - timedelta(days=args.days), datetime.min.time())
+                          + timedelta(minutes=k * 60 // per_hour))
+        sessions = per_hour * args.days * 24
+        first_day = today - timedelta(days=args.days)
+        p50, p99 = latency(lambda lid: history_from_sessions(lid, first_day, today), [lot.id], 1)
+        print(f'from {sessions} sessions      {p50:11.2f} ms  (no series, {args.days} days)')
+        start = time.perf_counter()
+        rebuild_occupancy(lot_ids=[lot.id])
+        elapsed = time.perf_counter() - start
+        print(f'rebuild one lot            {elapsed * 1000:11.2f} ms  ({sessions / elapsed:,.0f} sessions/s)')
+        p50, _ = latency(lambda lid: occupancy_history(lid, first_day, today), [lot.id], 1)
+        print(f'same lot from the series   {p50:11.2f} ms')
+    os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
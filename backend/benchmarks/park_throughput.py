@@ -0,0 +1,73 @@
+"""Load test for POST /api/user/park.
+
+Runs the same burst of concurrent parks twice: once with the old
+"first free spot" table scan and once with the in-memory allocator, and
+reports parks/sec, failed requests and double-booked spots for each.
+
+    python -m benchmarks.park_throughput --spots 20000 --users 400 --threads 8
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func
+from extensions import db
+from models import ParkingSpot, ParkingSession
+from routes import user_routes
+from utils.spot_allocator import spot_allocator
+from benchmarks.common import make_app, seed_users, seed_lot, auth_headers
+
+
+def legacy_claim_spot(lot_id):
+    spot = ParkingSpot.query.filter_by(lot_id=lot_id, is_occupied=False).with_for_update().first()
+    if spot:
+        spot.is_occupied = True
+    return spot
+
+
+def run(mode, args):
+    app = make_app()
+    with app.app_context():
+        lot = seed_lot(args.spots, occupied=args.spots - args.users * 2)
+        lot_id = lot.id
+        headers = [auth_headers(u) for u in seed_users(args.users)]
+        spot_allocator.load_all()
+
+    original = user_routes.claim_spot
+    if mode == 'legacy':
+        user_routes.claim_spot = legacy_claim_spot
+
+    def park(h):
+        resp = app.test_client().post('/api/user/park', json={'lot_id': lot_id, 'vehicle_number': 'BENCH'}, headers=h)
+        return resp.status_code
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            codes = list(pool.map(park, headers))
+        elapsed = time.perf_counter() - start
+    finally:
+        user_routes.claim_spot = original
+
+    with app.app_context():
+        double_booked = db.session.query(ParkingSession.spot_id)\
+            .filter(ParkingSession.status == 'ACTIVE')\
+            .group_by(ParkingSession.spot_id)\
+            .having(func.count(ParkingSession.id) > 1).count()
+        db.engine.dispose()
+
+    ok = codes.count(201)
+    print(f'{mode:<10} {ok / elapsed:10.1f} parks/s  ok={ok:<6} failed={len(codes) - ok:<6} double_booked={double_booked}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--spots', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+    for mode in ('legacy', 'allocator'):
+        run(mode, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Lot provisioning time: one ORM object per spot versus bulk executemany.
+
+    python -m benchmarks.provision_spots --sizes 1000 10000 100000
+"""
+import argparse
+from extensions import db
+from models import ParkingLot, ParkingSpot
+from utils.spot_provisioning import provision_spots, resize_lot
+from benchmarks.common import make_app, timed
+
+
+def legacy_provision(lot_id, count):
+    for i in range(1, count + 1):
+        db.session.add(ParkingSpot(lot_id=lot_id, spot_number=f"SPOT-{i}", is_occupied=False))
+
+
+def new_lot(capacity):
+    lot = ParkingLot(name=f'Bench {capacity}', capacity=capacity)
+    db.session.add(lot)
+    db.session.flush()
+    return lot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        for size in args.sizes:
+            with timed(f'{size:>7} spots  ORM objects'):
+                legacy_provision(new_lot(size).id, size)
+                db.session.commit()
+            with timed(f'{size:>7} spots  bulk insert'):
+                provision_spots(new_lot(size).id, size)
+                db.session.commit()
+            lot = new_lot(size)
+            provision_spots(lot.id, size)
+            db.session.commit()
+            with timed(f'{size:>7} spots  shrink by half'):
+                resize_lot(lot, size // 2)
+                db.session.commit()
+            with timed(f'{size:>7} spots  grow back x2'):
+                resize_lot(lot, size * 2)
+                db.session.commit()
+
+
+if __name__ == '__main__':
+    main()
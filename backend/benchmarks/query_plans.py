@@ -0,0 +1,99 @@
+"""Fails if a hot route falls back to a full table scan.
+
+Drives the hold, park, unpark, history, summary, spot and occupancy routes through
+the test client, and the export job lookups and hold sweeps directly, captures every SELECT they
+issue and runs it through SQLite's EXPLAIN QUERY PLAN. Any plain SCAN of a
+table listed in HOT_TABLES is reported and the script exits with status 1.
+
+    python -m benchmarks.query_plans
+"""
+import sys
+from sqlalchemy import event, select
+from extensions import db
+from models import User, ExportJob
+from utils.export_jobs import history_fingerprint, reusable_export, export_status, fail_stale_exports, delete_expired_exports
+from utils.holds import expire_due_holds, purge_finished_holds
+from benchmarks.common import make_app, seed_users, seed_lot, auth_headers
+
+HOT_TABLES = ('parking_session', 'parking_spot', 'export_job', 'lot_occupancy_day', 'spot_hold')
+
+ROUTES = [
+    ('POST', '/api/user/hold', 'user'),
+    ('GET', '/api/user/hold', 'user'),
+    ('POST', '/api/user/park', 'user'),
+    ('GET', '/api/user/history', 'user'),
+    ('GET', '/api/user/summary', 'user'),
+    ('POST', '/api/user/unpark', 'user'),
+    ('POST', '/api/user/hold', 'user'),
+    ('DELETE', '/api/user/hold', 'user'),
+    ('GET', '/api/admin/lots/{lot_id}/spots', 'admin'),
+    ('GET', '/api/admin/lots/{lot_id}/occupancy', 'admin'),
+    ('GET', '/api/admin/lots/{lot_id}/forecast', 'admin'),
+]
+
+
+def full_scans(conn, statement, params):
+    plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', params).fetchall()
+    scans = []
+    for row in plan:
+        detail = row[-1]
+        if detail.startswith('SCAN ') and detail.split()[1] in HOT_TABLES and 'COVERING INDEX' not in detail:
+            scans.append(detail)
+    return scans
+
+
+def main():
+    app = make_app()
+    captured = []
+
+    def capture(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            captured.append((statement, params))
+
+    with app.app_context():
+        lot = seed_lot(50, occupied=10)
+        user = seed_users(1)[0]
+        admin = User.query.filter_by(role='admin').first()
+        headers = {'user': auth_headers(user), 'admin': auth_headers(admin)}
+        lot_id = lot.id
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        client = app.test_client()
+        failures = []
+        for method, path, role in ROUTES:
+            captured.clear()
+            client.open(path.format(lot_id=lot_id), method=method, json={'lot_id': lot_id, 'vehicle_number': 'PLAN'},
+                        headers=headers[role])
+            statements = list(captured)
+            with db.engine.connect() as conn:
+                for statement, params in statements:
+                    for scan in full_scans(conn, statement, params):
+                        failures.append(f'{method} {path}: {scan}\n    {statement}')
+
+        export_lookups = [
+            ('export_user_csv job lookup',
+             lambda: db.session.execute(select(ExportJob).filter_by(celery_task_id='plan-check')).all()),
+            ('export reuse check', lambda: reusable_export(user.id, history_fingerprint(user.id))),
+            ('export status', lambda: export_status(1, user.id)),
+            ('export retention sweep', lambda: (fail_stale_exports(), delete_expired_exports())),
+            ('hold expiry sweep', lambda: expire_due_holds()),
+            ('hold retention sweep', lambda: purge_finished_holds()),
+        ]
+        for label, lookup in export_lookups:
+            captured.clear()
+            lookup()
+            with db.engine.connect() as conn:
+                for statement, params in list(captured):
+                    for scan in full_scans(conn, statement, params):
+                        failures.append(f'{label}: {scan}\n    {statement}')
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    if failures:
+        print('Full table scans on hot paths:')
+        print('\n'.join(failures))
+        sys.exit(1)
+    print(f'OK: no full scans of {", ".join(HOT_TABLES)} on {len(ROUTES)} routes.')
+
+
+if __name__ == '__main__':
+    main()
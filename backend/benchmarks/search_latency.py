@@ -0,0 +1,67 @@
+"""p50/p99 latency of /api/user/search and /api/admin/search, LIKE scan versus FTS index.
+
+    python -m benchmarks.search_latency --sessions 1000000
+"""
+import argparse
+import random
+import statistics
+import time
+from models import User, ParkingSpot
+from utils import search_index
+from benchmarks.common import make_app, seed_users, seed_lot, seed_sessions, auth_headers, timed
+
+QUERIES = ['bench-4', 'ench-9', 'lot 7', 'spot-12', 'user12', 'nothing-matches']
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return statistics.median(samples) * 1000, p99 * 1000
+
+
+def measure(client, url, headers, queries, repeat):
+    samples = []
+    for _ in range(repeat):
+        for q in queries:
+            start = time.perf_counter()
+            client.get(url, query_string={'q': q}, headers=headers)
+            samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--lots', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        with timed(f'seed {args.sessions} sessions (index kept by triggers)'):
+            lots = [seed_lot(100, name=f'Lot {i}') for i in range(args.lots)]
+            spots = {lot.id: [s.id for s in ParkingSpot.query.filter_by(lot_id=lot.id)] for lot in lots}
+            users = seed_users(args.users)
+            per_user = args.sessions // args.users
+            rng = random.Random(7)
+            for user in users:
+                lot = rng.choice(lots)
+                seed_sessions(user.id, lot.id, spots[lot.id], per_user)
+        user_headers = auth_headers(users[len(users) // 2])
+        admin_headers = auth_headers(User.query.filter_by(role='admin').first())
+
+    client = app.test_client()
+    ready = search_index._index_ready
+    for mode in ('like', 'fts'):
+        search_index._index_ready = (lambda: False) if mode == 'like' else ready
+        try:
+            for url, headers in (('/api/user/search', user_headers), ('/api/admin/search', admin_headers)):
+                p50, p99 = measure(client, url, headers, QUERIES, args.repeat)
+                print(f'{mode:<5} {url:<20} p50 {p50:8.2f} ms  p99 {p99:8.2f} ms')
+        finally:
+            search_index._index_ready = ready
+
+
+if __name__ == '__main__':
+    main()
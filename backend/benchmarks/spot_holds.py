@@ -0,0 +1,115 @@
+"""Spot hold expiry with tens of thousands of holds outstanding.
+
+Seeds --holds running holds spread over --lots lots, expiring evenly over
+the next hour, then times expire_due_holds as the periodic sweep would see
+it: an idle tick with nothing due, and ticks at +1, +10 and +60 minutes
+that each pop whatever fell due since the last one. Every SELECT the sweep
+issues is checked for full scans of parking_spot and spot_hold. Finally
+times the hold, park-from-hold and cancel routes through the test client.
+
+    python -m benchmarks.spot_holds --holds 50000 --lots 50
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, insert
+from extensions import db
+from models import ParkingLot, ParkingSpot, SpotHold
+from utils.holds import expire_due_holds
+from benchmarks.common import make_app, seed_users, seed_lot, auth_headers, QueryCounter, timed
+from benchmarks.query_plans import full_scans
+
+
+def seed_holds(users, lots, holds, now):
+    """Holds the first spots of each lot for users, as place_hold would."""
+    per_lot = -(-holds // lots)
+    lot_ids = [seed_lot(per_lot + 20, name=f'Hold Lot {i}', occupied=per_lot).id for i in range(lots)]
+    spots = db.session.query(ParkingSpot.id, ParkingSpot.lot_id).filter(ParkingSpot.is_occupied == True)\
+        .order_by(ParkingSpot.id).limit(holds).all()
+    offsets = list(range(len(spots)))
+    random.shuffle(offsets)
+    db.session.execute(insert(SpotHold), [{
+        'user_id': users[i % len(users)].id,
+        'lot_id': spot.lot_id,
+        'spot_id': spot.id,
+        'status': 'HELD',
+        'created_at': now,
+        'expires_at': now + timedelta(seconds=3600 * offsets[i] / len(spots)),
+    } for i, spot in enumerate(spots)])
+    db.session.commit()
+    return lot_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--holds', type=int, default=50000)
+    parser.add_argument('--lots', type=int, default=50)
+    parser.add_argument('--api-runs', type=int, default=200)
+    args = parser.parse_args()
+    random.seed(0)
+
+    app = make_app()
+    with app.app_context():
+        now = datetime.utcnow()
+        with timed(f'seed {args.holds} holds'):
+            users = seed_users(args.holds)
+            lot_ids = seed_holds(users, args.lots, args.holds, now)
+        api_headers = [auth_headers(user) for user in random.sample(users, args.api_runs)]
+        # The test client's requests share this session; keep it small.
+        db.session.expunge_all()
+        occupied = db.session.query(func.sum(ParkingLot.occupied_count)).scalar()
+
+        statements = []
+
+        def capture(conn, cursor, statement, params, context, executemany):
+            if statement.lstrip().upper().startswith('SELECT') and not executemany:
+                statements.append((statement, params))
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        swept = 0
+        for label, at in [('idle tick', now - timedelta(seconds=1)), ('tick at +1 min', now + timedelta(minutes=1)),
+                          ('tick at +10 min', now + timedelta(minutes=10)),
+                          ('tick at +60 min', now + timedelta(minutes=60))]:
+            with QueryCounter(db.engine) as queries:
+                start = time.perf_counter()
+                expired = expire_due_holds(at)
+                elapsed = time.perf_counter() - start
+            swept += expired
+            rate = f'{expired / elapsed:9,.0f} holds/s' if expired else ' ' * 16
+            print(f'{label:<18} {expired:6} expired {elapsed * 1000:9.1f} ms  {rate}  {queries.count:5} queries')
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+        db.session.expire_all()
+        remaining = db.session.query(func.sum(ParkingLot.occupied_count)).scalar()
+        assert swept == args.holds and remaining == occupied - swept, (swept, occupied, remaining)
+        assert SpotHold.query.filter_by(status='HELD').count() == 0
+        scans = set()
+        with db.engine.connect() as conn:
+            for statement, params in statements:
+                scans.update(full_scans(conn, statement, params))
+        print('sweep plans: ' + ('; '.join(sorted(scans)) if scans else 'no full scans'))
+
+        client = app.test_client()
+        samples = {'POST /hold': [], 'GET /hold': [], 'DELETE /hold': [], 'POST /park (held)': []}
+        for i, headers in enumerate(api_headers):
+            lot_id = random.choice(lot_ids)
+            # Every other hold is cancelled, the rest are parked in.
+            end = ('DELETE /hold', 'delete', '/api/user/hold', None) if i % 2 else \
+                ('POST /park (held)', 'post', '/api/user/park', {'lot_id': lot_id, 'vehicle_number': f'HOLD{i}'})
+            calls = [('POST /hold', 'post', '/api/user/hold', {'lot_id': lot_id}),
+                     ('GET /hold', 'get', '/api/user/hold', None),
+                     end]
+            for label, method, path, body in calls:
+                start = time.perf_counter()
+                response = getattr(client, method)(path, json=body, headers=headers)
+                samples[label].append(time.perf_counter() - start)
+                assert response.status_code < 300, (path, response.json)
+        for label, values in samples.items():
+            values.sort()
+            print(f'{label:<18} p50 {values[len(values) // 2] * 1000:6.2f} ms  '
+                  f'p95 {values[int(len(values) * 0.95)] * 1000:6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Cold start of a web worker and a Celery worker, each in a fresh interpreter.
+
+web:    import app, create_app(), then the first GET /api/user/lots
+worker: import celery_app and tasks, then build the app tasks run in
+bootstrap: what `flask bootstrap` costs, which every boot used to pay
+
+Each phase is the median of --runs fresh processes, against a seeded
+throwaway database. With --budget-ms the script exits with status 1 when a
+web worker's cold start (import + create + first request) exceeds it.
+
+    python -m benchmarks.startup --runs 5 --budget-ms 2000
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROLES = ('web', 'worker', 'bootstrap')
+
+
+def child(role, db_path):
+    # Runs in the fresh interpreter; prints {phase: seconds} as JSON.
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    statements = []
+    event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    phases = {}
+    start = time.perf_counter()
+    if role == 'web':
+        from benchmarks.common import bench_config
+        from app import create_app
+        phases['import'] = time.perf_counter() - start
+        mark = time.perf_counter()
+        app = create_app(bench_config(db_path))
+        phases['create_app'] = time.perf_counter() - mark
+        phases['create_app_sql'] = len(statements)
+        from models import User
+        from utils.auth import generate_token
+        with app.app_context():
+            token = generate_token(User.query.filter_by(role='user').first())
+        mark = time.perf_counter()
+        response = app.test_client().get('/api/user/lots', headers={'Authorization': f'Bearer {token}'})
+        phases['first_request'] = time.perf_counter() - mark
+        assert response.status_code == 200, response.status_code
+    elif role == 'worker':
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+        import celery_app
+        import tasks  # noqa: F401 - what a worker imports before its first task
+        phases['import'] = time.perf_counter() - start
+        mark = time.perf_counter()
+        celery_app.flask_app()
+        phases['first_task_app'] = time.perf_counter() - mark
+    else:
+        from benchmarks.common import bench_config
+        from app import create_app
+        from migrations import bootstrap
+        app = create_app(bench_config(db_path))
+        mark = time.perf_counter()
+        with app.app_context():
+            bootstrap()
+        phases['bootstrap'] = time.perf_counter() - mark
+    print(json.dumps(phases))
+
+
+def measure(role, db_path, runs):
+    samples = []
+    env = dict(os.environ, PYTHONWARNINGS='ignore')
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--child', role, '--db', db_path],
+                             capture_output=True, text=True, env=env, check=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    return {phase: statistics.median(s[phase] for s in samples) for phase in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, help='fail if a web cold start takes longer')
+    parser.add_argument('--lots', type=int, default=20)
+    parser.add_argument('--spots', type=int, default=500, help='spots per lot')
+    parser.add_argument('--child', choices=ROLES, help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.db)
+        return
+
+    from extensions import db
+    from benchmarks.common import make_app, seed_users, seed_lot
+    app = make_app()
+    db_path = app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):]
+    with app.app_context():
+        for i in range(args.lots):
+            seed_lot(args.spots, name=f'Lot {i}')
+        seed_users(10)
+        db.engine.dispose()
+
+    failed = False
+    for role in ROLES:
+        phases = measure(role, db_path, args.runs)
+        timings = {k: v for k, v in phases.items() if not k.endswith('_sql')}
+        total = sum(timings.values())
+        parts = '  '.join(f'{k} {v * 1000:7.1f} ms' for k, v in timings.items())
+        extra = f"  ({phases['create_app_sql']} SQL statements in create_app)" if 'create_app_sql' in phases else ''
+        print(f'{role:<10} {parts}  total {total * 1000:7.1f} ms{extra}')
+        if role == 'web' and args.budget_ms is not None and total * 1000 > args.budget_ms:
+            print(f'web cold start over budget ({total * 1000:.0f} ms > {args.budget_ms:.0f} ms)')
+            failed = True
+    os.remove(db_path)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,333 @@
+"""End-to-end benchmark of every endpoint and periodic task on synthetic data.
+
+Loads a data set with benchmarks.synthetic (or copies --db, made by it
+earlier), then drives every route through the Flask test client and every
+task with Celery in eager mode, so tasks and the work they dispatch run
+inline. Each scenario is timed over --repeat calls and reports p50/p95
+latency and SQL statements per call; one more call runs under tracemalloc
+for its peak Python memory (timed and traced separately, as tracemalloc
+slows allocation-heavy code unevenly).
+
+--save writes the results as JSON; --compare reads such a file and exits
+with status 1 when a scenario got slower or hungrier than --threshold times
+its baseline (ignoring changes under 2 ms / 1 MB) or issues more queries.
+
+    python -m benchmarks.suite --scale medium --save baseline.json
+    python -m benchmarks.suite --scale medium --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from extensions import db, cache
+from models import User, ParkingLot, ParkingSession, TariffPlan
+from celery.result import EagerResult
+from benchmarks.common import make_app, auth_headers, QueryCounter
+from benchmarks.synthetic import generate, PASSWORD
+
+SCALES = {
+    'small': {'users': 1000, 'lots': 5, 'spots_per_lot': 50, 'days': 30},
+    'medium': {'users': 20000, 'lots': 40, 'spots_per_lot': 100, 'days': 90},
+    'large': {'users': 100000, 'lots': 100, 'spots_per_lot': 200, 'days': 180},
+}
+GATE_BATCH = 10
+TIME_FLOOR_MS = 2.0
+MEMORY_FLOOR_KB = 1024
+
+
+class Scenario:
+    def __init__(self, name, call, repeat=None):
+        # call(i) runs the i-th call; mutating scenarios use i to pick fresh inputs.
+        self.name = name
+        self.call = call
+        self.repeat = repeat
+
+
+class Fixtures:
+    """Users, lots and ids the scenarios need, picked from the data set."""
+
+    def __init__(self, app, pool):
+        with app.app_context():
+            busy = db.session.query(ParkingSession.user_id).filter(ParkingSession.status == 'ACTIVE')
+            users = User.query.filter(User.role == 'user', User.id.notin_(busy)).order_by(User.id).all()
+            heavy = db.session.query(ParkingSession.user_id).group_by(ParkingSession.user_id)\
+                .order_by(db.func.count().desc()).limit(pool).all()
+            self.admin = auth_headers(User.query.filter_by(role='admin').first())
+            self.heavy = [auth_headers(db.session.get(User, uid)) for (uid,) in heavy]
+            # Users with an ordinary history, for history and summary.
+            self.typical = [auth_headers(u) for u in users[len(users) // 2:len(users) // 2 + pool]]
+            # Users with nothing parked: one each for park/unpark, ten each for a gate batch.
+            idle = users[-GATE_BATCH * pool - pool:]
+            self.parkers = [auth_headers(u) for u in idle[:pool]]
+            self.gate_users = [u.id for u in idle[pool:]]
+            self.lot_id = ParkingLot.query.order_by(ParkingLot.occupied_count.desc()).first().id
+            self.lot_ids = [lid for (lid,) in db.session.query(ParkingLot.id).order_by(ParkingLot.id)]
+            self.tariff_id = TariffPlan.query.order_by(TariffPlan.id).first().id
+        self.pool = pool
+        self.created_lots = []
+        self.export_jobs = []
+        self.download_urls = []
+
+    def gate_batch(self, i):
+        return self.gate_users[i * GATE_BATCH:(i + 1) * GATE_BATCH]
+
+
+def scenarios(client, fx, task_repeat):
+    import tasks
+
+    def fetch(method, path, **kwargs):
+        # Reads the whole body, so streamed responses are timed to the end.
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+        response.close()
+        return response
+
+    def get(path, headers):
+        return lambda i: fetch('GET', path, headers=headers(i) if callable(headers) else headers)
+
+    def post(path, body, headers):
+        return lambda i: fetch('POST', path, json=body(i) if callable(body) else body,
+                               headers=headers(i) if callable(headers) else headers)
+
+    def revalidate(path, headers):
+        # The first call learns the ETag; the rest are answered 304.
+        etag = []
+
+        def call(i):
+            if not etag:
+                etag.append(fetch('GET', path, headers=headers).headers['ETag'])
+            return fetch('GET', path, headers=dict(headers, **{'If-None-Match': etag[0]}))
+        return call
+
+    def task(fn, *args):
+        return lambda i: fn.delay(*args)
+
+    def create_lot(i):
+        response = fetch('POST', '/api/admin/lots', json={'name': f'Suite Lot {i}', 'location': 'Suite',
+                                                        'capacity': 50}, headers=fx.admin)
+        fx.created_lots.append(response.get_json()['id'])
+        return response
+
+    def trigger_export(i):
+        # Each call exports a different heavy user, so none is reused.
+        response = fetch('POST', '/api/user/export/trigger', headers=fx.heavy[i])
+        fx.export_jobs.append(response.get_json()['job_id'])
+        return response
+
+    def export_status(i):
+        n = i % len(fx.export_jobs)
+        response = fetch('GET', f'/api/user/export/status/{fx.export_jobs[n]}', headers=fx.heavy[n])
+        fx.download_urls.append(response.get_json()['download_url'])
+        return response
+
+    def export_download(i):
+        return fetch('GET', fx.download_urls[i % len(fx.download_urls)])
+
+    def first_event(i):
+        response = client.get('/api/events/occupancy', headers=fx.admin, buffered=False)
+        next(response.response)
+        response.close()
+        return response
+
+    def gate_park(i):
+        return {'items': [{'user_id': uid, 'lot_id': fx.lot_ids[i % len(fx.lot_ids)], 'vehicle_number': f'GATE{uid}'}
+                          for uid in fx.gate_batch(i)]}
+
+    def gate_unpark(i):
+        return {'items': [{'vehicle_number': f'GATE{uid}'} for uid in fx.gate_batch(i)]}
+
+    def typical(i):
+        return fx.typical[i % fx.pool]
+
+    def heavy(i):
+        return fx.heavy[i % fx.pool]
+
+    def parker(i):
+        return fx.parkers[i]
+
+    lot = fx.lot_id
+    return [
+        Scenario('auth register', post('/api/auth/register', lambda i: {
+            'username': f'suite{i}', 'password': 'suite', 'email': f'suite{i}@example.com'}, None)),
+        Scenario('auth login', post('/api/auth/login', {'username': 'synthetic0', 'password': PASSWORD}, None)),
+        Scenario('user lots', get('/api/user/lots', typical)),
+        Scenario('user park', post('/api/user/park', {'lot_id': lot, 'vehicle_number': 'SUITE'}, parker)),
+        Scenario('user unpark', post('/api/user/unpark', None, parker)),
+        Scenario('user hold', post('/api/user/hold', {'lot_id': lot}, parker)),
+        Scenario('user hold status', get('/api/user/hold', parker)),
+        Scenario('user cancel hold', lambda i: fetch('DELETE', '/api/user/hold', headers=parker(i))),
+        Scenario('user history', get('/api/user/history', typical)),
+        Scenario('user history (304)', revalidate('/api/user/history', fx.typical[0])),
+        Scenario('user history 500 (heavy)', get('/api/user/history?limit=500', heavy)),
+        Scenario('user history ndjson (heavy)', get('/api/user/history?format=ndjson', heavy)),
+        Scenario('user search', get('/api/user/search?q=lot', typical)),
+        Scenario('user summary', get('/api/user/summary', typical)),
+        Scenario('user summary (heavy)', get('/api/user/summary', heavy)),
+        Scenario('user export + task (heavy)', trigger_export, repeat=task_repeat),
+        Scenario('user export status', export_status),
+        Scenario('user export download', export_download),
+        Scenario('admin lots', get('/api/admin/lots', fx.admin)),
+        Scenario('admin top users', get('/api/admin/users/10', fx.admin)),
+        Scenario('admin create lot', create_lot),
+        Scenario('admin update lot', lambda i: fetch('PUT', f'/api/admin/lots/{fx.created_lots[i]}',
+                                                     json={'capacity': 60}, headers=fx.admin)),
+        Scenario('admin delete lot', lambda i: fetch('DELETE', f'/api/admin/lots/{fx.created_lots[i]}',
+                                                     headers=fx.admin)),
+        Scenario('admin tariffs', get('/api/admin/tariffs', fx.admin)),
+        Scenario('admin create tariff', post('/api/admin/tariffs', lambda i: {
+            'name': f'Suite plan {i}', 'bands': [{'start': 7, 'end': 10, 'rate': 30}]}, fx.admin)),
+        Scenario('admin update tariff', lambda i: fetch('PUT', f'/api/admin/tariffs/{fx.tariff_id}',
+                                                        json={'grace_minutes': i % 15}, headers=fx.admin)),
+        Scenario(f'admin gate park x{GATE_BATCH}', post('/api/admin/gate/park', gate_park, fx.admin)),
+        Scenario(f'admin gate unpark x{GATE_BATCH}', post('/api/admin/gate/unpark', gate_unpark, fx.admin)),
+        Scenario('admin lot spots', get(f'/api/admin/lots/{lot}/spots', fx.admin)),
+        Scenario('admin lot spots (304)', revalidate(f'/api/admin/lots/{lot}/spots', fx.admin)),
+        Scenario('admin occupancy 30d', get(f'/api/admin/lots/{lot}/occupancy?days=30', fx.admin)),
+        Scenario('admin occupancy 366d', get(f'/api/admin/lots/{lot}/occupancy?days=366', fx.admin)),
+        Scenario('admin forecast', get(f'/api/admin/lots/{lot}/forecast', fx.admin)),
+        Scenario('admin summary', get('/api/admin/summary', fx.admin)),
+        Scenario('admin task runs', get('/api/admin/task-runs', fx.admin)),
+        Scenario('admin search', get('/api/admin/search?q=synthetic1', fx.admin)),
+        Scenario('events first frame', first_event),
+        Scenario('task daily reminders', task(tasks.send_daily_reminders), repeat=task_repeat),
+        Scenario('task monthly reports', task(tasks.schedule_monthly_reports), repeat=task_repeat),
+        Scenario('task rollup backfill 2d', task(tasks.backfill_rollups, 2), repeat=task_repeat),
+        Scenario('task occupancy backfill 2d', task(tasks.backfill_occupancy, 2), repeat=task_repeat),
+        Scenario('task purge exports', task(tasks.purge_expired_exports), repeat=task_repeat),
+        Scenario('task expire holds', task(tasks.expire_spot_holds), repeat=task_repeat),
+    ]
+
+
+def check(name, result):
+    if isinstance(result, EagerResult):
+        result.get()  # re-raises what the task raised
+    elif result.status_code >= 400:
+        raise RuntimeError(f'{name}: HTTP {result.status_code} {result.get_data(as_text=True)[:200]}')
+
+
+def run(scenario, repeat, engine):
+    samples, queries = [], []
+    for i in range(repeat):
+        with QueryCounter(engine) as counter:
+            start = time.perf_counter()
+            result = scenario.call(i)
+            elapsed = time.perf_counter() - start
+        check(scenario.name, result)
+        samples.append(elapsed * 1000)
+        queries.append(counter.count)
+    tracemalloc.start()
+    check(scenario.name, scenario.call(repeat))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    samples.sort()
+    return {
+        'calls': repeat,
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'queries': round(statistics.mean(queries), 1),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def regressions(current, baseline, threshold):
+    found = []
+    for name, now in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if now['p50_ms'] > before['p50_ms'] * threshold and now['p50_ms'] - before['p50_ms'] > TIME_FLOOR_MS:
+            found.append(f"{name}: p50 {before['p50_ms']:.1f} -> {now['p50_ms']:.1f} ms")
+        if now['queries'] > before['queries']:
+            found.append(f"{name}: queries {before['queries']:g} -> {now['queries']:g}")
+        if now['peak_kb'] > before['peak_kb'] * threshold and now['peak_kb'] - before['peak_kb'] > MEMORY_FLOOR_KB:
+            found.append(f"{name}: peak memory {before['peak_kb']:.0f} -> {now['peak_kb']:.0f} KB")
+    return found
+
+
+def _revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--db', help='copy of a data set made by benchmarks.synthetic instead of generating one')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20, help='calls per endpoint scenario')
+    parser.add_argument('--task-repeat', type=int, default=2, help='calls per task scenario')
+    parser.add_argument('--only', help='regular expression; run matching scenarios only (unpark, hold status and '
+                        'cancel, export status and download, lot update and delete need the scenario before them)')
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON from an earlier --save')
+    parser.add_argument('--threshold', type=float, default=1.25, help='allowed slowdown ratio against the baseline')
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(prefix='parking_suite_', suffix='.db')
+    os.close(fd)
+    storage = tempfile.mkdtemp(prefix='parking_suite_exports_')
+    overrides = {'CELERY_TASK_ALWAYS_EAGER': True, 'CELERY_TASK_EAGER_PROPAGATES': True,
+                 'FILE_STORAGE_PATH': storage}
+    if args.db:
+        shutil.copyfile(args.db, db_path)
+        dataset = {'source': os.path.abspath(args.db)}
+    app = make_app(db_path, **overrides)
+    with app.app_context():
+        if not args.db:
+            start = time.perf_counter()
+            dataset = generate(seed=args.seed, **SCALES[args.scale])
+            dataset.update(scale=args.scale, seed=args.seed)
+            print(f'generated {dataset} in {time.perf_counter() - start:.1f} s')
+        engine = db.engine
+
+    # Every scenario makes at most repeat + 1 calls (the last one traced).
+    fx = Fixtures(app, pool=max(args.repeat, args.task_repeat) + 1)
+    client = app.test_client()
+    pattern = re.compile(args.only) if args.only else None
+    results = {}
+    print(f"{'scenario':<30} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'peak KB':>10}")
+    for scenario in scenarios(client, fx, args.task_repeat):
+        if pattern and not pattern.search(scenario.name):
+            continue
+        with app.app_context():
+            cache.clear()
+        result = run(scenario, scenario.repeat or args.repeat, engine)
+        results[scenario.name] = result
+        print(f"{scenario.name:<30} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} {result['queries']:8g}"
+              f" {result['peak_kb']:10.0f}")
+
+    shutil.rmtree(storage, ignore_errors=True)
+    os.remove(db_path)
+    report = {
+        'meta': {'revision': _revision(), 'python': platform.python_version(),
+                 'run_at': datetime.utcnow().isoformat(timespec='seconds'), 'dataset': dataset,
+                 'repeat': args.repeat, 'task_repeat': args.task_repeat},
+        'results': results,
+    }
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline['results'], args.threshold)
+        if found:
+            print(f"Regressions against {args.compare} ({baseline['meta'].get('revision')}):")
+            print('\n'.join(f'  {line}' for line in found))
+            raise SystemExit(1)
+        print(f"No regressions against {args.compare} ({baseline['meta'].get('revision')}).")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,68 @@
-from celery import Celery
-from flask import Flask
+"""The one Celery instance shared by the web app, workers and beat.
+
+Importing this module builds no Flask app and touches no database: the
+broker settings come straight from Config, and the Flask app that tasks run
+in is created on first use (see flask_app()). A web process binds its own
+app with init_celery() from create_app, so tasks it runs eagerly use the
+same app and database.
+
+    celery -A celery_app worker
+    celery -A celery_app beat
+"""
+from celery import Celery, Task
+from flask import has_app_context
 from config import Config
-from extensions import db,mail,cache
+from utils.metrics import init_task_metrics
+
+_flask_app = None
+
 
-def create_celery(app):
-    celery_app = Celery(
-        app.import_name, 
-        broker=app.config['CELERY_BROKER_URL'], 
-        backend=app.config['CELERY_RESULT_BACKEND']
+def flask_app():
+    """The Flask app tasks run in, built on first use in worker and beat
+    processes."""
+    if _flask_app is None:
+        from app import create_app
+        create_app()
+    return _flask_app
+
+
+def _configure(celery_app, config):
+    celery_app.conf.update(
+        broker_url=config['CELERY_BROKER_URL'],
+        result_backend=config['CELERY_RESULT_BACKEND'],
+        timezone=config.get('CELERY_TIMEZONE', 'UTC'),
+        imports=config.get('CELERY_IMPORTS', ('tasks',)),
+        beat_schedule=config.get('CELERY_BEAT_SCHEDULE', {}),
+        task_always_eager=config.get('CELERY_TASK_ALWAYS_EAGER', False),
+        task_eager_propagates=config.get('CELERY_TASK_EAGER_PROPAGATES', False),
     )
-    celery_app.conf.update(app.config)
-    
-    class ContextTask(celery_app.Task):
-        def __call__(self, *args, **kwargs):
-            with app.app_context():
-                return super().__call__(*args, **kwargs)
-    
-    celery_app.Task = ContextTask
-    return celery_app
-
-flask_app = Flask('quiz_app') 
-flask_app.config.from_object(Config)
-
-db.init_app(flask_app)
-mail.init_app(flask_app)
-cache.init_app(flask_app)
-
-celery = create_celery(flask_app) 
-celery.conf.update(CELERY_IMPORTS=('tasks',))
\ No newline at end of file
+
+
+def _config_dict(config_class):
+    return {key: getattr(config_class, key) for key in dir(config_class) if key.isupper()}
+
+
+class AppContextTask(Task):
+    def __call__(self, *args, **kwargs):
+        # Tasks run eagerly inside a request keep that request's app.
+        if has_app_context():
+            return super().__call__(*args, **kwargs)
+        with flask_app().app_context():
+            return super().__call__(*args, **kwargs)
+
+
+celery = Celery('parking', task_cls=AppContextTask)
+_configure(celery, _config_dict(Config))
+# Workers record task metrics from the first task on, before any app exists.
+init_task_metrics(_config_dict(Config))
+
+
+def init_celery(app):
+    """Points the shared Celery instance at app's config and makes app the
+    one tasks run in."""
+    global _flask_app
+    _flask_app = app
+    _configure(celery, app.config)
+    init_task_metrics(app.config)
+    app.extensions['celery'] = celery
+    return celery
@@ -0,0 +1,53 @@
+import click
+from utils.availability import reconcile_occupancy
+from migrations import upgrade_schema, bootstrap
+from utils.billing import reprice_sessions
+from utils.occupancy_series import rebuild_occupancy
+
+
+def register_commands(app):
+
+    @app.cli.command('bootstrap')
+    def bootstrap_command():
+        """Create the schema, apply migrations and seed the admin account; run once per deploy."""
+        applied, admin_created = bootstrap()
+        click.echo(f'Applied migrations: {", ".join(map(str, applied))}' if applied else 'Database schema is up to date.')
+        if admin_created:
+            click.echo(f"Created admin account '{app.config['ADMIN_USERNAME']}'.")
+
+    @app.cli.command('upgrade-db')
+    def upgrade_db_command():
+        """Apply pending schema migrations to the configured database."""
+        applied = upgrade_schema()
+        if applied:
+            click.echo(f'Applied migrations: {", ".join(map(str, applied))}')
+        else:
+            click.echo('Database schema is up to date.')
+
+    @app.cli.command('reconcile-occupancy')
+    @click.option('--dry-run', is_flag=True, help='Report drifted counters without repairing them.')
+    def reconcile_occupancy_command(dry_run):
+        """Check ParkingLot.occupied_count against the spot table and repair drift."""
+        drift = reconcile_occupancy(repair=not dry_run)
+        for lot_id, stored, actual in drift:
+            click.echo(f'lot {lot_id}: counter {stored}, spots occupied {actual}')
+        action = 'found' if dry_run else 'repaired'
+        click.echo(f'{len(drift)} drifted lot counter(s) {action}.')
+
+    @app.cli.command('reprice-sessions')
+    @click.option('--lot-id', type=int, help='Only this lot.')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), help='Only sessions entered on or after this day.')
+    @click.option('--dry-run', is_flag=True, help='Report the revenue change without writing it.')
+    def reprice_sessions_command(lot_id, since, dry_run):
+        """Re-price completed sessions under their lots' current tariffs."""
+        summary = reprice_sessions(lot_id=lot_id, since=since.date() if since else None, apply=not dry_run)
+        action = 'would change' if dry_run else 'changed'
+        click.echo(f"{summary['sessions']} session(s) priced, {summary['changed']} {action}; "
+                   f"revenue {summary['old_revenue']:.2f} -> {summary['new_revenue']:.2f}")
+
+    @app.cli.command('rebuild-occupancy')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), help='Only days on or after this one.')
+    def rebuild_occupancy_command(since):
+        """Recompute the per-lot occupancy series from the session table."""
+        rebuild_occupancy(since=since.date() if since else None)
+        click.echo(f"Occupancy series rebuilt ({'from ' + since.strftime('%Y-%m-%d') if since else 'all history'}).")
@@ -8,14 +8,65 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'change_me_parking_v2')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', f"sqlite:///{BASE_DIR / 'parking_db.db'}")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Database performance profile, applied by utils/db_tuning.py. Pool sizes
+    # are per worker process; see gunicorn.conf.py.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 4))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = True
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    }
+    SQLITE_IMMEDIATE_WRITES = True
+
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', "RedisCache")
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', "redis://localhost:6379/0")
+    AVAILABILITY_CACHE_TIMEOUT = 30
+    # Response compression (utils/compression.py) and version ETags (utils/http_cache.py).
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_GZIP_LEVEL = 5
+    COMPRESS_BROTLI_QUALITY = 4
+    ETAGS_ENABLED = True
+    AUTH_CACHE_SIZE = 10000
+    AUTH_CACHE_TTL = 60
+    GATE_BATCH_MAX_ITEMS = 500
+    # How long a lot found full is only checked with a LIMIT 1 query instead of reloaded.
+    SPOT_ALLOCATOR_FULL_TTL = 2.0
+    OCCUPANCY_EVENTS_REDIS_URL = CACHE_REDIS_URL
+    OCCUPANCY_EVENTS_CHANNEL = 'parking:occupancy'
+    OCCUPANCY_EVENTS_QUEUE_SIZE = 100
+    OCCUPANCY_EVENTS_HEARTBEAT = 15
+    # Lifetime of the tokens EventSource passes in the stream URL.
+    STREAM_TOKEN_TTL = 60
 
-    CACHE_TYPE = "redis"
-    CACHE_REDIS_URL = "redis://localhost:6379/0"
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_REDIS_URL = CACHE_REDIS_URL
+    METRICS_FLUSH_INTERVAL = 5
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+    SLOW_REQUEST_SQL_LIMIT = 5
     
     CELERY_BROKER_URL = "redis://localhost:6379/1"
     CELERY_RESULT_BACKEND = "redis://localhost:6379/1"
     CELERY_TIMEZONE = 'UTC'
     CELERY_IMPORTS = ('tasks',)
+    # Run tasks inline in the caller instead of sending them to the broker
+    # (benchmarks, local runs without Redis).
+    CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', '0') == '1'
+    CELERY_TASK_EAGER_PROPAGATES = False
+
+    HOLD_DEFAULT_MINUTES = 10
+    HOLD_MAX_MINUTES = 30
+    HOLD_SWEEP_SECONDS = 15
+    HOLD_SWEEP_BATCH_SIZE = 500
+    HOLD_RETENTION = 7 * 24 * 3600
+
+    MONTHLY_REPORT_BATCH_SIZE = 500
+    REMINDER_BATCH_SIZE = 1000
 
     CELERY_BEAT_SCHEDULE = {
         'daily-reminders': {
@@ -28,12 +79,52 @@ class Config:
             'schedule': crontab(day_of_month=1, hour=0, minute=30),
             'args': ()
         },
+        'rollup-backfill': {
+            'task': 'tasks.backfill_rollups',
+            'schedule': crontab(hour=2, minute=0),
+            'args': (2,)
+        },
+        'occupancy-backfill': {
+            'task': 'tasks.backfill_occupancy',
+            'schedule': crontab(hour=2, minute=10),
+            'args': (2,)
+        },
+        'spot-hold-expiry': {
+            'task': 'tasks.expire_spot_holds',
+            'schedule': HOLD_SWEEP_SECONDS,
+            'args': ()
+        },
+        'spot-hold-retention': {
+            'task': 'tasks.purge_spot_holds',
+            'schedule': crontab(hour=3, minute=0),
+            'args': ()
+        },
+        'export-retention': {
+            'task': 'tasks.purge_expired_exports',
+            'schedule': crontab(minute=15),
+            'args': ()
+        },
     }
 
     MAIL_SERVER = '127.0.0.1' 
     MAIL_PORT = 1025
     MAIL_DEFAULT_SENDER = ('Parking App', 'admin@parkingapp.com')
+    MAIL_BATCH_SIZE = 100
+    MAIL_RATE_LIMIT = 0
+    MAIL_MAX_RETRIES = 3
+    MAIL_RETRY_BACKOFF = 0.5
     
     ADMIN_USERNAME = os.environ.get('ADMIN_USERNAME', 'admin')
     ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'Admin@123')
-    FILE_STORAGE_PATH = '~/Documents/Studies/vehicle_parking_app_23f2003976/downloads'
\ No newline at end of file
+    FILE_STORAGE_PATH = '~/Documents/Studies/vehicle_parking_app_23f2003976/downloads'
+    EXPORT_BATCH_SIZE = 1000
+    EXPORT_GZIP = False
+    EXPORT_ATTACHMENT_MAX_BYTES = 5 * 1024 * 1024
+    EXPORT_LINK_MAX_AGE = 7 * 24 * 3600
+    EXPORT_REUSE_MAX_AGE = 24 * 3600
+    EXPORT_STALE_AFTER = 30 * 60
+    # Long enough that a link handed out when a job is reused stays valid.
+    EXPORT_RETENTION = EXPORT_LINK_MAX_AGE + EXPORT_REUSE_MAX_AGE
+    EXPORT_STATUS_CACHE_TIMEOUT = 300
+    EXPORT_PENDING_STATUS_CACHE_TIMEOUT = 2
+    PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL', 'http://localhost:5000')
@@ -0,0 +1,47 @@
+"""Gunicorn settings for serving wsgi:app; every value can be overridden from
+the environment so pods can be sized without editing this file.
+
+Each worker process builds its own app, so the SQLAlchemy pool, Redis clients
+and spot allocator are per process.
+
+Workers are gevent workers: each request, and each open occupancy event
+stream, is a greenlet, so a stream costs a socket and a queue rather than a
+thread. Streams hold no database connection while they wait; requests that
+do query share the DB_POOL_SIZE + DB_MAX_OVERFLOW connections and wait up to
+DB_POOL_TIMEOUT for one. GUNICORN_WORKER_CLASS=gthread serves requests on
+GUNICORN_THREADS threads instead, each open stream holding one; keep the pool
+at or above the thread count there.
+
+Building the app does not touch the database: run `flask --app app bootstrap`
+once per deploy, before starting gunicorn, to create and upgrade the schema.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+# Only used by gthread workers.
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+# Concurrent requests and open streams per gevent worker.
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers now and then to bound memory growth.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+# Empty disables the access log.
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+
+
+def post_fork(server, worker):
+    # gevent patches the standard library, not C database drivers: psycopg2
+    # needs psycogreen to yield while it waits on Postgres.
+    if worker_class != 'gevent':
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        return
+    patch_psycopg()
@@ -0,0 +1,155 @@
+"""Versioned, in-place schema upgrades.
+
+db.create_all() only creates missing tables, so columns and indexes added to
+existing tables never reach a database that is already deployed. Each
+migration below upgrades such a database one step; the highest applied
+version is stored in the schema_version table. Migrations must be idempotent
+because a fresh database already has the current schema from create_all().
+
+bootstrap() runs all of it plus the admin account, once per deploy, from
+`flask bootstrap`; the app itself no longer touches the schema at startup.
+"""
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, inspect, select, text
+from werkzeug.security import generate_password_hash
+from extensions import db
+from models import User
+from utils.search_index import install_search_index
+from utils.rollups import rebuild_rollups
+from utils.occupancy_series import rebuild_occupancy
+
+schema_version = Table(
+    'schema_version', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('description', String(200)),
+    Column('applied_at', DateTime, default=datetime.utcnow),
+)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def _columns(conn, table):
+    return {c['name'] for c in inspect(conn).get_columns(table)}
+
+
+def _create_index(conn, name, table, *columns):
+    # Spelled out rather than taken from the models, so a migration keeps
+    # creating exactly what it did when it was written.
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})'))
+
+
+@migration(1, 'Add ParkingLot.occupied_count')
+def add_lot_occupied_count(conn):
+    if 'occupied_count' not in _columns(conn, 'parking_lot'):
+        conn.execute(text('ALTER TABLE parking_lot ADD COLUMN occupied_count INTEGER NOT NULL DEFAULT 0'))
+    conn.execute(text(
+        'UPDATE parking_lot SET occupied_count = ('
+        'SELECT COUNT(*) FROM parking_spot '
+        'WHERE parking_spot.lot_id = parking_lot.id AND parking_spot.is_occupied = :occupied)'
+    ), {'occupied': True})
+
+
+@migration(2, 'Add indexes for the session and spot hot paths')
+def add_hot_path_indexes(conn):
+    # ExportJob.celery_task_id needs nothing here: its UNIQUE constraint is indexed.
+    _create_index(conn, 'ix_parking_spot_lot_occupied', 'parking_spot', 'lot_id', 'is_occupied')
+    _create_index(conn, 'ix_parking_session_user_status', 'parking_session', 'user_id', 'status')
+    _create_index(conn, 'ix_parking_session_user_entry', 'parking_session', 'user_id', 'entry_time')
+
+
+@migration(3, 'Add ParkingSpot.is_active for retired spots')
+def add_spot_is_active(conn):
+    if 'is_active' not in _columns(conn, 'parking_spot'):
+        conn.execute(text('ALTER TABLE parking_spot ADD COLUMN is_active BOOLEAN NOT NULL DEFAULT 1'))
+
+
+@migration(4, 'Add FTS5 trigram search indexes')
+def add_search_index(conn):
+    install_search_index(conn)
+
+
+@migration(5, 'Backfill daily session rollups')
+def backfill_rollups(conn):
+    rebuild_rollups(conn=conn)
+
+
+@migration(6, 'Add ParkingLot.tariff_id')
+def add_lot_tariff(conn):
+    if 'tariff_id' not in _columns(conn, 'parking_lot'):
+        conn.execute(text('ALTER TABLE parking_lot ADD COLUMN tariff_id INTEGER REFERENCES tariff_plan(id)'))
+
+
+@migration(7, 'Add ExportJob.history_fingerprint and export job indexes')
+def add_export_job_reuse(conn):
+    if 'history_fingerprint' not in _columns(conn, 'export_job'):
+        conn.execute(text('ALTER TABLE export_job ADD COLUMN history_fingerprint VARCHAR(100)'))
+    _create_index(conn, 'ix_export_job_user_created', 'export_job', 'user_id', 'created_at')
+    _create_index(conn, 'ix_export_job_created', 'export_job', 'created_at')
+
+
+@migration(8, 'Add the lot/exit session index and backfill occupancy series')
+def backfill_occupancy(conn):
+    _create_index(conn, 'ix_parking_session_lot_exit', 'parking_session', 'lot_id', 'exit_time')
+    rebuild_occupancy(conn=conn)
+
+
+@migration(9, 'Add ParkingLot.version and User.sessions_version')
+def add_versions(conn):
+    if 'version' not in _columns(conn, 'parking_lot'):
+        conn.execute(text('ALTER TABLE parking_lot ADD COLUMN version INTEGER NOT NULL DEFAULT 1'))
+    if 'sessions_version' not in _columns(conn, 'user'):
+        conn.execute(text('ALTER TABLE "user" ADD COLUMN sessions_version INTEGER NOT NULL DEFAULT 1'))
+
+
+def current_version(conn):
+    schema_version.create(conn, checkfirst=True)
+    return conn.execute(select(db.func.max(schema_version.c.version))).scalar() or 0
+
+
+def upgrade_schema():
+    """Applies every pending migration, each in its own transaction, and
+    returns the list of versions applied."""
+    applied = []
+    with db.engine.begin() as conn:
+        version = current_version(conn)
+    for number, description, fn in MIGRATIONS:
+        if number <= version:
+            continue
+        with db.engine.begin() as conn:
+            fn(conn)
+            conn.execute(schema_version.insert().values(version=number, description=description))
+        applied.append(number)
+    return applied
+
+
+def seed_admin():
+    """Creates the ADMIN_USERNAME account if it is missing. Returns whether it did."""
+    config = current_app.config
+    if User.query.filter_by(username=config['ADMIN_USERNAME']).first():
+        return False
+    db.session.add(User(
+        username=config['ADMIN_USERNAME'],
+        password=generate_password_hash(config['ADMIN_PASSWORD']),
+        full_name='Parking Admin',
+        role='admin',
+        email='admin@parkingapp.com'
+    ))
+    db.session.commit()
+    return True
+
+
+def bootstrap():
+    """Creates missing tables, applies pending migrations and seeds the admin
+    account. Returns (migrations applied, whether the admin was created)."""
+    db.create_all()
+    applied = upgrade_schema()
+    return applied, seed_admin()
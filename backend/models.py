@@ -9,18 +9,38 @@ class User(db.Model):
     full_name = db.Column(db.String(200))
     role = db.Column(db.String(20), default='user')
     last_visit = db.Column(db.DateTime)
+    # Bumped whenever the user's sessions (history, summary) change; see utils.http_cache.
+    sessions_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     sessions = db.relationship('ParkingSession', backref='user', lazy=True)
     exports = db.relationship('ExportJob', backref='user', lazy=True)
 
+class TariffPlan(db.Model):
+    """Pricing rules for the lots that use it; see utils.billing."""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False)
+    # [{'start': 8, 'end': 18, 'rate': 20.0}, ...] in hours of the (UTC) day;
+    # hours outside every band are billed at the lot's rate_per_hour.
+    bands = db.Column(db.JSON, nullable=False, default=list)
+    grace_minutes = db.Column(db.Integer, nullable=False, default=0)
+    minimum_hours = db.Column(db.Float, nullable=False, default=1.0)
+    daily_cap = db.Column(db.Float, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class ParkingLot(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     location = db.Column(db.Text)
     capacity = db.Column(db.Integer, nullable=False)
     rate_per_hour = db.Column(db.Float, default=10.0)
+    occupied_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Bumped on every change to the lot or its spots; see utils.http_cache.
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    tariff_id = db.Column(db.Integer, db.ForeignKey('tariff_plan.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Loaded only where a lot is priced (utils.billing), not with every lot query.
+    tariff = db.relationship('TariffPlan')
     spots = db.relationship(
         'ParkingSpot', 
         backref='lot',
@@ -29,14 +49,25 @@ class ParkingLot(db.Model):
     )
 
 class ParkingSpot(db.Model):
+    __table_args__ = (
+        db.Index('ix_parking_spot_lot_occupied', 'lot_id', 'is_occupied'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=False)
     spot_number = db.Column(db.String(50), nullable=False)
     is_occupied = db.Column(db.Boolean, default=False)
+    is_active = db.Column(db.Boolean, nullable=False, default=True, server_default='1')
     
     current_session_id = db.Column(db.Integer, db.ForeignKey('parking_session.id'), nullable=True)
 
 class ParkingSession(db.Model):
+    __table_args__ = (
+        db.Index('ix_parking_session_user_status', 'user_id', 'status'),
+        db.Index('ix_parking_session_user_entry', 'user_id', 'entry_time'),
+        db.Index('ix_parking_session_lot_exit', 'lot_id', 'exit_time'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=False)
@@ -51,11 +82,91 @@ class ParkingSession(db.Model):
     spot = db.relationship('ParkingSpot', foreign_keys=[spot_id], backref='all_sessions')
     lot = db.relationship('ParkingLot', backref='sessions')
 
+class SpotHold(db.Model):
+    """A spot kept for a user for a few minutes before they park; see utils.holds."""
+    __table_args__ = (
+        # Due holds are read in expiry order from this index, like a delay queue.
+        db.Index('ix_spot_hold_status_expires', 'status', 'expires_at'),
+        db.Index('ix_spot_hold_user_status', 'user_id', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=False)
+    spot_id = db.Column(db.Integer, db.ForeignKey('parking_spot.id'), nullable=False)
+    # HELD until the user parks (CLAIMED), cancels (CANCELLED) or runs out of time (EXPIRED).
+    status = db.Column(db.String(20), nullable=False, default='HELD')
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    released_at = db.Column(db.DateTime, nullable=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('parking_session.id'), nullable=True)
+    spot = db.relationship('ParkingSpot')
+
 class ExportJob(db.Model):
+    __table_args__ = (
+        db.Index('ix_export_job_user_created', 'user_id', 'created_at'),
+        db.Index('ix_export_job_created', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     celery_task_id = db.Column(db.String(100), unique=True, nullable=False)
     status = db.Column(db.String(20), default='PENDING', nullable=False)
     file_path = db.Column(db.String(255), nullable=True)
+    # State of the user's history when the job was queued; see utils.export_jobs.
+    history_fingerprint = db.Column(db.String(100), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    completed_at = db.Column(db.DateTime, nullable=True)
\ No newline at end of file
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+class LotDailyStat(db.Model):
+    """Completed sessions per lot and entry day, kept by utils.rollups."""
+    __table_args__ = (
+        db.UniqueConstraint('lot_id', 'day', name='uq_lot_daily_stat'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    duration_seconds = db.Column(db.Float, nullable=False, default=0.0)
+
+class UserDailyStat(db.Model):
+    """Completed sessions per user, lot and entry day, kept by utils.rollups."""
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'lot_id', 'day', name='uq_user_daily_stat'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    duration_seconds = db.Column(db.Float, nullable=False, default=0.0)
+
+class LotOccupancyDay(db.Model):
+    """One lot's day of occupancy in fixed buckets, kept by utils.occupancy_series."""
+    __table_args__ = (
+        db.UniqueConstraint('lot_id', 'day', name='uq_lot_occupancy_day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    capacity = db.Column(db.Integer, nullable=False, default=0)
+    # float32 occupied spot-seconds per bucket, BUCKETS_PER_DAY of them
+    buckets = db.Column(db.LargeBinary, nullable=False)
+
+class TaskRun(db.Model):
+    """What one run of a periodic Celery task did, for monitoring."""
+    __table_args__ = (
+        db.Index('ix_task_run_task_started', 'task', 'started_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    task = db.Column(db.String(100), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    duration_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    # Task specific counters, e.g. {'selected': 1200, 'sent': 1198, 'failed': 2}
+    stats = db.Column(db.JSON, nullable=False, default=dict)
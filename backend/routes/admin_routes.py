@@ -1,35 +1,32 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from utils.auth import admin_required
-from models import ParkingLot, ParkingSpot, User, ParkingSession
-from extensions import db, cache
+from utils.spot_allocator import spot_allocator
+from utils.availability import lot_availability, invalidate_availability
+from utils.spot_provisioning import provision_spots, resize_lot, CapacityError
+from utils.search_index import ranked_search
+from utils.occupancy_events import lot_change_event, spot_change_events, publish_events
+from utils.batch_parking import park_batch, unpark_batch
+from utils.billing import validate_bands, TariffError
+from utils.occupancy_series import occupancy_history, forecast_occupancy, BUCKET_MINUTES
+from utils.holds import held_counts, announce_released
+from utils.http_cache import conditional_get, lot_version, lots_version, bump_lot_versions, bump_sessions_versions
+from models import ParkingLot, ParkingSpot, User, ParkingSession, LotDailyStat, UserDailyStat, LotOccupancyDay, TariffPlan, TaskRun, SpotHold
+from extensions import db
 from sqlalchemy import func
+from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__)
 
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
 # ------------------------------------------- Parking Lot Management -------------------------------------------
 
 @admin_bp.route('/lots', methods=['GET'])
 @admin_required
+@conditional_get(lot_availability)
 def list_lots():
-    lots_data = db.session.query(
-        ParkingLot.id, 
-        ParkingLot.name, 
-        ParkingLot.location, 
-        ParkingLot.capacity,
-        ParkingLot.rate_per_hour,
-        func.count(ParkingSpot.id).filter(ParkingSpot.is_occupied == True).label('occupied_count')
-    ).outerjoin(ParkingSpot).group_by(ParkingLot.id).all()
-    
-    lots = [{
-        'id': l.id, 
-        'name': l.name, 
-        'location': l.location,
-        'capacity': l.capacity,
-        'rate': l.rate_per_hour,
-        'occupied': l.occupied_count,
-        'available': l.capacity - l.occupied_count
-    } for l in lots_data]
-    return jsonify(lots)
+    return jsonify(lot_availability())
 
 @admin_bp.route('/users/<int:limit>', methods=['GET'])
 @admin_required
@@ -75,17 +72,15 @@ def create_lot():
     db.session.add(lot)
     db.session.flush()
     
-    for i in range(1, capacity + 1):
-        spot = ParkingSpot(
-            lot_id=lot.id,
-            spot_number=f"SPOT-{i}",
-            is_occupied=False
-        )
-        db.session.add(spot)
+    lot_id = lot.id
+    provision_spots(lot_id, capacity)
+    events = lot_change_event(lot_id)
         
     db.session.commit()
-    cache.delete('user_available_lots') 
-    return jsonify({'message': 'Parking Lot and Spots created', 'id': lot.id}), 201
+    spot_allocator.reload(lot_id)
+    invalidate_availability() 
+    publish_events(events)
+    return jsonify({'message': 'Parking Lot and Spots created', 'id': lot_id}), 201
 
 @admin_bp.route('/lots/<int:lid>', methods=['PUT'])
 @admin_required
@@ -96,9 +91,33 @@ def update_lot(lid):
     lot.name = data.get('name', lot.name)
     lot.location = data.get('location', lot.location)
     lot.rate_per_hour = data.get('rate_per_hour', lot.rate_per_hour)
+
+    if 'tariff_id' in data:
+        if data['tariff_id'] is not None and not TariffPlan.query.get(data['tariff_id']):
+            return jsonify({'error': 'Unknown tariff plan'}), 400
+        lot.tariff_id = data['tariff_id']
+
+    if 'capacity' in data:
+        try:
+            capacity = int(data['capacity'])
+        except (TypeError, ValueError):
+            capacity = 0
+        if capacity <= 0:
+            return jsonify({'error': 'Valid capacity required'}), 400
+        try:
+            resize_lot(lot, capacity)
+        except CapacityError as e:
+            db.session.rollback()
+            spot_allocator.reload(lid)
+            return jsonify({'error': str(e)}), 400
+    bump_lot_versions([lid])
+    events = lot_change_event(lid)
     
     db.session.commit()
-    cache.delete('user_available_lots')
+    if 'capacity' in data:
+        spot_allocator.reload(lid)
+    invalidate_availability()
+    publish_events(events)
     return jsonify({'message': 'Lot updated'})
 
 @admin_bp.route('/lots/<int:lid>', methods=['DELETE'])
@@ -106,19 +125,158 @@ def update_lot(lid):
 def delete_lot(lid):
     lot = ParkingLot.query.get_or_404(lid)
     
-    occupied_spots = ParkingSpot.query.filter_by(lot_id=lid, is_occupied=True).count()
-    if occupied_spots > 0:
+    if lot.occupied_count > 0:
         return jsonify({'error': 'Cannot delete lot. Vehicles are currently parked here.'}), 400
         
+    # The lot's past sessions and everything kept about them go with it, so
+    # its drivers' history and summary change. No spot is occupied, so every
+    # hold on the lot has ended.
+    user_ids = [r.user_id for r in db.session.query(ParkingSession.user_id)
+                .filter(ParkingSession.lot_id == lid).distinct()]
+    bump_sessions_versions(user_ids)
+    for model in (SpotHold, UserDailyStat, LotDailyStat, LotOccupancyDay, ParkingSession):
+        model.query.filter_by(lot_id=lid).delete(synchronize_session=False)
     db.session.delete(lot)
+    events = lot_change_event(lid)
     db.session.commit()
-    cache.delete('user_available_lots')
+    spot_allocator.drop_lot(lid)
+    invalidate_availability()
+    publish_events(events)
     return jsonify({'message': 'Lot deleted'})
 
+# ------------------------------------------- Tariff Plans -------------------------------------------
+
+def _tariff_json(plan):
+    return {
+        'id': plan.id,
+        'name': plan.name,
+        'bands': plan.bands,
+        'grace_minutes': plan.grace_minutes,
+        'minimum_hours': plan.minimum_hours,
+        'daily_cap': plan.daily_cap,
+        'lots': [lot.id for lot in ParkingLot.query.filter_by(tariff_id=plan.id)]
+    }
+
+def _apply_tariff_fields(plan, data):
+    if 'name' in data:
+        if not data['name']:
+            raise TariffError('Name required')
+        plan.name = data['name']
+    if 'bands' in data:
+        plan.bands = validate_bands(data['bands'])
+    try:
+        if 'grace_minutes' in data:
+            plan.grace_minutes = max(0, int(data['grace_minutes']))
+        if 'minimum_hours' in data:
+            plan.minimum_hours = max(0.0, float(data['minimum_hours']))
+        if 'daily_cap' in data:
+            plan.daily_cap = float(data['daily_cap']) if data['daily_cap'] is not None else None
+    except (TypeError, ValueError):
+        raise TariffError('grace_minutes, minimum_hours and daily_cap must be numbers')
+
+@admin_bp.route('/tariffs', methods=['GET'])
+@admin_required
+def list_tariffs():
+    return jsonify([_tariff_json(plan) for plan in TariffPlan.query.order_by(TariffPlan.id)])
+
+@admin_bp.route('/tariffs', methods=['POST'])
+@admin_required
+def create_tariff():
+    data = request.get_json() or {}
+    plan = TariffPlan(bands=[], grace_minutes=0, minimum_hours=1.0)
+    try:
+        _apply_tariff_fields(plan, data)
+        if not plan.name:
+            raise TariffError('Name required')
+    except TariffError as e:
+        return jsonify({'error': str(e)}), 400
+    if TariffPlan.query.filter_by(name=plan.name).first():
+        return jsonify({'error': 'Tariff plan exists'}), 400
+    db.session.add(plan)
+    db.session.commit()
+    return jsonify({'message': 'Tariff plan created', 'id': plan.id}), 201
+
+@admin_bp.route('/tariffs/<int:tid>', methods=['PUT'])
+@admin_required
+def update_tariff(tid):
+    """Changes apply to sessions completed from now on; re-price history
+    with `flask reprice-sessions`."""
+    plan = TariffPlan.query.get_or_404(tid)
+    try:
+        _apply_tariff_fields(plan, request.get_json() or {})
+    except TariffError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+    return jsonify({'message': 'Tariff plan updated'})
+
+# ------------------------------------------- Gate Batches -------------------------------------------
+
+def _batch_items():
+    items = (request.get_json() or {}).get('items')
+    if not isinstance(items, list) or not items or not all(isinstance(i, dict) for i in items):
+        return None, (jsonify({'error': 'items must be a non-empty list of objects'}), 400)
+    limit = current_app.config.get('GATE_BATCH_MAX_ITEMS', 500)
+    if len(items) > limit:
+        return None, (jsonify({'error': f'At most {limit} items per batch'}), 400)
+    return items, None
+
+def _batch_response(results):
+    succeeded = sum(1 for r in results if r['ok'])
+    return jsonify({'results': results, 'succeeded': succeeded, 'failed': len(results) - succeeded})
+
+@admin_bp.route('/gate/park', methods=['POST'])
+@admin_required
+def gate_park():
+    """Parks {user_id, lot_id, vehicle_number} items in one transaction; items
+    that cannot be parked are reported per item and do not stop the rest."""
+    items, error = _batch_items()
+    if error:
+        return error
+    spots = []
+    try:
+        results, spots, released = park_batch(items)
+        freed_events = spot_change_events(released, False)
+        taken_events = spot_change_events(spots, True)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for spot in spots:
+            spot_allocator.release(spot.lot_id, spot.id)
+        return jsonify({'error': str(e)}), 500
+    announce_released(released, freed_events)
+    if spots:
+        invalidate_availability()
+        publish_events(taken_events)
+    return _batch_response(results)
+
+@admin_bp.route('/gate/unpark', methods=['POST'])
+@admin_required
+def gate_unpark():
+    """Completes the sessions of {session_id} or {vehicle_number} items in one
+    transaction, charging each like /user/unpark."""
+    items, error = _batch_items()
+    if error:
+        return error
+    try:
+        results, spots = unpark_batch(items)
+        events = spot_change_events(spots, False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    for spot in spots:
+        spot_allocator.release(spot.lot_id, spot.id)
+    if spots:
+        invalidate_availability()
+        publish_events(events)
+    return _batch_response(results)
+
 # ------------------------------------------- Spot Tracking -------------------------------------------
 
 @admin_bp.route('/lots/<int:lid>/spots', methods=['GET'])
 @admin_required
+@conditional_get(lambda lid: lot_version(lid))
 def view_lot_spots(lid):
     spots = db.session.query(
         ParkingSpot.id,
@@ -129,12 +287,14 @@ def view_lot_spots(lid):
         User.username
     ).outerjoin(ParkingSession, ParkingSpot.current_session_id == ParkingSession.id)\
      .outerjoin(User, ParkingSession.user_id == User.id)\
-     .filter(ParkingSpot.lot_id == lid).all()
+     .filter(ParkingSpot.lot_id == lid, ParkingSpot.is_active == True)\
+     .order_by(ParkingSpot.id).all()
      
     result = [{
         'id': s.id,
         'spot_number': s.spot_number,
-        'status': 'Occupied' if s.is_occupied else 'Free',
+        # Held spots are taken but have no session yet.
+        'status': ('Occupied' if s.vehicle_number else 'Reserved') if s.is_occupied else 'Free',
         'vehicle': s.vehicle_number if s.is_occupied else None,
         'parked_by': s.username if s.is_occupied else None,
         'since': s.entry_time.strftime('%Y-%m-%d %H:%M') if s.entry_time else None
@@ -142,27 +302,81 @@ def view_lot_spots(lid):
     
     return jsonify(result)
 
+# ------------------------------------------- Occupancy History -------------------------------------------
+
+@admin_bp.route('/lots/<int:lid>/occupancy', methods=['GET'])
+@admin_required
+def lot_occupancy_history(lid):
+    lot = ParkingLot.query.get_or_404(lid)
+    days = request.args.get('days', 30, type=int)
+    if not 1 <= days <= 366:
+        return jsonify({'error': 'days must be between 1 and 366'}), 400
+
+    today = datetime.utcnow().date()
+    day_list, occupied = occupancy_history(lot.id, today - timedelta(days=days - 1), today)
+    return jsonify({
+        'lot_id': lot.id,
+        'capacity': lot.capacity,
+        'interval_minutes': BUCKET_MINUTES,
+        'days': [day.isoformat() for day in day_list],
+        # Average occupied spots per interval, one row per day.
+        'occupied': occupied.round(2).tolist(),
+        'profile': occupied.mean(axis=0).round(2).tolist(),
+        'peak': round(float(occupied.max()), 2)
+    })
+
+@admin_bp.route('/lots/<int:lid>/forecast', methods=['GET'])
+@admin_required
+def lot_occupancy_forecast(lid):
+    lot = ParkingLot.query.get_or_404(lid)
+    hours = request.args.get('hours', 24, type=int)
+    weeks = request.args.get('weeks', 4, type=int)
+    if not 1 <= hours <= 168 or not 1 <= weeks <= 52:
+        return jsonify({'error': 'hours must be between 1 and 168 and weeks between 1 and 52'}), 400
+
+    # Held spots are occupied but not parked in, and the history only counts parking.
+    parked = lot.occupied_count - held_counts([lot.id]).get(lot.id, 0)
+    return jsonify({
+        'lot_id': lot.id,
+        'capacity': lot.capacity,
+        'occupied_now': parked,
+        'interval_minutes': BUCKET_MINUTES,
+        'forecast': [{
+            'at': at.isoformat(),
+            'expected_occupied': round(expected, 1),
+            'expected_free': round(lot.capacity - expected, 1)
+        } for at, expected in forecast_occupancy(lot, hours=hours, weeks=weeks, occupied_now=parked)]
+    })
+
 # ------------------------------------------- Summary ----------------------------------------------
 
 @admin_bp.route('/summary', methods=['GET'])
 @admin_required
+@conditional_get(lots_version)
 def get_admin_summary():    
     total_users = User.query.filter_by(role='user').count()
-    total_lots = ParkingLot.query.count()
-    total_capacity = db.session.query(func.sum(ParkingLot.capacity)).scalar() or 0
-    current_occupancy = ParkingSpot.query.filter_by(is_occupied=True).count()
+    total_lots, total_capacity, current_occupancy = db.session.query(
+        func.count(ParkingLot.id),
+        func.coalesce(func.sum(ParkingLot.capacity), 0),
+        func.coalesce(func.sum(ParkingLot.occupied_count), 0)
+    ).one()
     
+    # Completed sessions come from the daily rollups; active ones are the
+    # lot's occupied spots less those only held.
+    held = held_counts()
     lot_stats = db.session.query(
+        ParkingLot.id,
         ParkingLot.name,
-        func.count(ParkingSession.id).label('total_bookings'),
-        func.sum(ParkingSession.amount_paid).label('total_revenue')
-    ).outerjoin(ParkingSession).group_by(ParkingLot.id).all()
+        ParkingLot.occupied_count,
+        func.coalesce(func.sum(LotDailyStat.sessions), 0).label('total_bookings'),
+        func.sum(LotDailyStat.revenue).label('total_revenue')
+    ).outerjoin(LotDailyStat, LotDailyStat.lot_id == ParkingLot.id).group_by(ParkingLot.id).all()
     
     lot_summary = [{
         'name': name,
-        'bookings': bookings,
+        'bookings': bookings + occupied - held.get(lot_id, 0),
         'revenue': round(revenue or 0, 2)
-    } for name, bookings, revenue in lot_stats]
+    } for lot_id, name, occupied, bookings, revenue in lot_stats]
 
     return jsonify({
         'total_users': total_users,
@@ -172,6 +386,24 @@ def get_admin_summary():
         'lot_analytics': lot_summary
     })
 
+# ------------------------------------------- Task Runs -------------------------------------------
+
+@admin_bp.route('/task-runs', methods=['GET'])
+@admin_required
+def list_task_runs():
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    query = TaskRun.query
+    if request.args.get('task'):
+        query = query.filter(TaskRun.task == request.args['task'])
+    runs = query.order_by(TaskRun.started_at.desc(), TaskRun.id.desc()).limit(limit).all()
+    return jsonify([{
+        'id': run.id,
+        'task': run.task,
+        'started_at': run.started_at.isoformat(),
+        'duration_seconds': run.duration_seconds,
+        'stats': run.stats
+    } for run in runs])
+
 # ------------------------------------------- Search API -------------------------------------------
 @admin_bp.route('/search', methods=['GET'])
 @admin_required
@@ -180,13 +412,11 @@ def admin_search():
     if not query_string:
         return jsonify({"message": "Search query parameter 'q' is missing."}), 400
 
-    search_term = f'%{query_string}%'
+    limit = min(max(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), 1), SEARCH_MAX_PAGE_SIZE)
+    offset = max(request.args.get('offset', 0, type=int), 0)
     
     # 1. Search Users
-    users = User.query.filter(
-        (func.lower(User.username).like(search_term)) | 
-        (func.lower(User.email).like(search_term))
-    ).all()
+    users = ranked_search(User, 'search_users', [User.username, User.email], query_string, limit, offset)
     
     user_results = [{
         'id': user.id, 
@@ -196,10 +426,7 @@ def admin_search():
     } for user in users]
 
     # 2. Search Lots (Name OR Location)
-    lots = ParkingLot.query.filter(
-        (func.lower(ParkingLot.name).like(search_term)) | 
-        (func.lower(ParkingLot.location).like(search_term))
-    ).all()
+    lots = ranked_search(ParkingLot, 'search_lots', [ParkingLot.name, ParkingLot.location], query_string, limit, offset)
     
     lot_results = [{
         'id': lot.id, 
@@ -209,7 +436,8 @@ def admin_search():
     } for lot in lots]
 
     # 3. Search Spots
-    spots = ParkingSpot.query.filter(func.lower(ParkingSpot.spot_number).like(search_term)).all()
+    spots = ranked_search(ParkingSpot, 'search_spots', [ParkingSpot.spot_number], query_string, limit, offset,
+                          filters=[ParkingSpot.is_active == True])
     spot_results = [{
         'id': spot.id, 
         'name': spot.spot_number, 
@@ -220,6 +448,8 @@ def admin_search():
     return jsonify({
         "message": "Search successful.",
         "query": query_string,
+        "limit": limit,
+        "offset": offset,
         "results": {
             "users": user_results,
             "lots": lot_results,
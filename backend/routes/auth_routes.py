@@ -16,13 +16,16 @@ def register():
     
     if not username or not password or not email:
         return jsonify({'error': 'username, password, and email required'}), 400
-        
+
+    # Hashed before the first query: on SQLite a write request's transaction
+    # holds the write lock (utils/db_tuning.py), and hashing takes a while.
+    password_hash = generate_password_hash(password)
     if User.query.filter_by(username=username).first():
         return jsonify({'error': 'User exists'}), 400
         
     user = User(
         username=username,
-        password=generate_password_hash(password),
+        password=password_hash,
         full_name=data.get('full_name'),
         role='user',
         email=email 
@@ -40,11 +43,15 @@ def login():
     if not username or not password:
         return jsonify({'error': 'username and password required'}), 400
     user = User.query.filter_by(username=username).first()
-    if not user or not check_password_hash(user.password, password):
+    password_hash = user.password if user else None
+    # End the lookup's transaction, and with it the SQLite write lock, before
+    # the slow hash check; recording the visit takes it again briefly.
+    db.session.rollback()
+    if not user or not check_password_hash(password_hash, password):
         return jsonify({'error': 'invalid credentials'}), 401
     
-    token = generate_token(user)
     user.last_visit = datetime.utcnow()
+    token = generate_token(user)
     db.session.commit()
     
     return jsonify({'message': 'login successful', 'token': token, 'role': user.role}), 200
\ No newline at end of file
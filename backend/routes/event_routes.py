@@ -0,0 +1,32 @@
+from flask import Blueprint, current_app, jsonify, request, Response
+from utils.auth import token_required, stream_token_required, generate_stream_token
+from utils.occupancy_events import occupancy_events
+
+events_bp = Blueprint('events', __name__)
+
+
+@events_bp.route('/token', methods=['POST'])
+@token_required
+def stream_token():
+    """A short-lived token for opening an event stream with EventSource,
+    which cannot send the Authorization header."""
+    return jsonify({
+        'stream_token': generate_stream_token(request.current_user),
+        'expires_in': current_app.config.get('STREAM_TOKEN_TTL', 60)
+    })
+
+
+@events_bp.route('/occupancy', methods=['GET'])
+@stream_token_required
+def occupancy_stream():
+    """Server-Sent Events of occupancy changes: `spot` when a spot is taken or
+    freed, `lot` when a lot is created, resized or deleted (both carry the
+    lot's capacity/occupied/available counts), and `resync` when events were
+    lost and the client should re-fetch. ?lot_id= limits the stream to one lot.
+
+    The generator holds no app context or database session while waiting."""
+    sub = occupancy_events.subscribe(request.args.get('lot_id', type=int))
+    return Response(occupancy_events.stream(sub), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
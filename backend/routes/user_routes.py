@@ -1,29 +1,47 @@
-from flask import Blueprint, request, jsonify
-from tasks import export_user_csv
+from flask import Blueprint, request, jsonify, Response, stream_with_context, send_file
+from itsdangerous import BadSignature
 from utils.auth import token_required
-from models import ParkingLot, ParkingSpot, ParkingSession, ExportJob
+from utils.spot_allocator import spot_allocator, claim_spot, free_spot
+from utils.availability import lot_availability, availability_by_lot, invalidate_availability
+from utils.export_links import export_download_url, load_export_download_token
+from utils.export_jobs import history_fingerprint, reusable_export, export_status
+from utils.search_index import ranked_search, match_subquery
+from utils.rollups import record_completed_session
+from utils.occupancy_series import record_completed_occupancy
+from utils.billing import Tariff, parking_charge
+from utils.occupancy_events import spot_change_events, publish_events
+from utils.holds import HoldError, live_hold, place_hold, cancel_hold, claim_hold, announce_released
+from utils.http_cache import conditional_get, sessions_version, bump_sessions_versions
+from models import ParkingLot, ParkingSpot, ParkingSession, ExportJob, UserDailyStat
 from extensions import db, cache
 from datetime import datetime
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, or_, and_
+from sqlalchemy.orm import joinedload
+import base64
+import json
+import os
+import uuid
 
 user_bp = Blueprint('user', __name__)
 
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+HISTORY_STREAM_BATCH = 500
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
 
 @user_bp.route('/lots', methods=['GET'])
 @token_required
+@conditional_get(lot_availability)
 def list_available_lots():
-    lots = ParkingLot.query.all()
-    result = []
-    for lot in lots:
-        occupied = ParkingSpot.query.filter_by(lot_id=lot.id, is_occupied=True).count()
-        if occupied < lot.capacity:
-            result.append({
-                'id': lot.id,
-                'name': lot.name,
-                'location': lot.location,
-                'rate': lot.rate_per_hour,
-                'available_spots': lot.capacity - occupied
-            })
+    result = [{
+        'id': lot['id'],
+        'name': lot['name'],
+        'location': lot['location'],
+        'rate': lot['rate'],
+        'available_spots': lot['available']
+    } for lot in lot_availability() if lot['available'] > 0]
     return jsonify(result)
 
 @user_bp.route('/park', methods=['POST'])
@@ -41,16 +59,31 @@ def park_vehicle():
     if active_session:
         return jsonify({'error': 'You already have a vehicle parked. Please unpark first.'}), 400
 
-    spot = ParkingSpot.query.filter_by(lot_id=lot_id, is_occupied=False).with_for_update().first()
+    try:
+        lot_id = int(lot_id)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid Lot ID'}), 400
+
+    # A driver holding a spot parks in it; nobody else could have taken it.
+    released = []
+    hold = live_hold(user.id, released=released)
+    if hold is not None:
+        if hold.lot_id != lot_id:
+            return jsonify({'error': 'You hold a spot in another lot. Park there or cancel the hold first.'}), 400
+        spot = hold.spot
+    else:
+        spot = claim_spot(lot_id)
     
     if not spot:
+        db.session.rollback()
         return jsonify({'error': 'Parking Lot is full'}), 400
-        
+
+    spot_id = spot.id
     try:
         session = ParkingSession(
             user_id=user.id,
             lot_id=lot_id,
-            spot_id=spot.id,
+            spot_id=spot_id,
             vehicle_number=vehicle_number,
             entry_time=datetime.utcnow(),
             status='ACTIVE'
@@ -58,21 +91,77 @@ def park_vehicle():
         db.session.add(session)
         db.session.flush() 
         
-        spot.is_occupied = True
-        spot.current_session_id = session.id
+        if hold is not None:
+            if not claim_hold(hold, session):
+                db.session.rollback()
+                return jsonify({'error': 'Your hold has expired'}), 409
+        else:
+            spot.current_session_id = session.id
+        bump_sessions_versions([user.id])
+        # Everything the response and the events need is read before the
+        # commit; nothing after it touches the database.
+        session_id, spot_number = session.id, spot.spot_number
+        freed_events = spot_change_events(released, False)
+        taken_events = spot_change_events([spot], True) if hold is None else []
         
         db.session.commit()
+        announce_released(released, freed_events)
+        if hold is None:
+            invalidate_availability()
+            publish_events(taken_events)
         return jsonify({
             'message': 'Parking successful',
-            'session_id': session.id,
-            'spot_number': spot.spot_number,
+            'session_id': session_id,
+            'spot_number': spot_number,
             'vehicle': vehicle_number
         }), 201
         
     except Exception as e:
         db.session.rollback()
+        if hold is None:
+            spot_allocator.release(lot_id, spot_id)
         return jsonify({'error': str(e)}), 500
 
+def _hold_json(hold):
+    return {
+        'hold_id': hold.id,
+        'lot_id': hold.lot_id,
+        'spot_number': hold.spot.spot_number,
+        'expires_at': hold.expires_at.isoformat(),
+        'seconds_left': max(0, int((hold.expires_at - datetime.utcnow()).total_seconds()))
+    }
+
+@user_bp.route('/hold', methods=['POST'])
+@token_required
+def hold_spot():
+    """Keeps a spot in lot_id for `minutes` (HOLD_DEFAULT_MINUTES when not
+    given) until the user parks there; see utils.holds."""
+    data = request.get_json() or {}
+    try:
+        lot_id = int(data.get('lot_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid Lot ID'}), 400
+    try:
+        hold = place_hold(request.current_user, lot_id, data.get('minutes'))
+    except HoldError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(_hold_json(hold), message='Spot held')), 201
+
+@user_bp.route('/hold', methods=['GET'])
+@token_required
+def get_hold():
+    hold = live_hold(request.current_user.id)
+    if hold is None:
+        return jsonify({'error': 'No active hold'}), 404
+    return jsonify(_hold_json(hold))
+
+@user_bp.route('/hold', methods=['DELETE'])
+@token_required
+def release_hold():
+    if not cancel_hold(request.current_user.id):
+        return jsonify({'error': 'No active hold'}), 404
+    return jsonify({'message': 'Hold cancelled'})
+
 @user_bp.route('/unpark', methods=['POST'])
 @token_required
 def unpark_vehicle():
@@ -82,47 +171,133 @@ def unpark_vehicle():
         return jsonify({'error': 'No active parking session found'}), 404
         
     spot = ParkingSpot.query.get(session.spot_id)
-    lot = ParkingLot.query.get(session.lot_id)
+    lot = ParkingLot.query.options(joinedload(ParkingLot.tariff)).get(session.lot_id)
     
     now = datetime.utcnow()
-    duration_hours = (now - session.entry_time).total_seconds() / 3600
-    chargeable_hours = max(1, round(duration_hours, 2))
-    amount = round(chargeable_hours * lot.rate_per_hour, 2)
+    duration_hours, amount = parking_charge(session.entry_time, now, Tariff.for_lot(lot))
     
     session.exit_time = now
     session.amount_paid = amount
     session.status = 'COMPLETED'
+    record_completed_session(session)
+    record_completed_occupancy([session])
+    bump_sessions_versions([user.id])
     
-    spot.is_occupied = False
-    spot.current_session_id = None
+    free_spot(spot)
+    lot_id, spot_id, spot_number = spot.lot_id, spot.id, spot.spot_number
+    events = spot_change_events([spot], False)
     
     db.session.commit()
+    spot_allocator.release(lot_id, spot_id)
+    invalidate_availability()
+    publish_events(events)
     
     return jsonify({
         'message': 'Vehicle unparked successfully',
         'duration_hours': round(duration_hours, 2),
         'amount_paid': amount,
-        'spot_released': spot.spot_number
+        'spot_released': spot_number
     })
 
 @user_bp.route('/history', methods=['GET'])
 @token_required
+@conditional_get(lambda: sessions_version(request.current_user.id))
 def parking_history():
+    """Keyset-paginated history, newest first.
+
+    ?limit=N (default 50, max 500) and ?cursor=<next_cursor from the previous
+    page> page through sessions by (entry_time, id). ?format=ndjson streams
+    one JSON object per line instead, from the cursor: the whole rest of the
+    history unless a limit is given, which must then be a positive integer
+    and is not capped."""
     user = request.current_user
-    sessions = ParkingSession.query.filter_by(user_id=user.id).order_by(ParkingSession.entry_time.desc()).all()
-    
-    result = [{
-        'id': s.id,
-        'lot_name': s.lot.name,
-        'spot': s.spot.spot_number,
-        'vehicle': s.vehicle_number,
-        'entry': s.entry_time.isoformat() + 'Z', 
-        'exit': (s.exit_time.isoformat() + 'Z') if s.exit_time else 'Active',
-        'amount': s.amount_paid,
-        'status': s.status
-    } for s in sessions]
-    
-    return jsonify(result)
+    try:
+        cursor = _decode_history_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    limit = request.args.get('limit', type=int)
+
+    query = _history_query(user.id, cursor)
+
+    if request.args.get('format') == 'ndjson':
+        if 'limit' in request.args:
+            if limit is None or limit <= 0:
+                return jsonify({'error': 'limit must be a positive integer'}), 400
+            query = query.limit(limit)
+
+        def generate():
+            # One chunk per batch fetched, so a compressed stream flushes
+            # each batch to the client without a flush per line.
+            lines = []
+            for row in query.yield_per(HISTORY_STREAM_BATCH):
+                lines.append(json.dumps(_history_row(row)) + '\n')
+                if len(lines) == HISTORY_STREAM_BATCH:
+                    yield ''.join(lines)
+                    lines = []
+            if lines:
+                yield ''.join(lines)
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    limit = min(max(limit or HISTORY_PAGE_SIZE, 1), HISTORY_MAX_PAGE_SIZE)
+    rows = query.limit(limit + 1).all()
+    next_cursor = _encode_history_cursor(rows[limit - 1]) if len(rows) > limit else None
+
+    return jsonify({
+        'items': [_history_row(r) for r in rows[:limit]],
+        'next_cursor': next_cursor
+    })
+
+
+def _history_query(user_id, cursor=None):
+    query = db.session.query(
+        ParkingSession.id,
+        ParkingLot.name.label('lot_name'),
+        ParkingSpot.spot_number,
+        ParkingSession.vehicle_number,
+        ParkingSession.entry_time,
+        ParkingSession.exit_time,
+        ParkingSession.amount_paid,
+        ParkingSession.status
+    ).join(ParkingLot, ParkingSession.lot_id == ParkingLot.id)\
+     .join(ParkingSpot, ParkingSession.spot_id == ParkingSpot.id)\
+     .filter(ParkingSession.user_id == user_id)
+
+    if cursor:
+        entry_time, session_id = cursor
+        query = query.filter(or_(
+            ParkingSession.entry_time < entry_time,
+            and_(ParkingSession.entry_time == entry_time, ParkingSession.id < session_id)
+        ))
+    return query.order_by(ParkingSession.entry_time.desc(), ParkingSession.id.desc())
+
+
+def _history_row(r):
+    return {
+        'id': r.id,
+        'lot_name': r.lot_name,
+        'spot': r.spot_number,
+        'vehicle': r.vehicle_number,
+        'entry': r.entry_time.isoformat() + 'Z',
+        'exit': (r.exit_time.isoformat() + 'Z') if r.exit_time else 'Active',
+        'amount': r.amount_paid,
+        'status': r.status
+    }
+
+
+def _encode_history_cursor(row):
+    raw = f'{row.entry_time.isoformat()}|{row.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_history_cursor(value):
+    if not value:
+        return None
+    try:
+        entry, session_id = base64.urlsafe_b64decode(value.encode()).decode().split('|')
+        return datetime.fromisoformat(entry), int(session_id)
+    except Exception:
+        raise ValueError('invalid cursor')
 
 # ----------------- REVISED SEARCH WITH LOWER() -----------------
 @user_bp.route('/search', methods=['GET'])
@@ -134,33 +309,46 @@ def search_user_data():
     if not query_string:
         return jsonify({'lots': [], 'history': []})
         
-    search_term = f'%{query_string}%'
+    limit = min(max(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), 1), SEARCH_MAX_PAGE_SIZE)
+    offset = max(request.args.get('offset', 0, type=int), 0)
 
-    found_lots = ParkingLot.query.filter(
-        (func.lower(ParkingLot.name).like(search_term)) | 
-        (func.lower(ParkingLot.location).like(search_term))
-    ).all()
+    found_lots = ranked_search(ParkingLot, 'search_lots', [ParkingLot.name, ParkingLot.location],
+                               query_string, limit, offset)
     
-    lots_result = []
-    for lot in found_lots:
-        occupied = ParkingSpot.query.filter_by(lot_id=lot.id, is_occupied=True).count()
-        lots_result.append({
-            'id': lot.id,
-            'name': lot.name,
-            'location': lot.location,
-            'rate': lot.rate_per_hour,
-            'available_spots': lot.capacity - occupied
-        })
-
-    found_history = ParkingSession.query.join(ParkingLot).filter(
+    availability = availability_by_lot()
+    lots_result = [{
+        'id': lot.id,
+        'name': lot.name,
+        'location': lot.location,
+        'rate': lot.rate_per_hour,
+        'available_spots': availability[lot.id]['available'] if lot.id in availability else lot.capacity
+    } for lot in found_lots]
+
+    vehicle_match = match_subquery('search_sessions', query_string, owner_id=user.id)
+    if vehicle_match is not None:
+        history_filter = or_(
+            ParkingSession.id.in_(vehicle_match),
+            ParkingSession.lot_id.in_(match_subquery('search_lots', query_string, columns='name'))
+        )
+    else:
+        search_term = f'%{query_string}%'
+        history_filter = (func.lower(ParkingLot.name).like(search_term)) | \
+                         (func.lower(ParkingSession.vehicle_number).like(search_term))
+
+    found_history = db.session.query(
+        ParkingSession.id,
+        ParkingLot.name.label('lot_name'),
+        ParkingSession.entry_time,
+        ParkingSession.amount_paid,
+        ParkingSession.vehicle_number
+    ).join(ParkingLot, ParkingSession.lot_id == ParkingLot.id).filter(
         ParkingSession.user_id == user.id,
-        (func.lower(ParkingLot.name).like(search_term)) | 
-        (func.lower(ParkingSession.vehicle_number).like(search_term))
-    ).order_by(ParkingSession.entry_time.desc()).all()
+        history_filter
+    ).order_by(ParkingSession.entry_time.desc(), ParkingSession.id.desc()).limit(limit).offset(offset).all()
     
     history_result = [{
         'id': s.id,
-        'lot_name': s.lot.name,
+        'lot_name': s.lot_name,
         'entry_time': s.entry_time.strftime('%Y-%m-%d %H:%M'),
         'amount': s.amount_paid,
         'vehicle': s.vehicle_number
@@ -174,34 +362,39 @@ def search_user_data():
 # ----------------- REVISED SUMMARY WITH NEW CHART DATA -----------------
 @user_bp.route('/summary', methods=['GET'])
 @token_required
+@conditional_get(lambda: sessions_version(request.current_user.id))
 def user_summary():
     user = request.current_user
     
+    # Completed sessions come from the daily rollups; the one possibly
+    # active session is added on top so visits match the session table.
+    per_lot = db.session.query(
+        ParkingLot.name,
+        func.sum(UserDailyStat.sessions),
+        func.sum(UserDailyStat.revenue)
+    ).join(UserDailyStat, UserDailyStat.lot_id == ParkingLot.id).filter(
+        UserDailyStat.user_id == user.id
+    ).group_by(ParkingLot.name).order_by(ParkingLot.name).all()
+
+    active_lot = db.session.query(ParkingLot.name).join(
+        ParkingSession, ParkingSession.lot_id == ParkingLot.id
+    ).filter(ParkingSession.user_id == user.id, ParkingSession.status == 'ACTIVE').scalar()
+
     # Chart 1: Visits per Lot
-    fav_lots = db.session.query(
-        ParkingLot.name, 
-        func.count(ParkingSession.id)
-    ).join(ParkingSession).filter(
-        ParkingSession.user_id == user.id
-    ).group_by(ParkingLot.name).all()
+    visits = {name: count for name, count, _ in per_lot}
+    if active_lot is not None:
+        visits[active_lot] = visits.get(active_lot, 0) + 1
+    fav_lots = sorted(visits.items())
     
     # Chart 2: Monthly Spending
-    spending = db.session.query(
-        func.strftime('%Y-%m', ParkingSession.entry_time).label('month'),
-        func.sum(ParkingSession.amount_paid)
-    ).filter(
-        ParkingSession.user_id == user.id,
-        ParkingSession.status == 'COMPLETED'
-    ).group_by('month').all()
+    monthly = {}
+    for day, amount in db.session.query(UserDailyStat.day, UserDailyStat.revenue).filter(UserDailyStat.user_id == user.id):
+        month = day.strftime('%Y-%m')
+        monthly[month] = monthly.get(month, 0) + amount
+    spending = sorted(monthly.items())
 
     # Chart 3 (NEW): Total Spend per Lot
-    spend_by_lot = db.session.query(
-        ParkingLot.name,
-        func.sum(ParkingSession.amount_paid)
-    ).join(ParkingSession).filter(
-        ParkingSession.user_id == user.id,
-        ParkingSession.status == 'COMPLETED'
-    ).group_by(ParkingLot.name).all()
+    spend_by_lot = [(name, revenue) for name, _, revenue in per_lot]
     
     return jsonify({
         'usage_by_lot': [{'lot': l, 'count': c} for l, c in fav_lots],
@@ -213,15 +406,56 @@ def user_summary():
 @token_required
 def trigger_export():
     user = request.current_user
-    task = export_user_csv.delay(user.id)
-    new_job = ExportJob(user_id=user.id, celery_task_id=task.id, status='STARTED')
+    fingerprint = history_fingerprint(user.id)
+    job = reusable_export(user.id, fingerprint)
+    if job is not None:
+        if job.status == 'SUCCESS':
+            return jsonify({
+                'job_id': job.id,
+                'status': job.status,
+                'reused': True,
+                'download_url': export_download_url(job.id),
+                'message': 'Your history has not changed since your last export. Downloading it again.'
+            })
+        return jsonify({'job_id': job.id, 'status': job.status, 'reused': True,
+                        'message': 'Your export is already being prepared. Check your email.'})
+
+    # The row must exist before the worker looks it up by task id.
+    task_id = str(uuid.uuid4())
+    new_job = ExportJob(user_id=user.id, celery_task_id=task_id, status='STARTED', history_fingerprint=fingerprint)
     db.session.add(new_job)
     db.session.commit()
-    return jsonify({'job_id': new_job.id})
+    # Imported here so web workers only load the task module when exporting.
+    from tasks import export_user_csv
+    try:
+        export_user_csv.apply_async((user.id,), task_id=task_id)
+    except Exception:
+        new_job.status = 'FAILURE'
+        db.session.commit()
+        raise
+    return jsonify({'job_id': new_job.id, 'status': new_job.status, 'reused': False})
 
 @user_bp.route('/export/status/<int:job_id>', methods=['GET'])
 @token_required
 def check_export_status(job_id):
-    user = request.current_user
-    job = ExportJob.query.filter_by(id=job_id, user_id=user.id).first_or_404()
-    return jsonify({'status': job.status, 'file_link': job.file_path if job.status == 'SUCCESS' else None})
\ No newline at end of file
+    status = export_status(job_id, request.current_user.id)
+    if status is None:
+        return jsonify({'error': 'Export job not found'}), 404
+    done = status['status'] == 'SUCCESS'
+    return jsonify({
+        'status': status['status'],
+        'file_link': status['file_path'] if done else None,
+        'download_url': export_download_url(job_id) if done else None
+    })
+
+@user_bp.route('/export/download/<token>', methods=['GET'])
+def download_export(token):
+    # The signed token is the credential here, so the link works straight from the export email.
+    try:
+        job_id = load_export_download_token(token)
+    except BadSignature:
+        return jsonify({'error': 'Invalid or expired download link'}), 403
+    job = ExportJob.query.filter_by(id=job_id, status='SUCCESS').first_or_404()
+    if not job.file_path or not os.path.exists(job.file_path):
+        return jsonify({'error': 'Export file is no longer available'}), 410
+    return send_file(job.file_path, as_attachment=True, download_name=os.path.basename(job.file_path))
\ No newline at end of file
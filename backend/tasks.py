@@ -1,123 +1,248 @@
-from celery import current_app as celery 
-from models import User, ParkingSession, ParkingLot, ExportJob
-from extensions import mail, db 
-from flask_mail import Message
+from celery_app import celery
+from models import User, ParkingSession, ParkingLot, ParkingSpot, ExportJob, TaskRun
+from extensions import db 
 from datetime import datetime, timedelta
-import csv, io, os
+import csv, gzip, os, time
 from flask import current_app 
 from pathlib import Path
-from sqlalchemy import not_, func
-
-def send_flask_mail(to_email, subject, body, is_html=False, attachment=None, filename=None):
-    import socket
-    original_getaddrinfo = socket.getaddrinfo
-    def ipv4_getaddrinfo(*args):
-        results = original_getaddrinfo(*args)
-        return [r for r in results if r[0] == socket.AF_INET]
-    socket.getaddrinfo = ipv4_getaddrinfo
-    try:
-        with current_app.app_context(): 
-            msg = Message(subject, recipients=[to_email])
-            if is_html:
-                msg.html = body
-                msg.body = "View in HTML"
-            else:
-                msg.body = body
-            if attachment and filename:
-                msg.attach(filename, 'text/csv', attachment.encode('utf-8'))
-            try:
-                mail.send(msg)
-                return True
-            except Exception as e:
-                print(f"Error: {e}")
-                return False
-    finally:
-        socket.getaddrinfo = original_getaddrinfo
+from sqlalchemy import and_, func
+from itertools import groupby
+from jinja2 import Environment
+from utils.export_links import export_download_url
+from utils.export_jobs import invalidate_export_status, fail_stale_exports, delete_expired_exports
+from utils.mailer import build_message, send_messages
+from utils.rollups import rebuild_rollups, rebuild_recent_rollups
+from utils.occupancy_series import rebuild_occupancy, rebuild_recent_occupancy
+from utils.holds import expire_due_holds, purge_finished_holds
+
+def send_flask_mail(to_email, subject, body, is_html=False, attachment=None, filename=None, content_type='text/csv'):
+    sent, _ = send_messages([build_message(to_email, subject, body, is_html, attachment, filename, content_type)])
+    return sent == 1
 
 @celery.task
 def schedule_monthly_reports():
-    users = User.query.filter(User.email != None).all() 
-    for user in users:
-        generate_monthly_report.delay(user.id)
-    return f"Dispatched {len(users)} reports."
+    period_start, _ = previous_month()
+    batch_size = current_app.config.get('MONTHLY_REPORT_BATCH_SIZE', 500)
+    batches = users = 0
+    for user_ids in monthly_report_batches(period_start, batch_size):
+        generate_monthly_reports.delay(user_ids, period_start.isoformat())
+        batches += 1
+        users += len(user_ids)
+    return f"Dispatched {users} reports in {batches} batches."
 
 @celery.task
-def send_daily_reminders():
-    cutoff_date = datetime.utcnow() - timedelta(days=1)
-    
-    recent_parking = db.session.query(ParkingSession).filter(
-        ParkingSession.entry_time >= cutoff_date,
-        ParkingSession.user_id == User.id
-    ).exists()
+def backfill_rollups(days=None):
+    """Rebuilds the daily summary rollups from the session table: the last
+    `days` days, or all history when days is None."""
+    if days is None:
+        rebuild_rollups()
+    else:
+        rebuild_recent_rollups(days)
+    return f"Rollups rebuilt ({'all history' if days is None else f'last {days} days'})."
 
-    users_to_remind = User.query.filter(
-        User.role != 'admin',
-        not_(recent_parking),
-        User.email != None 
-    ).all()
+@celery.task
+def backfill_occupancy(days=None):
+    """Rebuilds the per-lot occupancy series from the session table: the last
+    `days` days, or all history when days is None."""
+    if days is None:
+        rebuild_occupancy()
+    else:
+        rebuild_recent_occupancy(days)
+    return f"Occupancy series rebuilt ({'all history' if days is None else f'last {days} days'})."
 
-    new_lots = ParkingLot.query.filter(
-        ParkingLot.created_at >= datetime.utcnow().date()
-    ).count()
+REMINDER_SUBJECT = "Need a Parking Spot? 🚗"
+REMINDER_TEMPLATE = Environment().from_string(
+    "Hello {{ username }},\n\n"
+    "{% if new_lots %}We noticed you haven't parked with us lately. We have {{ new_lots }} new parking locations available!"
+    "\nYou can check it out in our app's dashboard!"
+    "{% else %}Safe and secure parking is waiting for you. Book a spot today!{% endif %}"
+)
 
-    for u in users_to_remind:
-        subject = "Need a Parking Spot? 🚗"
-        if new_lots > 0:
-            msg = f"Hello {u.username},\n\nWe noticed you haven't parked with us lately. We have {new_lots} new parking locations available!\nYou can check it out in our app's dashboard!"
-        else:
-            msg = f"Hello {u.username},\n\nSafe and secure parking is waiting for you. Book a spot today!"
-        
-        send_flask_mail(u.email, subject, msg)
-        
-    print(f"Reminders sent to {len(users_to_remind)} users.")
+def reminder_batches(cutoff, batch_size):
+    """Yields lists of at most batch_size (id, username, email) of the
+    non-admin users who have not parked since cutoff, paging by user id.
+
+    An anti-join: the outer join on (user_id, entry_time >= cutoff) probes
+    ix_parking_session_user_entry and only unmatched users are kept."""
+    last_id = 0
+    while True:
+        users = db.session.query(User.id, User.username, User.email)\
+            .outerjoin(ParkingSession, and_(ParkingSession.user_id == User.id, ParkingSession.entry_time >= cutoff))\
+            .filter(
+                User.id > last_id,
+                User.role != 'admin',
+                User.email != None,
+                ParkingSession.id == None
+            ).order_by(User.id).limit(batch_size).all()
+        if not users:
+            return
+        yield users
+        last_id = users[-1].id
+
+def record_task_run(task, started_at, duration_seconds, **stats):
+    db.session.add(TaskRun(task=task, started_at=started_at, duration_seconds=round(duration_seconds, 3), stats=stats))
+    db.session.commit()
 
 @celery.task
-def generate_monthly_report(user_id):
-    user = User.query.get(user_id)
-    if not user or user.role == 'admin': return
+def send_daily_reminders():
+    started_at = datetime.utcnow()
+    clock = time.perf_counter()
+    cutoff = started_at - timedelta(days=1)
+    batch_size = current_app.config.get('REMINDER_BATCH_SIZE', 1000)
 
-    now = datetime.utcnow()
-    first_day_curr = now.replace(day=1, hour=0, minute=0, second=0)
-    first_day_prev = (first_day_curr - timedelta(days=1)).replace(day=1)
+    new_lots = ParkingLot.query.filter(
+        ParkingLot.created_at >= started_at.date()
+    ).count()
 
-    sessions = ParkingSession.query.filter(
-        ParkingSession.user_id == user.id,
-        ParkingSession.entry_time >= first_day_prev,
-        ParkingSession.entry_time < first_day_curr
-    ).all()
+    selected = 0
 
-    total_sessions = len(sessions)
-    if total_sessions == 0: return
+    def reminders():
+        nonlocal selected
+        for users in reminder_batches(cutoff, batch_size):
+            selected += len(users)
+            for _, username, email in users:
+                yield build_message(email, REMINDER_SUBJECT, REMINDER_TEMPLATE.render(username=username, new_lots=new_lots))
 
-    total_spent = sum([s.amount_paid for s in sessions])
-    most_used_lot_data = db.session.query(ParkingLot.name, func.count(ParkingLot.id))\
-        .join(ParkingSession).filter(ParkingSession.id.in_([s.id for s in sessions]))\
-        .group_by(ParkingLot.name).order_by(func.count(ParkingLot.id).desc()).first()
-    
-    most_used_lot = most_used_lot_data[0] if most_used_lot_data else "N/A"
-    
-    html_rows = ""
-    for s in sessions:
-        html_rows += f"""<tr>
-            <td>{s.lot.name}</td>
-            <td>{s.spot.spot_number}</td>
-            <td>{s.entry_time.strftime('%d-%m %H:%M')}</td>
-            <td>${s.amount_paid}</td>
-        </tr>"""
-
-    html_content = f"""
+    sent, failed = send_messages(reminders())
+    duration = time.perf_counter() - clock
+    record_task_run('send_daily_reminders', started_at, duration, selected=selected, sent=sent, failed=failed)
+    print(f"Reminders sent to {sent} users, {failed} failed.")
+    return f"Selected {selected} users, sent {sent}, failed {failed} in {duration:.1f} s."
+
+MONTHLY_REPORT_TEMPLATE = Environment(autoescape=True).from_string("""
     <html><body>
-        <h1>Monthly Parking Report: {first_day_prev.strftime('%B %Y')}</h1>
-        <p><strong>Total Parkings:</strong> {total_sessions}</p>
-        <p><strong>Total Spent:</strong> ${round(total_spent, 2)}</p>
-        <p><strong>Favorite Lot:</strong> {most_used_lot}</p>
+        <h1>Monthly Parking Report: {{ period.strftime('%B %Y') }}</h1>
+        <p><strong>Total Parkings:</strong> {{ total_sessions }}</p>
+        <p><strong>Total Spent:</strong> ${{ total_spent|round(2) }}</p>
+        <p><strong>Favorite Lot:</strong> {{ favorite_lot }}</p>
         <table border="1">
             <thead><tr><th>Lot</th><th>Spot</th><th>Date</th><th>Fee</th></tr></thead>
-            <tbody>{html_rows}</tbody>
+            <tbody>
+            {%- for r in rows %}
+            <tr>
+                <td>{{ r.lot_name }}</td>
+                <td>{{ r.spot_number }}</td>
+                <td>{{ r.entry_time.strftime('%d-%m %H:%M') }}</td>
+                <td>${{ r.amount_paid }}</td>
+            </tr>
+            {%- endfor %}
+            </tbody>
         </table>
     </body></html>
-    """
-    send_flask_mail(user.email, "Monthly Parking Report", html_content, is_html=True)
+""")
+
+def previous_month(now=None):
+    now = now or datetime.utcnow()
+    first_day_curr = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    first_day_prev = (first_day_curr - timedelta(days=1)).replace(day=1)
+    return first_day_prev, first_day_curr
+
+def monthly_report_batches(period_start, batch_size):
+    """Yields lists of at most batch_size ids of the non-admin users who
+    parked during the month starting at period_start, paging by user id."""
+    _, period_end = previous_month(period_start + timedelta(days=32))
+    last_id = 0
+    while True:
+        user_ids = [r[0] for r in db.session.query(User.id).filter(
+            User.id > last_id,
+            User.role != 'admin',
+            User.email != None,
+            db.session.query(ParkingSession.id).filter(
+                ParkingSession.user_id == User.id,
+                ParkingSession.entry_time >= period_start,
+                ParkingSession.entry_time < period_end
+            ).exists()
+        ).order_by(User.id).limit(batch_size)]
+        if not user_ids:
+            return
+        yield user_ids
+        last_id = user_ids[-1]
+
+def build_monthly_reports(user_ids, period_start):
+    """Renders the monthly report of every user in user_ids with one
+    aggregate query and one detail query for the whole batch.
+
+    Returns a list of (email, html) for users who parked in the month."""
+    _, period_end = previous_month(period_start + timedelta(days=32))
+    in_period = (
+        ParkingSession.user_id.in_(user_ids),
+        ParkingSession.entry_time >= period_start,
+        ParkingSession.entry_time < period_end
+    )
+
+    stats = {}
+    per_lot = db.session.query(
+        ParkingSession.user_id,
+        ParkingLot.name,
+        func.count(ParkingSession.id),
+        func.coalesce(func.sum(ParkingSession.amount_paid), 0)
+    ).join(ParkingLot, ParkingSession.lot_id == ParkingLot.id)\
+     .filter(*in_period).group_by(ParkingSession.user_id, ParkingLot.name)
+    for user_id, lot_name, count, spent in per_lot:
+        user_stats = stats.setdefault(user_id, {'total_sessions': 0, 'total_spent': 0.0, 'favorite_lot': None, 'best': 0})
+        user_stats['total_sessions'] += count
+        user_stats['total_spent'] += spent
+        if count > user_stats['best']:
+            user_stats['favorite_lot'], user_stats['best'] = lot_name, count
+
+    rows = db.session.query(
+        ParkingSession.user_id,
+        ParkingLot.name.label('lot_name'),
+        ParkingSpot.spot_number,
+        ParkingSession.entry_time,
+        ParkingSession.amount_paid
+    ).join(ParkingLot, ParkingSession.lot_id == ParkingLot.id)\
+     .join(ParkingSpot, ParkingSession.spot_id == ParkingSpot.id)\
+     .filter(*in_period).order_by(ParkingSession.user_id, ParkingSession.entry_time)
+    rows_by_user = {user_id: list(group) for user_id, group in groupby(rows, key=lambda r: r.user_id)}
+
+    emails = dict(db.session.query(User.id, User.email).filter(User.id.in_(list(stats)), User.role != 'admin'))
+
+    reports = []
+    for user_id, email in emails.items():
+        user_stats = stats[user_id]
+        reports.append((email, MONTHLY_REPORT_TEMPLATE.render(
+            period=period_start,
+            total_sessions=user_stats['total_sessions'],
+            total_spent=user_stats['total_spent'],
+            favorite_lot=user_stats['favorite_lot'] or "N/A",
+            rows=rows_by_user.get(user_id, [])
+        )))
+    return reports
+
+@celery.task
+def generate_monthly_reports(user_ids, period_start):
+    reports = build_monthly_reports(user_ids, datetime.fromisoformat(period_start))
+    sent, _ = send_messages(build_message(email, "Monthly Parking Report", html_content, is_html=True)
+                            for email, html_content in reports)
+    return sent
+
+@celery.task
+def generate_monthly_report(user_id):
+    period_start, _ = previous_month()
+    return generate_monthly_reports(user_ids=[user_id], period_start=period_start.isoformat())
+
+EXPORT_HEADER = ['Session ID', 'Lot Name', 'Spot Number', 'Vehicle', 'Entry Time', 'Exit Time', 'Fee', 'Status']
+
+def export_rows(user_id, batch_size):
+    """Yields the user's sessions with lot and spot names joined in, read
+    from a server-side cursor batch_size rows at a time."""
+    query = db.session.query(
+        ParkingSession.id, ParkingLot.name, ParkingSpot.spot_number, ParkingSession.vehicle_number,
+        ParkingSession.entry_time, ParkingSession.exit_time, ParkingSession.amount_paid, ParkingSession.status
+    ).join(ParkingLot, ParkingSession.lot_id == ParkingLot.id)\
+     .join(ParkingSpot, ParkingSession.spot_id == ParkingSpot.id)\
+     .filter(ParkingSession.user_id == user_id)\
+     .order_by(ParkingSession.entry_time.desc(), ParkingSession.id.desc())
+    return query.yield_per(batch_size)
+
+def write_export_file(user_id, file_path, compress=False, batch_size=1000):
+    opener = gzip.open if compress else open
+    with opener(file_path, 'wt', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_HEADER)
+        for row in export_rows(user_id, batch_size):
+            writer.writerow(row)
 
 @celery.task(bind=True) 
 def export_user_csv(self, user_id):
@@ -125,38 +250,64 @@ def export_user_csv(self, user_id):
     user = User.query.get(user_id)
     
     if not user:
-        if job: job.status = 'FAILURE'; db.session.commit()
+        if job:
+            job.status = 'FAILURE'; db.session.commit()
+            invalidate_export_status(job.id)
         return
 
     try:
-        sessions = ParkingSession.query.filter_by(user_id=user_id).order_by(ParkingSession.entry_time.desc()).all()
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['Session ID', 'Lot Name', 'Spot Number', 'Vehicle', 'Entry Time', 'Exit Time', 'Fee', 'Status'])
-        
-        for s in sessions:
-            writer.writerow([
-                s.id, s.lot.name, s.spot.spot_number, s.vehicle_number,
-                s.entry_time, s.exit_time, s.amount_paid, s.status
-            ])
-            
-        csv_data = output.getvalue()
-        
-        store_path = Path(current_app.config.get('FILE_STORAGE_PATH')).expanduser()
+        config = current_app.config
+        compress = config.get('EXPORT_GZIP', False)
+
+        store_path = Path(config.get('FILE_STORAGE_PATH')).expanduser()
         os.makedirs(store_path, exist_ok=True)
-        filename = f"parking_history_{user.username}_{datetime.now().strftime('%Y%m%d')}.csv"
+        filename = f"parking_history_{user.username}_{datetime.now().strftime('%Y%m%d')}_{job.id}.csv"
+        if compress:
+            filename += '.gz'
         file_path = os.path.join(store_path, filename)
         
-        with open(file_path, 'w') as f: f.write(csv_data)
+        write_export_file(user_id, file_path, compress, config.get('EXPORT_BATCH_SIZE', 1000))
         
         job.status = 'SUCCESS'
         job.file_path = file_path
         job.completed_at = datetime.utcnow()
         db.session.commit()
+        invalidate_export_status(job.id)
         
-        send_flask_mail(user.email, "Your Parking History CSV", "Download attached.", attachment=csv_data, filename=filename)
+        if os.path.getsize(file_path) <= config.get('EXPORT_ATTACHMENT_MAX_BYTES', 5 * 1024 * 1024):
+            with open(file_path, 'rb') as f:
+                attachment = f.read()
+            content_type = 'application/gzip' if compress else 'text/csv'
+            send_flask_mail(user.email, "Your Parking History CSV", "Download attached.",
+                            attachment=attachment, filename=filename, content_type=content_type)
+        else:
+            link = export_download_url(job.id)
+            send_flask_mail(user.email, "Your Parking History CSV",
+                            f"Your export is too large to attach. Download it here:\n{link}")
         
     except Exception as e:
-        if job: job.status = 'FAILURE'; db.session.commit()
-        print(e)
\ No newline at end of file
+        if job:
+            db.session.rollback()
+            job.status = 'FAILURE'; db.session.commit()
+            invalidate_export_status(job.id)
+        print(e)
+
+@celery.task
+def purge_expired_exports():
+    """Fails export jobs that never finished and deletes the files and rows
+    of jobs past EXPORT_RETENTION."""
+    stale = fail_stale_exports()
+    jobs, files = delete_expired_exports()
+    return f"Marked {stale} stale exports failed; deleted {jobs} expired jobs and {files} files."
+
+@celery.task
+def expire_spot_holds():
+    """Releases the spots of holds past their expiry; runs every
+    HOLD_SWEEP_SECONDS."""
+    expired = expire_due_holds()
+    return f"Expired {expired} spot holds."
+
+@celery.task
+def purge_spot_holds():
+    deleted = purge_finished_holds()
+    return f"Deleted {deleted} finished spot holds."
@@ -0,0 +1,101 @@
+"""Fixtures for the API tests: a fresh app and SQLite database per test.
+
+Run from the backend directory:
+
+    python -m pytest -q
+"""
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from config import Config
+from extensions import db
+from migrations import bootstrap
+from models import User, ParkingLot, ParkingSpot
+from utils.auth import generate_token
+from utils.spot_allocator import spot_allocator
+
+PASSWORD = 'secret-pw'
+# Hashing is slow on purpose; every test user shares one hash.
+PASSWORD_HASH = generate_password_hash(PASSWORD)
+
+
+@pytest.fixture
+def app(tmp_path):
+    from app import create_app
+    config = type('TestConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'parking.db'}",
+        'CACHE_TYPE': 'SimpleCache',
+        'OCCUPANCY_EVENTS_REDIS_URL': None,
+        'METRICS_ENABLED': False,
+        'TESTING': True,
+    })
+    app = create_app(config)
+    with app.app_context():
+        bootstrap()
+        # The allocator is process-wide; forget lots of the previous test's database.
+        spot_allocator.load_all()
+        yield app
+        db.session.remove()
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def auth_headers(user):
+    return {'Authorization': f'Bearer {generate_token(user)}'}
+
+
+@pytest.fixture
+def admin_headers(app):
+    return auth_headers(User.query.filter_by(role='admin').one())
+
+
+@pytest.fixture
+def make_user(app):
+    """make_user(name) adds a user and returns (user, auth headers)."""
+    def make(name, email=None):
+        user = User(username=name, email=email or f'{name}@example.com', password=PASSWORD_HASH, role='user')
+        db.session.add(user)
+        db.session.commit()
+        return user, auth_headers(user)
+    return make
+
+
+@pytest.fixture
+def make_lot(app):
+    """make_lot(capacity, ...) adds a lot with its spots and returns it."""
+    def make(capacity, name='Lot', rate_per_hour=10.0, tariff=None):
+        lot = ParkingLot(name=name, location='Test', capacity=capacity, rate_per_hour=rate_per_hour, tariff=tariff)
+        db.session.add(lot)
+        db.session.flush()
+        db.session.add_all(ParkingSpot(lot_id=lot.id, spot_number=f'SPOT-{i}') for i in range(1, capacity + 1))
+        db.session.commit()
+        return lot
+    return make
+
+
+class QueryLog:
+    """Collects the SQL statements run on the engine while active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+
+@pytest.fixture
+def query_log(app):
+    return lambda: QueryLog(db.engine)
@@ -0,0 +1,75 @@
+import time
+from extensions import db
+from utils.auth import Principal, TokenCache, token_cache
+
+
+def _user_reads(statements):
+    return sum('FROM user' in statement for statement in statements)
+
+
+def test_verified_tokens_skip_the_user_lookup(client, make_user, query_log):
+    _, headers = make_user('driver')
+    # The user is not in the session's identity map, as in a real request.
+    db.session.remove()
+    with query_log() as log:
+        assert client.get('/api/user/hold', headers=headers).status_code == 404
+    assert _user_reads(log.statements) == 1
+
+    with query_log() as log:
+        assert client.get('/api/user/hold', headers=headers).status_code == 404
+    assert _user_reads(log.statements) == 0
+
+
+def test_changing_a_user_evicts_their_tokens(client, make_user):
+    user, headers = make_user('driver')
+    assert client.get('/api/admin/task-runs', headers=headers).status_code == 403
+
+    user.role = 'admin'
+    db.session.commit()
+    assert client.get('/api/admin/task-runs', headers=headers).status_code == 200
+
+
+def test_deleted_users_tokens_stop_working(client, make_user):
+    user, headers = make_user('driver')
+    assert client.get('/api/user/hold', headers=headers).status_code == 404
+
+    db.session.delete(user)
+    db.session.commit()
+    response = client.get('/api/user/hold', headers=headers)
+    assert response.status_code == 401
+    assert response.get_json()['error'] == 'Invalid token user'
+
+
+def test_parking_does_not_evict_the_parkers_token(client, make_lot, make_user):
+    lot = make_lot(1)
+    user, headers = make_user('driver')
+    client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': 'CAR'}, headers=headers)
+    assert token_cache._by_user.get(user.id)
+
+
+def test_cache_entries_end_with_their_ttl_or_token_expiry():
+    cache = TokenCache(maxsize=10, ttl=60)
+    alice, bob = Principal(1, 'user', 'alice', 'a@example.com'), Principal(2, 'user', 'bob', 'b@example.com')
+    cache.put('long', alice, time.time() + 3600)
+    cache.put('expiring', bob, time.time() - 1)
+    assert cache.get('long') == alice
+    assert cache.get('expiring') is None
+
+    cache.ttl = -1
+    cache.put('stale', alice, time.time() + 3600)
+    assert cache.get('stale') is None
+
+
+def test_cache_evicts_least_recently_used_and_by_user():
+    cache = TokenCache(maxsize=2, ttl=60)
+    alice, bob = Principal(1, 'user', 'alice', 'a@example.com'), Principal(2, 'user', 'bob', 'b@example.com')
+    later = time.time() + 3600
+    cache.put('a1', alice, later)
+    cache.put('b1', bob, later)
+    cache.get('a1')
+    cache.put('a2', alice, later)
+    assert cache.get('b1') is None
+    assert cache.get('a1') == alice
+
+    cache.invalidate_user(alice.id)
+    assert cache.get('a1') is None and cache.get('a2') is None
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+from sqlalchemy import update
+from extensions import db
+from models import ParkingLot, ParkingSession, ParkingSpot, TariffPlan, LotDailyStat, User
+from utils.billing import Tariff, TariffError, validate_bands, parking_charge, reprice_sessions, tariffs_for_lots
+
+DAY = datetime(2026, 3, 2)
+
+
+def _price(tariff, entry, hours):
+    return float(tariff.price([entry], [entry + timedelta(hours=hours)])[0])
+
+
+def test_flat_rate_bills_hours_with_one_hour_minimum():
+    tariff = Tariff(10.0)
+    assert _price(tariff, DAY, 1.5) == 15.0
+    assert _price(tariff, DAY, 10 / 60) == 10.0
+
+
+def test_band_overrides_base_rate_for_its_hours():
+    tariff = Tariff(10.0, [{'start': 8, 'end': 10, 'rate': 20.0}])
+    assert _price(tariff, DAY.replace(hour=7), 2) == 30.0
+    assert _price(tariff, DAY.replace(hour=11), 2) == 20.0
+
+
+def test_grace_period_and_minimum_hours():
+    tariff = Tariff(10.0, grace_minutes=15, minimum_hours=2.0)
+    assert _price(tariff, DAY, 0.2) == 0.0
+    assert _price(tariff, DAY, 0.5) == 20.0
+
+
+def test_daily_cap_applies_per_calendar_day():
+    tariff = Tariff(10.0, daily_cap=50.0)
+    assert _price(tariff, DAY.replace(hour=12), 36) == 100.0
+    assert _price(tariff, DAY.replace(hour=22), 1) == 10.0
+
+
+def test_vectorized_prices_match_one_at_a_time():
+    tariff = Tariff(8.0, [{'start': 7, 'end': 9.5, 'rate': 15.0}, {'start': 17, 'end': 19, 'rate': 12.0}],
+                    grace_minutes=5, minimum_hours=0.5, daily_cap=60.0)
+    rng = np.random.default_rng(7)
+    entries = [DAY + timedelta(minutes=int(m)) for m in rng.integers(0, 14 * 24 * 60, 500)]
+    exits = [entry + timedelta(minutes=int(m)) for entry, m in zip(entries, rng.integers(1, 3 * 24 * 60, 500))]
+
+    together = tariff.price(entries, exits)
+    assert together.tolist() == [parking_charge(entry, exit_, tariff)[1] for entry, exit_ in zip(entries, exits)]
+
+
+@pytest.mark.parametrize('bands', [
+    'not a list',
+    [{'start': 8, 'rate': 5}],
+    [{'start': 10, 'end': 8, 'rate': 5}],
+    [{'start': 8, 'end': 12, 'rate': 5}, {'start': 11, 'end': 13, 'rate': 5}],
+])
+def test_invalid_bands_are_rejected(bands):
+    with pytest.raises(TariffError):
+        validate_bands(bands)
+
+
+def test_unpark_charges_the_lots_tariff_plan(client, make_lot, make_user):
+    lot = make_lot(1, rate_per_hour=10.0, tariff=TariffPlan(name='Two hour minimum', minimum_hours=2.0))
+    _, headers = make_user('driver')
+    assert client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': 'CAR'}, headers=headers).status_code == 201
+
+    response = client.post('/api/user/unpark', headers=headers)
+    assert response.status_code == 200
+    assert ParkingSession.query.one().amount_paid == 20.0
+
+
+def test_lot_queries_do_not_join_tariffs(app, make_lot, query_log):
+    make_lot(1, tariff=TariffPlan(name='Plan'))
+    db.session.expunge_all()
+    with query_log() as log:
+        lot_ids = [lot.id for lot in ParkingLot.query]
+    assert not any('tariff_plan' in statement for statement in log.statements)
+
+    db.session.expunge_all()
+    with query_log() as log:
+        tariffs = tariffs_for_lots(lot_ids)
+    # The lots, then their plans in one more query.
+    assert len(log.statements) == 2
+    assert tariffs[lot_ids[0]].minimum_hours == 1.0
+
+
+def test_reprice_rewrites_amounts_rollups_and_versions(app, make_lot, make_user):
+    lot = make_lot(1, rate_per_hour=10.0)
+    user, _ = make_user('driver')
+    spot = ParkingSpot.query.filter_by(lot_id=lot.id).one()
+    db.session.add_all(ParkingSession(user_id=user.id, lot_id=lot.id, spot_id=spot.id, vehicle_number='CAR',
+                                      entry_time=DAY + timedelta(days=i), exit_time=DAY + timedelta(days=i, hours=3),
+                                      amount_paid=1.0, status='COMPLETED') for i in range(3))
+    db.session.commit()
+    lot_version, user_version = lot.version, user.sessions_version
+
+    summary = reprice_sessions()
+    assert summary == {'sessions': 3, 'changed': 3, 'old_revenue': 3.0, 'new_revenue': 90.0}
+    assert [s.amount_paid for s in ParkingSession.query] == [30.0, 30.0, 30.0]
+    assert db.session.query(db.func.sum(LotDailyStat.revenue)).scalar() == 90.0
+    assert db.session.get(ParkingLot, lot.id).version > lot_version
+    assert db.session.get(User, user.id).sessions_version > user_version
+
+    db.session.execute(update(ParkingSession).values(amount_paid=30.0))
+    db.session.commit()
+    assert reprice_sessions()['changed'] == 0
@@ -0,0 +1,53 @@
+import gzip
+import json
+import zlib
+import brotli
+from flask import Response
+from utils.compression import compress_response
+
+
+def _lines(count):
+    return ''.join(json.dumps({'row': i, 'lot': 'North'}) + '\n' for i in range(count))
+
+
+def test_large_json_is_compressed_for_the_accepted_encoding(app):
+    body = json.dumps([{'row': i} for i in range(200)])
+    for encoding, decompress in (('br', brotli.decompress), ('gzip', gzip.decompress)):
+        with app.test_request_context(headers={'Accept-Encoding': encoding}):
+            response = compress_response(Response(body, mimetype='application/json'))
+        assert response.headers['Content-Encoding'] == encoding
+        assert decompress(response.get_data()).decode() == body
+
+
+def test_small_and_non_api_bodies_are_left_alone(app):
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        small = compress_response(Response('{}', mimetype='application/json'))
+        page = compress_response(Response('x' * 5000, mimetype='text/html'))
+    assert 'Content-Encoding' not in small.headers
+    assert 'Content-Encoding' not in page.headers
+
+
+def test_each_streamed_chunk_reaches_the_client_whole(app):
+    chunks = [_lines(50), _lines(50)]
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = compress_response(Response(iter(chunks), mimetype='application/x-ndjson'))
+        stream = iter(response.response)
+        decompressor = zlib.decompressobj(31)
+        # Decodable before the stream ends: nothing is left in the compressor.
+        assert decompressor.decompress(next(stream)).decode() == chunks[0]
+        assert decompressor.decompress(next(stream)).decode() == chunks[1]
+        decompressor.decompress(b''.join(stream))
+    assert decompressor.eof
+
+
+def test_history_stream_arrives_compressed(client, make_lot, make_user):
+    lot = make_lot(1)
+    _, headers = make_user('driver')
+    for _ in range(3):
+        client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': 'CAR'}, headers=headers)
+        client.post('/api/user/unpark', headers=headers)
+
+    response = client.get('/api/user/history?format=ndjson', headers=dict(headers, **{'Accept-Encoding': 'br'}))
+    assert response.headers['Content-Encoding'] == 'br'
+    rows = brotli.decompress(response.get_data()).decode().splitlines()
+    assert len(rows) == 3
@@ -0,0 +1,51 @@
+from sqlalchemy import text
+from extensions import db
+
+
+def _begins(statements):
+    return [s for s in statements if s.startswith('BEGIN')]
+
+
+def test_write_requests_lock_until_their_commit(app, query_log):
+    db.session.remove()
+    with app.test_request_context(method='POST'), query_log() as log:
+        db.session.execute(text('SELECT 1'))
+        db.session.rollback()
+        db.session.execute(text('SELECT 1'))
+        db.session.commit()
+        # Reading back after the commit must not queue behind other writers.
+        db.session.execute(text('SELECT 1'))
+        db.session.remove()
+    assert _begins(log.statements) == ['BEGIN IMMEDIATE', 'BEGIN IMMEDIATE', 'BEGIN']
+
+
+def test_reads_never_lock(app, query_log):
+    db.session.remove()
+    with app.test_request_context(method='GET'), query_log() as log:
+        db.session.execute(text('SELECT 1'))
+        db.session.remove()
+    assert _begins(log.statements) == ['BEGIN']
+
+
+def test_park_and_unpark_touch_nothing_after_their_commit(client, make_lot, make_user, query_log):
+    lot_id = make_lot(2).id
+    _, headers = make_user('driver')
+    db.session.remove()
+
+    for url, body in (('/api/user/park', {'lot_id': lot_id, 'vehicle_number': 'CAR'}), ('/api/user/unpark', None)):
+        with query_log() as log:
+            assert client.post(url, json=body, headers=headers).status_code in (200, 201)
+        # A query after the commit would have begun a second transaction.
+        assert _begins(log.statements) == ['BEGIN IMMEDIATE']
+
+
+def test_gate_batches_touch_nothing_after_their_commit(client, admin_headers, make_lot, make_user, query_log):
+    lot_id = make_lot(2).id
+    user_id = make_user('driver')[0].id
+    db.session.remove()
+
+    for url, items in (('/api/admin/gate/park', [{'user_id': user_id, 'lot_id': lot_id, 'vehicle_number': 'CAR'}]),
+                       ('/api/admin/gate/unpark', [{'vehicle_number': 'CAR'}])):
+        with query_log() as log:
+            assert client.post(url, json={'items': items}, headers=admin_headers).get_json()['succeeded'] == 1
+        assert _begins(log.statements) == ['BEGIN IMMEDIATE']
@@ -0,0 +1,105 @@
+import itertools
+from datetime import datetime, timedelta
+import pytest
+from extensions import db
+from models import ExportJob, ParkingSession, ParkingSpot
+from utils.export_jobs import history_fingerprint, reusable_export, fail_stale_exports, delete_expired_exports
+from utils.http_cache import bump_sessions_versions
+from utils.rollups import rebuild_rollups
+
+_task_ids = itertools.count()
+
+
+@pytest.fixture
+def driver(make_lot, make_user):
+    """A user with two completed sessions in lot 'North'; returns (user, lot)."""
+    lot = make_lot(1, name='North')
+    user, _ = make_user('driver')
+    spot = ParkingSpot.query.filter_by(lot_id=lot.id).one()
+    for day, amount in ((1, 10.0), (2, 20.0)):
+        entry = datetime(2026, 9, day, 8)
+        db.session.add(ParkingSession(user_id=user.id, lot_id=lot.id, spot_id=spot.id, vehicle_number='CAR',
+                                      entry_time=entry, exit_time=entry + timedelta(hours=1),
+                                      amount_paid=amount, status='COMPLETED'))
+    db.session.commit()
+    rebuild_rollups()
+    return user, lot
+
+
+def _job(user, fingerprint, tmp_path=None, status='SUCCESS', age=timedelta(0)):
+    created = datetime.utcnow() - age
+    file_path = None
+    if tmp_path is not None:
+        file_path = str(tmp_path / f'export_{next(_task_ids)}.csv')
+        open(file_path, 'w').close()
+    job = ExportJob(user_id=user.id, celery_task_id=f'task-{next(_task_ids)}', status=status,
+                    file_path=file_path, history_fingerprint=fingerprint, created_at=created,
+                    completed_at=created if status == 'SUCCESS' else None)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def test_finished_export_of_unchanged_history_is_reused(driver, tmp_path):
+    user, _ = driver
+    job = _job(user, history_fingerprint(user.id), tmp_path)
+    assert reusable_export(user.id, history_fingerprint(user.id)).id == job.id
+
+
+def test_lot_rename_makes_the_export_stale(client, admin_headers, driver, tmp_path):
+    user, lot = driver
+    _job(user, history_fingerprint(user.id), tmp_path)
+
+    client.put(f'/api/admin/lots/{lot.id}', json={'name': 'North Gate'}, headers=admin_headers)
+    assert reusable_export(user.id, history_fingerprint(user.id)) is None
+
+
+def test_amounts_moved_between_sessions_make_the_export_stale(driver, tmp_path):
+    user, _ = driver
+    _job(user, history_fingerprint(user.id), tmp_path)
+
+    # What a re-price that leaves the total unchanged looks like.
+    for session in ParkingSession.query.filter_by(user_id=user.id):
+        session.amount_paid = 30.0 - session.amount_paid
+    bump_sessions_versions([user.id])
+    db.session.commit()
+    assert reusable_export(user.id, history_fingerprint(user.id)) is None
+
+
+def test_old_missing_and_stale_exports_are_not_reused(app, driver, tmp_path):
+    user, _ = driver
+    fingerprint = history_fingerprint(user.id)
+    max_age = app.config['EXPORT_REUSE_MAX_AGE']
+
+    _job(user, fingerprint, tmp_path, age=timedelta(seconds=max_age + 60))
+    assert reusable_export(user.id, fingerprint) is None
+    _job(user, fingerprint)
+    assert reusable_export(user.id, fingerprint) is None
+    running = _job(user, fingerprint, status='STARTED')
+    assert reusable_export(user.id, fingerprint).id == running.id
+    ExportJob.query.delete()
+    _job(user, fingerprint, status='STARTED', age=timedelta(seconds=app.config['EXPORT_STALE_AFTER'] + 60))
+    assert reusable_export(user.id, fingerprint) is None
+
+
+def test_stale_jobs_fail_and_expired_jobs_are_deleted_with_their_files(app, driver, tmp_path):
+    user, _ = driver
+    stale = _job(user, 'x', status='STARTED', age=timedelta(seconds=app.config['EXPORT_STALE_AFTER'] + 60))
+    running = _job(user, 'x', status='STARTED')
+    assert fail_stale_exports() == 1
+    assert db.session.get(ExportJob, stale.id).status == 'FAILURE'
+    assert db.session.get(ExportJob, running.id).status == 'STARTED'
+
+    retention = timedelta(seconds=app.config['EXPORT_RETENTION'] + 60)
+    expired = _job(user, 'x', tmp_path, age=retention)
+    # A file written before job ids were part of its name, still used by a newer job.
+    shared = _job(user, 'x', tmp_path, age=retention)
+    newer = _job(user, 'x')
+    newer.file_path = shared.file_path
+    db.session.commit()
+    expired_path = expired.file_path
+
+    assert delete_expired_exports() == (2, 1)
+    assert db.session.get(ExportJob, newer.id) is not None
+    assert not (tmp_path / expired_path.rsplit('/', 1)[1]).exists()
+    assert (tmp_path / newer.file_path.rsplit('/', 1)[1]).exists()
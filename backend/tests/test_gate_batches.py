@@ -0,0 +1,109 @@
+from extensions import db
+from models import ParkingLot, ParkingSession
+import utils.batch_parking as batch_parking
+from utils.availability import reconcile_occupancy
+
+
+def _gate(client, headers, action, items):
+    return client.post(f'/api/admin/gate/{action}', json={'items': items}, headers=headers)
+
+
+def _errors(body):
+    return [result.get('error') for result in body['results']]
+
+
+def test_park_batch_reports_each_failure_and_parks_the_rest(client, admin_headers, make_lot, make_user):
+    small, other = make_lot(2, name='Small'), make_lot(2, name='Other')
+    users = [make_user(f'driver{i}') for i in range(6)]
+    ids = [user.id for user, _ in users]
+    client.post('/api/user/park', json={'lot_id': other.id, 'vehicle_number': 'OLD'}, headers=users[0][1])
+    client.post('/api/user/hold', json={'lot_id': other.id}, headers=users[1][1])
+
+    response = _gate(client, admin_headers, 'park', [
+        {'user_id': ids[2], 'lot_id': small.id, 'vehicle_number': 'A'},
+        {'user_id': ids[3], 'lot_id': small.id},
+        {'user_id': 9999, 'lot_id': small.id, 'vehicle_number': 'B'},
+        {'user_id': ids[3], 'lot_id': 9999, 'vehicle_number': 'C'},
+        {'user_id': ids[0], 'lot_id': small.id, 'vehicle_number': 'D'},
+        {'user_id': ids[1], 'lot_id': small.id, 'vehicle_number': 'E'},
+        {'user_id': ids[2], 'lot_id': small.id, 'vehicle_number': 'F'},
+        {'user_id': ids[3], 'lot_id': small.id, 'vehicle_number': 'G'},
+        {'user_id': ids[4], 'lot_id': small.id, 'vehicle_number': 'H'},
+        {'user_id': ids[1], 'lot_id': other.id, 'vehicle_number': 'I'},
+    ])
+    body = response.get_json()
+    assert response.status_code == 200
+    assert _errors(body) == [
+        None, 'user_id, lot_id and vehicle_number required', 'Unknown user', 'Unknown parking lot',
+        'User already has a vehicle parked', 'User holds a spot in another lot', 'User already has a vehicle parked',
+        None, 'Parking Lot is full', None,
+    ]
+    assert (body['succeeded'], body['failed']) == (3, 7)
+    assert [r['index'] for r in body['results']] == list(range(10))
+
+    active = {s.vehicle_number for s in ParkingSession.query.filter_by(status='ACTIVE')}
+    assert active == {'OLD', 'A', 'G', 'I'}
+    assert db.session.get(ParkingLot, small.id).occupied_count == 2
+    assert db.session.get(ParkingLot, other.id).occupied_count == 2
+    assert reconcile_occupancy(repair=False) == []
+
+
+def test_unpark_batch_by_session_or_vehicle(client, admin_headers, make_lot, make_user):
+    lot = make_lot(4)
+    users = [make_user(f'driver{i}') for i in range(4)]
+    _gate(client, admin_headers, 'park', [
+        {'user_id': user.id, 'lot_id': lot.id, 'vehicle_number': vehicle}
+        for (user, _), vehicle in zip(users, ['A', 'B', 'TWIN', 'TWIN'])
+    ])
+    session_a = ParkingSession.query.filter_by(vehicle_number='A').one().id
+
+    body = _gate(client, admin_headers, 'unpark', [
+        {'session_id': session_a},
+        {'vehicle_number': 'B'},
+        {'vehicle_number': 'B'},
+        {'vehicle_number': 'TWIN'},
+        {'vehicle_number': 'NOPE'},
+        {'session_id': 9999},
+        {},
+    ]).get_json()
+    assert _errors(body) == [
+        None, None, 'Session listed more than once', 'Vehicle has several active sessions; use session_id',
+        'No active parking session found', 'No active parking session found', 'session_id or vehicle_number required',
+    ]
+    assert body['results'][0]['session_id'] == session_a
+    assert body['results'][1]['amount_paid'] >= 0
+    assert {s.vehicle_number for s in ParkingSession.query.filter_by(status='ACTIVE')} == {'TWIN'}
+    assert db.session.get(ParkingLot, lot.id).occupied_count == 2
+    assert reconcile_occupancy(repair=False) == []
+
+    # The freed spots are handed out again.
+    assert _gate(client, admin_headers, 'park', [
+        {'user_id': users[0][0].id, 'lot_id': lot.id, 'vehicle_number': 'A2'},
+        {'user_id': users[1][0].id, 'lot_id': lot.id, 'vehicle_number': 'B2'},
+    ]).get_json()['succeeded'] == 2
+
+
+def test_failed_park_batch_writes_nothing_and_returns_its_spots(client, admin_headers, make_lot, make_user,
+                                                                 monkeypatch):
+    lot = make_lot(1)
+    user, _ = make_user('driver')
+    items = [{'user_id': user.id, 'lot_id': lot.id, 'vehicle_number': 'A'}]
+
+    def fail(user_ids):
+        raise RuntimeError('database went away')
+    monkeypatch.setattr(batch_parking, 'bump_sessions_versions', fail)
+    assert _gate(client, admin_headers, 'park', items).status_code == 500
+    assert ParkingSession.query.count() == 0
+    assert db.session.get(ParkingLot, lot.id).occupied_count == 0
+
+    monkeypatch.undo()
+    assert _gate(client, admin_headers, 'park', items).get_json()['succeeded'] == 1
+
+
+def test_batch_body_is_validated(app, client, admin_headers):
+    assert _gate(client, admin_headers, 'park', []).status_code == 400
+    assert _gate(client, admin_headers, 'unpark', ['A']).status_code == 400
+    app.config['GATE_BATCH_MAX_ITEMS'] = 2
+    response = _gate(client, admin_headers, 'unpark', [{'vehicle_number': 'A'}] * 3)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'At most 2 items per batch'
@@ -0,0 +1,83 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from extensions import db
+from models import ParkingSession, ParkingSpot
+
+START = datetime(2026, 9, 1, 8)
+
+
+@pytest.fixture
+def history(make_lot, make_user):
+    """A driver with 7 completed sessions, three of them entered at the same
+    moment; returns (headers, session ids newest first)."""
+    lot = make_lot(1)
+    user, headers = make_user('driver')
+    spot = ParkingSpot.query.filter_by(lot_id=lot.id).one()
+    entries = [START + timedelta(hours=h) for h in (0, 1, 2, 2, 2, 3, 4)]
+    sessions = [ParkingSession(user_id=user.id, lot_id=lot.id, spot_id=spot.id, vehicle_number=f'CAR{i}',
+                               entry_time=entry, exit_time=entry + timedelta(minutes=30),
+                               amount_paid=10.0, status='COMPLETED') for i, entry in enumerate(entries)]
+    db.session.add_all(sessions)
+    db.session.commit()
+    newest_first = sorted(sessions, key=lambda s: (s.entry_time, s.id), reverse=True)
+    return headers, [s.id for s in newest_first]
+
+
+def _pages(client, headers, limit):
+    ids, cursor = [], None
+    while True:
+        url = f'/api/user/history?limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url, headers=headers).get_json()
+        ids.extend(item['id'] for item in page['items'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize('limit', [1, 2, 3, 7, 50])
+def test_pages_cover_history_once_across_tied_entry_times(client, history, limit):
+    headers, expected = history
+    assert _pages(client, headers, limit) == expected
+
+
+def test_last_full_page_has_no_next_cursor(client, history):
+    headers, expected = history
+    page = client.get('/api/user/history?limit=7', headers=headers).get_json()
+    assert [item['id'] for item in page['items']] == expected
+    assert page['next_cursor'] is None
+
+
+def test_page_size_is_clamped(client, history):
+    headers, _ = history
+    assert len(client.get('/api/user/history?limit=0', headers=headers).get_json()['items']) == 7
+    assert len(client.get('/api/user/history?limit=-5', headers=headers).get_json()['items']) == 1
+
+
+def test_invalid_cursor_is_rejected(client, history):
+    headers, _ = history
+    assert client.get('/api/user/history?cursor=not-a-cursor', headers=headers).status_code == 400
+
+
+def _stream(client, headers, query=''):
+    response = client.get(f'/api/user/history?format=ndjson{query}', headers=headers)
+    return response, [json.loads(line)['id'] for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_stream_runs_from_the_cursor_to_the_end(client, history):
+    headers, expected = history
+    response, ids = _stream(client, headers)
+    assert response.mimetype == 'application/x-ndjson'
+    assert ids == expected
+
+    cursor = client.get('/api/user/history?limit=3', headers=headers).get_json()['next_cursor']
+    assert _stream(client, headers, f'&cursor={cursor}')[1] == expected[3:]
+    assert _stream(client, headers, '&limit=2')[1] == expected[:2]
+
+
+@pytest.mark.parametrize('limit', ['0', '-1', 'ten'])
+def test_stream_rejects_a_limit_that_is_not_positive(client, history, limit):
+    headers, _ = history
+    response = client.get(f'/api/user/history?format=ndjson&limit={limit}', headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'limit must be a positive integer'
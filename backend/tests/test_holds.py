@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+from extensions import db
+from models import ParkingLot, ParkingSession, SpotHold
+from utils.holds import expire_due_holds, place_hold
+
+
+def _hold(client, headers, lot, minutes=None):
+    return client.post('/api/user/hold', json={'lot_id': lot.id, 'minutes': minutes}, headers=headers)
+
+
+def test_hold_takes_a_spot_until_cancelled(client, make_lot, make_user):
+    lot = make_lot(1)
+    _, holder = make_user('holder')
+    _, other = make_user('other')
+
+    assert _hold(client, holder, lot).status_code == 201
+    assert db.session.get(ParkingLot, lot.id).occupied_count == 1
+    response = client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': 'CAR'}, headers=other)
+    assert response.status_code == 400
+
+    assert client.delete('/api/user/hold', headers=holder).status_code == 200
+    assert client.get('/api/user/hold', headers=holder).status_code == 404
+    assert db.session.get(ParkingLot, lot.id).occupied_count == 0
+    response = client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': 'CAR'}, headers=other)
+    assert response.status_code == 201
+
+
+def test_holder_parks_in_the_held_spot(client, make_lot, make_user):
+    lot = make_lot(2)
+    _, headers = make_user('holder')
+    spot_number = _hold(client, headers, lot).get_json()['spot_number']
+
+    response = client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': 'CAR'}, headers=headers)
+    assert response.status_code == 201
+    assert response.get_json()['spot_number'] == spot_number
+    hold = SpotHold.query.one()
+    assert hold.status == 'CLAIMED'
+    assert hold.session_id == response.get_json()['session_id']
+    assert db.session.get(ParkingLot, lot.id).occupied_count == 1
+
+
+def test_holder_cannot_park_in_another_lot(client, make_lot, make_user):
+    held_lot, other_lot = make_lot(1, name='Held'), make_lot(1, name='Other')
+    _, headers = make_user('holder')
+    _hold(client, headers, held_lot)
+
+    response = client.post('/api/user/park', json={'lot_id': other_lot.id, 'vehicle_number': 'CAR'}, headers=headers)
+    assert response.status_code == 400
+    assert 'another lot' in response.get_json()['error']
+
+
+def test_sweep_expires_due_holds_and_frees_their_spots(app, make_lot, make_user):
+    lot = make_lot(2)
+    first, second = make_user('first')[0], make_user('second')[0]
+    place_hold(first, lot.id, 5)
+    place_hold(second, lot.id, 20)
+
+    assert expire_due_holds(datetime.utcnow() + timedelta(minutes=10)) == 1
+    assert [h.status for h in SpotHold.query.order_by(SpotHold.id)] == ['EXPIRED', 'HELD']
+    assert db.session.get(ParkingLot, lot.id).occupied_count == 1
+
+
+def test_gate_parks_a_holder_in_the_held_spot(client, admin_headers, make_lot, make_user):
+    lot = make_lot(2)
+    holder, headers = make_user('holder')
+    walk_in = make_user('walk_in')[0]
+    spot_number = _hold(client, headers, lot).get_json()['spot_number']
+
+    response = client.post('/api/admin/gate/park', headers=admin_headers, json={'items': [
+        {'user_id': holder.id, 'lot_id': lot.id, 'vehicle_number': 'HELD'},
+        {'user_id': walk_in.id, 'lot_id': lot.id, 'vehicle_number': 'WALK'},
+    ]})
+    assert response.get_json()['succeeded'] == 2
+    sessions = {s.vehicle_number: s for s in ParkingSession.query}
+    assert sessions['HELD'].spot.spot_number == spot_number
+    assert sessions['WALK'].spot_id != sessions['HELD'].spot_id
+    assert SpotHold.query.one().status == 'CLAIMED'
+    assert db.session.get(ParkingLot, lot.id).occupied_count == 2
+
+
+def test_gate_refuses_a_holder_at_another_lot(client, admin_headers, make_lot, make_user):
+    held_lot, other_lot = make_lot(1, name='Held'), make_lot(1, name='Other')
+    holder, headers = make_user('holder')
+    _hold(client, headers, held_lot)
+
+    response = client.post('/api/admin/gate/park', headers=admin_headers,
+                           json={'items': [{'user_id': holder.id, 'lot_id': other_lot.id, 'vehicle_number': 'CAR'}]})
+    assert response.get_json()['results'][0]['error'] == 'User holds a spot in another lot'
+    assert SpotHold.query.one().status == 'HELD'
+    assert db.session.get(ParkingLot, other_lot.id).occupied_count == 0
+
+
+def test_gate_parks_a_holder_whose_hold_ran_out_in_a_free_spot(client, admin_headers, make_lot, make_user):
+    lot = make_lot(1)
+    holder = make_user('holder')[0]
+    hold = place_hold(holder, lot.id, 5)
+    hold.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    response = client.post('/api/admin/gate/park', headers=admin_headers,
+                           json={'items': [{'user_id': holder.id, 'lot_id': lot.id, 'vehicle_number': 'CAR'}]})
+    assert response.get_json()['succeeded'] == 1
+    assert SpotHold.query.one().status == 'EXPIRED'
+    assert db.session.get(ParkingLot, lot.id).occupied_count == 1
+
+
+def test_summary_and_forecast_leave_held_spots_out(client, admin_headers, make_lot, make_user):
+    lot = make_lot(3, name='North')
+    _, parker = make_user('parker')
+    _, holder = make_user('holder')
+    client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': 'CAR'}, headers=parker)
+    _hold(client, holder, lot)
+
+    summary = client.get('/api/admin/summary', headers=admin_headers).get_json()
+    assert summary['current_occupancy'] == 2
+    assert summary['lot_analytics'] == [{'name': 'North', 'bookings': 1, 'revenue': 0}]
+    forecast = client.get(f'/api/admin/lots/{lot.id}/forecast?hours=1', headers=admin_headers).get_json()
+    assert forecast['occupied_now'] == 1
+
+
+def test_holder_whose_hold_ran_out_parks_in_the_freed_spot(client, make_lot, make_user):
+    lot = make_lot(1)
+    holder, headers = make_user('holder')
+    hold = place_hold(holder, lot.id, 5)
+    hold.expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+    response = client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': 'CAR'}, headers=headers)
+    assert response.status_code == 201
+    assert SpotHold.query.one().status == 'EXPIRED'
+    assert db.session.get(ParkingLot, lot.id).occupied_count == 1
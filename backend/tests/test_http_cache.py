@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+from extensions import db
+from models import ParkingSession, ParkingSpot
+from utils.rollups import rebuild_rollups
+
+
+def _get(client, url, headers, etag=None):
+    if etag:
+        headers = dict(headers, **{'If-None-Match': etag})
+    return client.get(url, headers=headers)
+
+
+def _park(client, lot, headers, vehicle_number='CAR'):
+    response = client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': vehicle_number}, headers=headers)
+    assert response.status_code == 201
+
+
+def _completed_session(user, lot, amount=10.0):
+    spot = ParkingSpot.query.filter_by(lot_id=lot.id).first()
+    entry = datetime(2026, 9, 1, 8)
+    db.session.add(ParkingSession(user_id=user.id, lot_id=lot.id, spot_id=spot.id, vehicle_number='CAR',
+                                  entry_time=entry, exit_time=entry + timedelta(hours=1),
+                                  amount_paid=amount, status='COMPLETED'))
+    db.session.commit()
+
+
+def test_unchanged_history_is_answered_304(client, make_lot, make_user):
+    lot = make_lot(1)
+    _, headers = make_user('driver')
+    _park(client, lot, headers)
+
+    first = _get(client, '/api/user/history', headers)
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    again = _get(client, '/api/user/history', headers, first.headers['ETag'])
+    assert again.status_code == 304
+    assert again.headers['ETag'] == first.headers['ETag']
+
+
+def test_park_and_unpark_change_the_users_tags(client, make_lot, make_user):
+    lot = make_lot(1)
+    _, headers = make_user('driver')
+    history = _get(client, '/api/user/history', headers).headers['ETag']
+    summary = _get(client, '/api/user/summary', headers).headers['ETag']
+
+    _park(client, lot, headers)
+    assert _get(client, '/api/user/history', headers, history).status_code == 200
+    parked = _get(client, '/api/user/summary', headers, summary)
+    assert parked.status_code == 200
+
+    client.post('/api/user/unpark', headers=headers)
+    assert _get(client, '/api/user/summary', headers, parked.headers['ETag']).status_code == 200
+
+
+def test_tags_are_per_user(client, make_lot, make_user):
+    _, alice = make_user('alice')
+    _, bob = make_user('bob')
+    etag = _get(client, '/api/user/history', alice).headers['ETag']
+    assert _get(client, '/api/user/history', bob, etag).status_code == 200
+
+
+def test_lot_rename_changes_history_only_for_its_users(client, admin_headers, make_lot, make_user):
+    renamed, other = make_lot(1, name='North'), make_lot(1, name='South')
+    _, north_driver = make_user('north')
+    _, south_driver = make_user('south')
+    _park(client, renamed, north_driver)
+    _park(client, other, south_driver)
+    north_tag = _get(client, '/api/user/history', north_driver).headers['ETag']
+    south_tag = _get(client, '/api/user/history', south_driver).headers['ETag']
+
+    response = client.put(f'/api/admin/lots/{renamed.id}', json={'name': 'North Gate'}, headers=admin_headers)
+    assert response.status_code == 200
+    changed = _get(client, '/api/user/history', north_driver, north_tag)
+    assert changed.status_code == 200
+    assert 'North Gate' in changed.get_data(as_text=True)
+    assert _get(client, '/api/user/history', south_driver, south_tag).status_code == 304
+
+
+def test_deleting_a_lot_changes_history_only_for_its_users(client, admin_headers, make_lot, make_user):
+    deleted, kept = make_lot(1, name='Deleted'), make_lot(1, name='Kept')
+    driver, driver_headers = make_user('driver')
+    bystander, bystander_headers = make_user('bystander')
+    _completed_session(driver, deleted)
+    _completed_session(bystander, kept)
+    rebuild_rollups()
+    driver_tag = _get(client, '/api/user/history', driver_headers).headers['ETag']
+    bystander_tag = _get(client, '/api/user/history', bystander_headers).headers['ETag']
+
+    assert client.delete(f'/api/admin/lots/{deleted.id}', headers=admin_headers).status_code == 200
+    history = _get(client, '/api/user/history', driver_headers, driver_tag)
+    assert history.status_code == 200
+    assert 'Deleted' not in history.get_data(as_text=True)
+    assert _get(client, '/api/user/history', bystander_headers, bystander_tag).status_code == 304
+    assert ParkingSession.query.count() == 1
+
+
+def test_rollup_rebuild_changes_the_tags_of_what_it_rewrites(client, admin_headers, make_lot, make_user):
+    lot = make_lot(1)
+    user, headers = make_user('driver')
+    _, bystander = make_user('bystander')
+    _completed_session(user, lot)
+    user_tag = _get(client, '/api/user/summary', headers).headers['ETag']
+    bystander_tag = _get(client, '/api/user/summary', bystander).headers['ETag']
+    admin_tag = _get(client, '/api/admin/summary', admin_headers).headers['ETag']
+
+    rebuild_rollups()
+    assert _get(client, '/api/user/summary', headers, user_tag).status_code == 200
+    assert _get(client, '/api/user/summary', bystander, bystander_tag).status_code == 304
+    summary = _get(client, '/api/admin/summary', admin_headers, admin_tag)
+    assert summary.status_code == 200
+    assert summary.get_json()['lot_analytics'][0]['revenue'] == 10.0
+
+
+def test_admin_summary_tag_follows_the_user_count(client, admin_headers, make_user):
+    removed, _ = make_user('first')
+    make_user('second')
+    etag = _get(client, '/api/admin/summary', admin_headers).headers['ETag']
+
+    db.session.delete(removed)
+    db.session.commit()
+    summary = _get(client, '/api/admin/summary', admin_headers, etag)
+    assert summary.status_code == 200
+    assert summary.get_json()['total_users'] == 1
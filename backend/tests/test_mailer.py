@@ -0,0 +1,59 @@
+import smtplib
+import pytest
+import utils.mailer as mailer
+from utils.mailer import build_message, is_permanent, send_messages
+
+
+class FakeConnection:
+    """Fails each send with the next of `errors` (None sends)."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self.sent = []
+
+    def send(self, msg):
+        error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        self.sent.append(msg)
+
+
+@pytest.fixture
+def smtp(app, monkeypatch):
+    app.config.update(MAIL_MAX_RETRIES=3, MAIL_RETRY_BACKOFF=0, MAIL_RATE_LIMIT=0)
+    connections = []
+
+    def connect(errors):
+        def open_connection():
+            connections.append(FakeConnection(errors))
+            return connections[-1]
+        monkeypatch.setattr(mailer, '_open_connection', open_connection)
+        monkeypatch.setattr(mailer, '_close_connection', lambda conn: None)
+        return connections
+    return connect
+
+
+@pytest.mark.parametrize('error, permanent', [
+    (smtplib.SMTPDataError(554, b'Rejected'), True),
+    (smtplib.SMTPSenderRefused(550, b'No such sender', 'a@example.com'), True),
+    (smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'No such user')}), True),
+    (smtplib.SMTPDataError(451, b'Try again later'), False),
+    (smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'No'), 'b@example.com': (452, b'Full')}), False),
+    (smtplib.SMTPServerDisconnected('Connection lost'), False),
+    (ConnectionResetError(), False),
+])
+def test_only_5xx_replies_are_permanent(error, permanent):
+    assert is_permanent(error) is permanent
+
+
+def test_permanent_rejection_is_not_retried(smtp):
+    connections = smtp([smtplib.SMTPDataError(554, b'Rejected')])
+    assert send_messages([build_message('a@example.com', 'Hi', 'Body')]) == (0, 1)
+    assert len(connections) == 1
+
+
+def test_transient_failures_reconnect_and_retry(smtp):
+    connections = smtp([smtplib.SMTPDataError(451, b'Later'), smtplib.SMTPServerDisconnected('Gone')])
+    messages = [build_message(f'{name}@example.com', 'Hi', 'Body') for name in ('a', 'b')]
+    assert send_messages(messages) == (2, 0)
+    assert len(connections) == 3
@@ -0,0 +1,66 @@
+from datetime import datetime
+from extensions import db
+from models import ParkingSession, ParkingSpot
+import tasks
+from tasks import monthly_report_batches, build_monthly_reports, previous_month
+
+PERIOD_START = datetime(2026, 9, 1)
+
+
+def _session(user, lot, entry, amount):
+    spot = ParkingSpot.query.filter_by(lot_id=lot.id).first()
+    db.session.add(ParkingSession(user_id=user.id, lot_id=lot.id, spot_id=spot.id, vehicle_number='CAR',
+                                  entry_time=entry, exit_time=entry.replace(hour=entry.hour + 1),
+                                  amount_paid=amount, status='COMPLETED'))
+
+
+def test_previous_month():
+    assert previous_month(datetime(2026, 10, 18, 9, 30)) == (datetime(2026, 9, 1), datetime(2026, 10, 1))
+    assert previous_month(datetime(2026, 1, 5)) == (datetime(2025, 12, 1), datetime(2026, 1, 1))
+
+
+def test_batches_page_users_who_parked_in_the_month(app, make_user, make_lot):
+    lot = make_lot(1)
+    users = [make_user(f'driver{i}')[0] for i in range(5)]
+    for user in users[:4]:
+        _session(user, lot, datetime(2026, 9, 10, 8), 10.0)
+    _session(users[4], lot, datetime(2026, 10, 2, 8), 10.0)
+    db.session.commit()
+
+    batches = list(monthly_report_batches(PERIOD_START, batch_size=3))
+    assert batches == [[u.id for u in users[:3]], [users[3].id]]
+
+
+def test_reports_total_each_user_and_pick_favourite_lot(app, make_user, make_lot):
+    north, south = make_lot(1, name='North'), make_lot(1, name='South')
+    alice, bob = make_user('alice')[0], make_user('bob')[0]
+    _session(alice, north, datetime(2026, 9, 3, 8), 10.0)
+    _session(alice, south, datetime(2026, 9, 4, 8), 20.0)
+    _session(alice, south, datetime(2026, 9, 5, 8), 30.0)
+    _session(alice, north, datetime(2026, 8, 31, 8), 99.0)
+    _session(bob, north, datetime(2026, 9, 6, 8), 5.0)
+    db.session.commit()
+
+    reports = dict(build_monthly_reports([alice.id, bob.id], PERIOD_START))
+    assert set(reports) == {'alice@example.com', 'bob@example.com'}
+    alice_report = reports['alice@example.com']
+    assert '<strong>Total Parkings:</strong> 3<' in alice_report
+    assert '<strong>Total Spent:</strong> $60.0<' in alice_report
+    assert '<strong>Favorite Lot:</strong> South<' in alice_report
+    assert '$99' not in alice_report
+    assert '<strong>Total Spent:</strong> $5.0<' in reports['bob@example.com']
+
+
+def test_schedule_dispatches_one_task_per_batch(app, make_user, make_lot, monkeypatch):
+    app.config['MONTHLY_REPORT_BATCH_SIZE'] = 2
+    lot = make_lot(1)
+    period_start, _ = previous_month()
+    for i in range(5):
+        _session(make_user(f'driver{i}')[0], lot, period_start.replace(day=2, hour=8), 10.0)
+    db.session.commit()
+    dispatched = []
+    monkeypatch.setattr(tasks.generate_monthly_reports, 'delay',
+                        lambda user_ids, start: dispatched.append((len(user_ids), start)))
+
+    assert tasks.schedule_monthly_reports.run() == 'Dispatched 5 reports in 3 batches.'
+    assert dispatched == [(2, period_start.isoformat()), (2, period_start.isoformat()), (1, period_start.isoformat())]
@@ -0,0 +1,59 @@
+from sqlalchemy import update
+from extensions import db
+from models import ParkingLot, ParkingSpot
+from utils.availability import reconcile_occupancy
+
+
+def _available(client, headers, lot):
+    lots = {entry['id']: entry for entry in client.get('/api/user/lots', headers=headers).get_json()}
+    return lots[lot.id]['available_spots'] if lot.id in lots else 0
+
+
+def test_counters_follow_every_kind_of_occupancy_change(client, admin_headers, make_lot, make_user):
+    lot = make_lot(4)
+    drivers = [make_user(f'driver{i}') for i in range(4)]
+    client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': 'CAR0'}, headers=drivers[0][1])
+    client.post('/api/user/hold', json={'lot_id': lot.id}, headers=drivers[1][1])
+    client.post('/api/admin/gate/park', headers=admin_headers, json={'items': [
+        {'user_id': drivers[2][0].id, 'lot_id': lot.id, 'vehicle_number': 'CAR2'},
+        {'user_id': drivers[3][0].id, 'lot_id': lot.id, 'vehicle_number': 'CAR3'},
+    ]})
+    assert db.session.get(ParkingLot, lot.id).occupied_count == 4
+
+    client.post('/api/user/unpark', headers=drivers[0][1])
+    client.delete('/api/user/hold', headers=drivers[1][1])
+    client.post('/api/admin/gate/unpark', headers=admin_headers, json={'items': [{'vehicle_number': 'CAR2'}]})
+    assert db.session.get(ParkingLot, lot.id).occupied_count == 1
+    assert reconcile_occupancy(repair=False) == []
+
+
+def test_lot_list_is_refreshed_on_park_and_unpark(client, make_lot, make_user):
+    lot = make_lot(2)
+    _, headers = make_user('driver')
+    assert _available(client, headers, lot) == 2
+
+    client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': 'CAR'}, headers=headers)
+    assert _available(client, headers, lot) == 1
+    client.post('/api/user/unpark', headers=headers)
+    assert _available(client, headers, lot) == 2
+
+
+def test_reconcile_reports_and_repairs_drift(client, make_lot, make_user):
+    drifted, fine = make_lot(3, name='Drifted'), make_lot(3, name='Fine')
+    _, headers = make_user('driver')
+    assert _available(client, headers, drifted) == 3
+    db.session.execute(update(ParkingSpot).where(ParkingSpot.lot_id == drifted.id).values(is_occupied=True))
+    db.session.execute(update(ParkingLot).where(ParkingLot.id == fine.id).values(occupied_count=0))
+    db.session.commit()
+    version = db.session.get(ParkingLot, drifted.id).version
+
+    assert reconcile_occupancy(repair=False) == [(drifted.id, 0, 3)]
+    assert db.session.get(ParkingLot, drifted.id).occupied_count == 0
+
+    assert reconcile_occupancy() == [(drifted.id, 0, 3)]
+    db.session.expire_all()
+    lot = db.session.get(ParkingLot, drifted.id)
+    assert lot.occupied_count == 3
+    assert lot.version > version
+    assert _available(client, headers, drifted) == 0
+    assert reconcile_occupancy() == []
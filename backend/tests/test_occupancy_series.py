@@ -0,0 +1,137 @@
+from datetime import date, datetime, timedelta
+import math
+import numpy as np
+import pytest
+from extensions import db
+from models import LotOccupancyDay, ParkingSession, ParkingSpot
+from utils.occupancy_series import (BUCKET_SECONDS, BUCKETS_PER_DAY, FORECAST_DECAY_HOURS, forecast_occupancy,
+                                    occupancy_history, occupied_seconds, rebuild_occupancy,
+                                    record_completed_occupancy)
+
+DAY = date(2026, 9, 7)
+MIDNIGHT = datetime.combine(DAY, datetime.min.time())
+
+
+def _session(lot, entry, exit_time=None):
+    spot = ParkingSpot.query.filter_by(lot_id=lot.id).first()
+    session = ParkingSession(user_id=1, lot_id=lot.id, spot_id=spot.id, vehicle_number='CAR', entry_time=entry,
+                             exit_time=exit_time, amount_paid=0.0 if exit_time else None,
+                             status='COMPLETED' if exit_time else 'ACTIVE')
+    db.session.add(session)
+    return session
+
+
+def _rows(lot_id):
+    return {row.day: np.frombuffer(row.buckets, dtype='<f4').copy()
+            for row in LotOccupancyDay.query.filter_by(lot_id=lot_id)}
+
+
+def test_occupied_seconds_matches_a_direct_overlap_sum():
+    rng = np.random.default_rng(7)
+    starts = rng.uniform(0, 20 * BUCKET_SECONDS, 50)
+    ends = starts + rng.uniform(0, 6 * BUCKET_SECONDS, 50)
+    origin, buckets = 2 * BUCKET_SECONDS, 16
+    lows = origin + BUCKET_SECONDS * np.arange(buckets)
+    expected = [np.clip(np.minimum(ends, low + BUCKET_SECONDS) - np.maximum(starts, low), 0, None).sum()
+                for low in lows]
+    assert occupied_seconds(starts, ends, origin, buckets) == pytest.approx(expected)
+    assert not occupied_seconds(np.array([]), np.array([]), origin, buckets).any()
+
+
+def test_recorded_sessions_match_a_rebuild_across_midnight(make_lot):
+    lot = make_lot(3)
+    first = [_session(lot, MIDNIGHT + timedelta(hours=8), MIDNIGHT + timedelta(hours=9, minutes=10)),
+             _session(lot, MIDNIGHT + timedelta(hours=23, minutes=50), MIDNIGHT + timedelta(days=1, minutes=20))]
+    second = [_session(lot, MIDNIGHT + timedelta(hours=8, minutes=30), MIDNIGHT + timedelta(hours=8, minutes=45))]
+    db.session.flush()
+    record_completed_occupancy(first)
+    record_completed_occupancy(second)
+    db.session.commit()
+    recorded = _rows(lot.id)
+
+    today, tomorrow = recorded[DAY], recorded[DAY + timedelta(days=1)]
+    assert today[32:37].tolist() == [900, 900, 1800, 900, 600]
+    assert today[-1] == 600 and tomorrow[:2].tolist() == [900, 300]
+    assert today.sum() + tomorrow.sum() == (70 + 30 + 15) * 60
+
+    rebuild_occupancy()
+    rebuilt = _rows(lot.id)
+    assert rebuilt.keys() == recorded.keys()
+    for day, buckets in recorded.items():
+        assert rebuilt[day] == pytest.approx(buckets)
+
+
+def test_rebuild_since_keeps_earlier_days(make_lot):
+    lot = make_lot(1)
+    _session(lot, MIDNIGHT + timedelta(hours=8), MIDNIGHT + timedelta(hours=9))
+    _session(lot, MIDNIGHT + timedelta(days=2, hours=8), MIDNIGHT + timedelta(days=2, hours=9))
+    db.session.commit()
+    rebuild_occupancy()
+    LotOccupancyDay.query.delete()
+    db.session.commit()
+
+    rebuild_occupancy(since=DAY + timedelta(days=1))
+    assert list(_rows(lot.id)) == [DAY + timedelta(days=2)]
+
+
+def test_history_adds_vehicles_still_parked(make_lot):
+    lot = make_lot(2)
+    _session(lot, MIDNIGHT + timedelta(hours=8), MIDNIGHT + timedelta(hours=9))
+    _session(lot, MIDNIGHT + timedelta(hours=8, minutes=30))
+    db.session.commit()
+    rebuild_occupancy()
+
+    days, occupied = occupancy_history(lot.id, DAY - timedelta(days=1), DAY, now=MIDNIGHT + timedelta(hours=10))
+    assert days == [DAY - timedelta(days=1), DAY]
+    assert not occupied[0].any()
+    assert occupied[1][32:41].tolist() == [1, 1, 2, 2, 1, 1, 1, 1, 0]
+
+
+@pytest.fixture
+def commuters(make_lot):
+    """Two cars parked 08:00-10:00 on DAY's weekday in each of the four weeks before it."""
+    lot = make_lot(4)
+    for week in range(1, 5):
+        morning = MIDNIGHT - timedelta(weeks=week) + timedelta(hours=8)
+        for _ in range(2):
+            _session(lot, morning, morning + timedelta(hours=2))
+    db.session.commit()
+    rebuild_occupancy()
+    return lot
+
+
+def test_forecast_follows_the_weekday_profile(commuters):
+    forecast = forecast_occupancy(commuters, hours=4, now=MIDNIGHT + timedelta(hours=7), occupied_now=0)
+    assert forecast[0][0] == MIDNIGHT + timedelta(hours=7)
+    assert [round(expected, 6) for _, expected in forecast] == [0] * 4 + [2] * 8 + [0] * 4
+
+
+def test_forecast_carries_the_current_gap_and_lets_it_fade(commuters):
+    forecast = forecast_occupancy(commuters, hours=1, now=MIDNIGHT + timedelta(hours=7), occupied_now=3)
+    fade = math.exp(-BUCKET_SECONDS / 3600 / FORECAST_DECAY_HOURS)
+    assert [expected for _, expected in forecast] == pytest.approx([3 * fade ** step for step in range(4)])
+
+    capped = forecast_occupancy(commuters, hours=2, now=MIDNIGHT + timedelta(hours=7, minutes=50), occupied_now=4)
+    assert max(expected for _, expected in capped) == commuters.capacity
+
+
+def test_forecast_of_a_lot_that_was_never_used_fades_to_empty(make_lot):
+    lot = make_lot(4)
+    forecast = forecast_occupancy(lot, hours=2, now=MIDNIGHT, occupied_now=3)
+    fade = math.exp(-BUCKET_SECONDS / 3600 / FORECAST_DECAY_HOURS)
+    assert len(forecast) == 2 * 3600 // BUCKET_SECONDS
+    assert [expected for _, expected in forecast] == pytest.approx([3 * fade ** step for step in range(8)])
+
+
+def test_routes_validate_and_report_parked_not_held(client, admin_headers, make_lot, make_user):
+    lot = make_lot(3)
+    client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': 'CAR'}, headers=make_user('parker')[1])
+    client.post('/api/user/hold', json={'lot_id': lot.id}, headers=make_user('holder')[1])
+
+    assert client.get(f'/api/admin/lots/{lot.id}/occupancy?days=0', headers=admin_headers).status_code == 400
+    assert client.get(f'/api/admin/lots/{lot.id}/forecast?hours=169', headers=admin_headers).status_code == 400
+    history = client.get(f'/api/admin/lots/{lot.id}/occupancy?days=2', headers=admin_headers).get_json()
+    assert len(history['days']) == 2 and len(history['occupied'][0]) == BUCKETS_PER_DAY
+    forecast = client.get(f'/api/admin/lots/{lot.id}/forecast?hours=1', headers=admin_headers).get_json()
+    assert forecast['occupied_now'] == 1
+    assert forecast['forecast'][0]['expected_occupied'] == 1
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+import pytest
+from extensions import db
+from models import ParkingSession, ParkingSpot, TaskRun
+import tasks
+from tasks import reminder_batches
+
+
+def _session(user, lot, entry):
+    spot = ParkingSpot.query.filter_by(lot_id=lot.id).first()
+    db.session.add(ParkingSession(user_id=user.id, lot_id=lot.id, spot_id=spot.id, vehicle_number='CAR',
+                                  entry_time=entry, exit_time=entry + timedelta(hours=1),
+                                  amount_paid=10.0, status='COMPLETED'))
+
+
+@pytest.fixture
+def idle(make_lot, make_user):
+    """Seven drivers, two of whom parked in the last day; returns (cutoff,
+    ids of the five who have not parked since cutoff)."""
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=1)
+    lot = make_lot(1)
+    users = [make_user(f'driver{i}')[0] for i in range(7)]
+    # Several old sessions must not repeat a user; one recent session excludes them.
+    for day in (3, 5, 9):
+        _session(users[1], lot, now - timedelta(days=day))
+    _session(users[2], lot, now - timedelta(hours=2))
+    _session(users[2], lot, now - timedelta(days=4))
+    _session(users[5], lot, cutoff + timedelta(minutes=1))
+    _session(users[6], lot, cutoff - timedelta(minutes=1))
+    db.session.commit()
+    return cutoff, [user.id for i, user in enumerate(users) if i not in (2, 5)]
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 5, 100])
+def test_batches_page_every_idle_user_once(idle, batch_size):
+    cutoff, idle_ids = idle
+    batches = list(reminder_batches(cutoff, batch_size))
+    assert all(1 <= len(batch) <= batch_size for batch in batches)
+    assert [user.id for batch in batches for user in batch] == idle_ids
+
+
+def test_a_session_entered_at_the_cutoff_counts_as_recent(idle):
+    cutoff, idle_ids = idle
+    entered = cutoff - timedelta(minutes=1)
+    ids = [user.id for batch in reminder_batches(entered, 100) for user in batch]
+    assert ids == idle_ids[:-1]
+
+
+def test_admins_are_not_reminded(idle):
+    usernames = {user.username for batch in reminder_batches(idle[0], 100) for user in batch}
+    assert 'admin' not in usernames
+
+
+def test_daily_reminders_mail_the_idle_users_and_record_the_run(app, idle, monkeypatch):
+    app.config['REMINDER_BATCH_SIZE'] = 2
+    sent_to = []
+
+    def send_messages(messages):
+        for message in messages:
+            sent_to.extend(message.recipients)
+        return len(sent_to), 0
+    monkeypatch.setattr(tasks, 'send_messages', send_messages)
+    result = tasks.send_daily_reminders()
+
+    assert sent_to == [f'driver{i}@example.com' for i in (0, 1, 3, 4, 6)]
+    run = TaskRun.query.filter_by(task='send_daily_reminders').one()
+    assert run.stats == {'selected': 5, 'sent': 5, 'failed': 0}
+    assert result.startswith('Selected 5 users, sent 5, failed 0')
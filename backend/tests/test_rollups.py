@@ -0,0 +1,109 @@
+from datetime import date, datetime, timedelta
+import pytest
+from extensions import db
+from models import LotDailyStat, ParkingSession, ParkingSpot, UserDailyStat
+from utils.rollups import record_completed_sessions, rebuild_rollups
+
+
+def _rollups():
+    lots = {(r.lot_id, r.day): (r.sessions, r.revenue, r.duration_seconds) for r in LotDailyStat.query}
+    users = {(r.user_id, r.lot_id, r.day): (r.sessions, r.revenue, r.duration_seconds) for r in UserDailyStat.query}
+    return lots, users
+
+
+def _assert_rebuild_matches(recorded):
+    # SQLite's julianday arithmetic is only accurate to about a millisecond.
+    rebuild_rollups()
+    rebuilt = _rollups()
+    for recorded_rows, rebuilt_rows in zip(recorded, rebuilt):
+        assert recorded_rows.keys() == rebuilt_rows.keys()
+        for key, values in recorded_rows.items():
+            assert rebuilt_rows[key] == pytest.approx(values, abs=0.01)
+
+
+def _completed(user, lot, entry, hours, amount):
+    spot = ParkingSpot.query.filter_by(lot_id=lot.id).first()
+    session = ParkingSession(user_id=user.id, lot_id=lot.id, spot_id=spot.id, vehicle_number='CAR',
+                             entry_time=entry, exit_time=entry + timedelta(hours=hours),
+                             amount_paid=amount, status='COMPLETED')
+    db.session.add(session)
+    return session
+
+
+def test_recorded_sessions_match_a_rebuild(make_lot, make_user):
+    north, south = make_lot(2, name='North'), make_lot(2, name='South')
+    alice, bob = make_user('alice')[0], make_user('bob')[0]
+    day = datetime(2026, 9, 1, 8)
+    sessions = [_completed(alice, north, day, 1, 10.0), _completed(alice, north, day + timedelta(hours=3), 2, 20.0),
+                _completed(bob, north, day, 0.5, 5.0), _completed(alice, south, day, 1, 10.0),
+                _completed(alice, north, day + timedelta(days=1), 1, 12.5)]
+    db.session.flush()
+    record_completed_sessions(sessions[:2])
+    record_completed_sessions(sessions[2:])
+    db.session.commit()
+    recorded = _rollups()
+
+    assert recorded[0][(north.id, day.date())] == (3, 35.0, 3.5 * 3600)
+    assert recorded[1][(alice.id, north.id, day.date())] == (2, 30.0, 3 * 3600)
+    _assert_rebuild_matches(recorded)
+
+
+def test_api_parking_keeps_rollups_equal_to_a_rebuild(client, admin_headers, make_lot, make_user):
+    lot = make_lot(3)
+    drivers = [make_user(f'driver{i}') for i in range(3)]
+    for i, (_, headers) in enumerate(drivers[:2]):
+        client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': f'CAR{i}'}, headers=headers)
+    client.post('/api/admin/gate/park', headers=admin_headers, json={'items': [
+        {'user_id': drivers[2][0].id, 'lot_id': lot.id, 'vehicle_number': 'CAR2'}]})
+    client.post('/api/user/unpark', headers=drivers[0][1])
+    client.post('/api/admin/gate/unpark', headers=admin_headers,
+                json={'items': [{'vehicle_number': 'CAR1'}, {'vehicle_number': 'CAR2'}]})
+
+    recorded = _rollups()
+    assert sum(sessions for sessions, _, _ in recorded[0].values()) == 3
+    assert len(recorded[1]) == 3
+    _assert_rebuild_matches(recorded)
+
+
+def test_rebuild_since_only_replaces_later_days(make_lot, make_user):
+    lot = make_lot(1)
+    user = make_user('driver')[0]
+    old, recent = datetime(2026, 8, 1, 8), datetime(2026, 9, 1, 8)
+    _completed(user, lot, old, 1, 10.0)
+    _completed(user, lot, recent, 1, 10.0)
+    db.session.commit()
+    rebuild_rollups()
+
+    LotDailyStat.query.update({LotDailyStat.sessions: 99})
+    db.session.commit()
+    rebuild_rollups(since=date(2026, 9, 1))
+    lots, _ = _rollups()
+    assert lots[(lot.id, old.date())][0] == 99
+    assert lots[(lot.id, recent.date())][0] == 1
+
+
+@pytest.fixture
+def parked(client, admin_headers, make_lot, make_user):
+    """A lot with one completed session, one active session and one hold."""
+    lot = make_lot(3, name='North')
+    parker, parker_headers = make_user('parker')
+    _, holder_headers = make_user('holder')
+    _completed(parker, lot, datetime(2026, 9, 1, 8), 2, 20.0)
+    db.session.commit()
+    rebuild_rollups()
+    client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': 'CAR'}, headers=parker_headers)
+    client.post('/api/user/hold', json={'lot_id': lot.id}, headers=holder_headers)
+    return parker_headers
+
+
+def test_admin_summary_counts_active_sessions_but_not_holds(client, admin_headers, parked):
+    summary = client.get('/api/admin/summary', headers=admin_headers).get_json()
+    assert summary['current_occupancy'] == 2
+    assert summary['lot_analytics'] == [{'name': 'North', 'bookings': 2, 'revenue': 20.0}]
+
+
+def test_user_summary_matches_the_session_table(client, parked):
+    summary = client.get('/api/user/summary', headers=parked).get_json()
+    assert summary['usage_by_lot'] == [{'lot': 'North', 'count': 2}]
+    assert summary['monthly_spend'] == [{'month': '2026-09', 'amount': 20.0}]
+    assert summary['spend_by_lot'] == [{'lot': 'North', 'amount': 20.0}]
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+import pytest
+from extensions import db
+from models import ParkingSession, ParkingSpot, User
+import utils.search_index as search_index
+
+
+@pytest.fixture
+def data(make_lot, make_user):
+    """Lots, users and two drivers' sessions with overlapping names;
+    returns the first driver's headers."""
+    north = make_lot(3, name='North Plaza')
+    south = make_lot(2, name='South Station')
+    make_lot(1, name='Plaza Annex')
+    make_user('plaza_fan', email='fan@plaza.example')
+    make_user('bob')
+    driver, headers = make_user('driver')
+    other, _ = make_user('other')
+    entry = datetime(2026, 9, 1, 8)
+    for i, (user, lot, vehicle) in enumerate([(driver, north, 'KA01PL4'), (driver, south, 'MH12AB'),
+                                              (driver, south, 'PLAZA-1'), (other, north, 'KA01PL9')]):
+        spot = ParkingSpot.query.filter_by(lot_id=lot.id).first()
+        db.session.add(ParkingSession(user_id=user.id, lot_id=lot.id, spot_id=spot.id, vehicle_number=vehicle,
+                                      entry_time=entry + timedelta(hours=i), exit_time=entry + timedelta(hours=i + 1),
+                                      amount_paid=10.0, status='COMPLETED'))
+    db.session.commit()
+    return headers
+
+
+def _like_only(monkeypatch):
+    monkeypatch.setattr(search_index, '_index_ready', lambda: False)
+
+
+def _admin_results(client, headers, query):
+    results = client.get(f'/api/admin/search?q={query}', headers=headers).get_json()['results']
+    return {kind: sorted(item['id'] for item in items) for kind, items in results.items()}
+
+
+def _user_results(client, headers, query):
+    results = client.get(f'/api/user/search?q={query}', headers=headers).get_json()
+    return sorted(lot['id'] for lot in results['lots']), [session['id'] for session in results['history']]
+
+
+@pytest.mark.parametrize('query', ['plaza', 'PLAZA', 'pl', 'ka01', 'spot-1', 'station', 'nothing'])
+def test_index_and_like_find_the_same_rows(client, admin_headers, data, monkeypatch, query):
+    indexed = _admin_results(client, admin_headers, query), _user_results(client, data, query)
+    _like_only(monkeypatch)
+    assert (_admin_results(client, admin_headers, query), _user_results(client, data, query)) == indexed
+
+
+def test_longer_queries_use_the_index(client, admin_headers, data, query_log):
+    with query_log() as log:
+        _admin_results(client, admin_headers, 'plaza')
+    assert any('MATCH' in statement for statement in log.statements)
+    with query_log() as log:
+        _admin_results(client, admin_headers, 'pl')
+    assert not any('MATCH' in statement for statement in log.statements)
+
+
+def test_user_search_only_returns_the_users_own_sessions(client, data):
+    _, history = _user_results(client, data, 'ka01')
+    assert [db.session.get(ParkingSession, i).vehicle_number for i in history] == ['KA01PL4']
+    _, history = _user_results(client, data, 'plaza')
+    assert [db.session.get(ParkingSession, i).vehicle_number for i in history] == ['PLAZA-1', 'KA01PL4']
+
+
+def test_index_follows_updates_and_deletes(client, admin_headers, data):
+    user = User.query.filter_by(username='bob').one()
+    user.username = 'bobby_tables'
+    db.session.commit()
+    assert _admin_results(client, admin_headers, 'tables')['users'] == [user.id]
+    assert _admin_results(client, admin_headers, 'bob')['users'] == [user.id]
+
+    db.session.delete(user)
+    db.session.commit()
+    assert _admin_results(client, admin_headers, 'tables')['users'] == []
+
+
+def test_retired_spots_are_not_found(client, admin_headers, make_lot):
+    lot = make_lot(3, name='Resized')
+    client.put(f'/api/admin/lots/{lot.id}', json={'capacity': 1}, headers=admin_headers)
+    assert _admin_results(client, admin_headers, 'spot-3')['spots'] == []
+    active = ParkingSpot.query.filter_by(lot_id=lot.id, spot_number='SPOT-1').one()
+    assert active.id in _admin_results(client, admin_headers, 'spot-1')['spots']
@@ -0,0 +1,92 @@
+import time
+from types import SimpleNamespace
+from sqlalchemy import update
+from extensions import db
+from models import ParkingLot, ParkingSpot
+import utils.spot_allocator as allocator_module
+from utils.spot_allocator import spot_allocator, claim_spot, free_spot
+
+
+def _take_behind_allocator(spot_id):
+    # What another worker parking in the same lot looks like from here.
+    db.session.execute(update(ParkingSpot).where(ParkingSpot.id == spot_id).values(is_occupied=True))
+    db.session.commit()
+
+
+def test_park_takes_lowest_free_spot_until_full(client, make_lot, make_user):
+    lot = make_lot(2)
+    responses = [client.post('/api/user/park', json={'lot_id': lot.id, 'vehicle_number': f'CAR{i}'},
+                             headers=make_user(f'driver{i}')[1]) for i in range(3)]
+
+    assert [r.status_code for r in responses] == [201, 201, 400]
+    assert [r.get_json().get('spot_number') for r in responses[:2]] == ['SPOT-1', 'SPOT-2']
+    assert responses[2].get_json()['error'] == 'Parking Lot is full'
+    assert db.session.get(ParkingLot, lot.id).occupied_count == 2
+
+
+def test_stale_free_list_never_double_books(app, make_lot):
+    lot = make_lot(2)
+    first, second = ParkingSpot.query.filter_by(lot_id=lot.id).order_by(ParkingSpot.id).all()
+    assert spot_allocator.acquire(lot.id) == first.id
+    spot_allocator.release(lot.id, first.id)
+    _take_behind_allocator(first.id)
+
+    spot = claim_spot(lot.id)
+    assert spot.id == second.id
+    assert claim_spot(lot.id) is None
+    db.session.commit()
+    assert ParkingSpot.query.filter_by(lot_id=lot.id, is_occupied=True).count() == 2
+    assert db.session.get(ParkingLot, lot.id).occupied_count == 1
+
+
+def test_full_lot_is_not_reloaded_on_every_attempt(app, make_lot, query_log):
+    lot = make_lot(1)
+    assert claim_spot(lot.id) is not None
+    db.session.commit()
+
+    with query_log() as log:
+        for _ in range(10):
+            assert claim_spot(lot.id) is None
+    reads = [statement for statement in log.statements if 'FROM parking_spot' in statement]
+    # One reload finds the lot full; every later attempt is a LIMIT 1 check.
+    assert len(reads) == 10
+    assert sum('LIMIT' in statement for statement in reads) == 9
+
+
+def test_release_in_process_lifts_full_mark(app, make_lot):
+    lot = make_lot(1)
+    spot = claim_spot(lot.id)
+    db.session.commit()
+    assert claim_spot(lot.id) is None
+
+    free_spot(spot)
+    db.session.commit()
+    spot_allocator.release(lot.id, spot.id)
+    assert claim_spot(lot.id).id == spot.id
+
+
+def test_spot_freed_elsewhere_is_found_while_lot_is_marked_full(app, make_lot):
+    lot = make_lot(2)
+    first, second = claim_spot(lot.id), claim_spot(lot.id)
+    db.session.commit()
+    assert claim_spot(lot.id) is None
+
+    # Another worker unparks; this one never hears of it.
+    db.session.execute(update(ParkingSpot).where(ParkingSpot.id == second.id).values(is_occupied=False))
+    db.session.commit()
+    assert claim_spot(lot.id).id == second.id
+    assert claim_spot(lot.id) is None
+
+
+def test_lot_is_reloaded_once_full_mark_runs_out(app, make_lot, monkeypatch, query_log):
+    lot = make_lot(1)
+    claim_spot(lot.id)
+    db.session.commit()
+    assert claim_spot(lot.id) is None
+
+    later = time.monotonic() + spot_allocator.full_ttl + 1
+    monkeypatch.setattr(allocator_module, 'time', SimpleNamespace(monotonic=lambda: later))
+    with query_log() as log:
+        assert claim_spot(lot.id) is None
+    reads = [statement for statement in log.statements if 'FROM parking_spot' in statement]
+    assert len(reads) == 1 and 'LIMIT' not in reads[0]
@@ -0,0 +1,74 @@
+from extensions import db
+from models import ParkingLot, ParkingSpot
+import utils.spot_provisioning as provisioning
+
+
+def _spots(lot_id):
+    return [(s.spot_number, s.is_active, s.is_occupied)
+            for s in ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.id)]
+
+
+def _resize(client, headers, lot_id, capacity):
+    return client.put(f'/api/admin/lots/{lot_id}', json={'capacity': capacity}, headers=headers)
+
+
+def _park(client, lot_id, headers):
+    return client.post('/api/user/park', json={'lot_id': lot_id, 'vehicle_number': 'CAR'}, headers=headers)
+
+
+def test_create_lot_provisions_numbered_spots_in_chunks(client, admin_headers, monkeypatch):
+    monkeypatch.setattr(provisioning, 'INSERT_CHUNK', 4)
+    response = client.post('/api/admin/lots', json={'name': 'North', 'capacity': 10}, headers=admin_headers)
+    lot_id = response.get_json()['id']
+    assert response.status_code == 201
+    assert [number for number, _, _ in _spots(lot_id)] == [f'SPOT-{i}' for i in range(1, 11)]
+
+
+def test_shrinking_retires_free_spots_highest_first(client, admin_headers, make_lot, make_user):
+    lot_id = make_lot(4).id
+    _park(client, lot_id, make_user('driver')[1])
+
+    assert _resize(client, admin_headers, lot_id, 2).status_code == 200
+    assert _spots(lot_id) == [('SPOT-1', True, True), ('SPOT-2', True, False),
+                              ('SPOT-3', False, False), ('SPOT-4', False, False)]
+    assert db.session.get(ParkingLot, lot_id).capacity == 2
+
+
+def test_retired_spots_are_never_handed_out(client, admin_headers, make_lot, make_user):
+    lot_id = make_lot(3).id
+    _resize(client, admin_headers, lot_id, 1)
+    assert _park(client, lot_id, make_user('first')[1]).get_json()['spot_number'] == 'SPOT-1'
+    assert _park(client, lot_id, make_user('second')[1]).status_code == 400
+
+
+def test_shrinking_below_the_occupied_spots_is_refused(client, admin_headers, make_lot, make_user):
+    lot_id = make_lot(3).id
+    for name in ('first', 'second'):
+        _park(client, lot_id, make_user(name)[1])
+
+    response = _resize(client, admin_headers, lot_id, 1)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Only 1 free spots can be removed; 2 are occupied.'
+    assert all(active for _, active, _ in _spots(lot_id))
+    assert db.session.get(ParkingLot, lot_id).capacity == 3
+    # The allocator was reloaded, so the free spot is still handed out.
+    assert _park(client, lot_id, make_user('third')[1]).get_json()['spot_number'] == 'SPOT-3'
+
+
+def test_growing_reactivates_retired_spots_before_adding_new_ones(client, admin_headers, make_lot, make_user):
+    lot_id = make_lot(3).id
+    _resize(client, admin_headers, lot_id, 1)
+
+    assert _resize(client, admin_headers, lot_id, 5).status_code == 200
+    assert [(number, active) for number, active, _ in _spots(lot_id)] == [
+        ('SPOT-1', True), ('SPOT-2', True), ('SPOT-3', True), ('SPOT-4', True), ('SPOT-5', True)]
+    drivers = [make_user(f'driver{i}')[1] for i in range(6)]
+    assert [_park(client, lot_id, headers).status_code for headers in drivers] == [201] * 5 + [400]
+
+
+def test_invalid_capacity_is_rejected(client, admin_headers, make_lot):
+    lot_id = make_lot(2).id
+    assert _resize(client, admin_headers, lot_id, 0).status_code == 400
+    assert _resize(client, admin_headers, lot_id, 'many').status_code == 400
+    assert client.post('/api/admin/lots', json={'name': 'Empty', 'capacity': 0},
+                       headers=admin_headers).status_code == 400
@@ -1,9 +1,92 @@
 import jwt
+import threading
+import time
+from collections import OrderedDict, namedtuple
 from functools import wraps
 from flask import request, jsonify, current_app
+from sqlalchemy import event
 from models import User
+from utils.metrics import timed_section
 from datetime import datetime, timedelta
 
+# What token_required puts on request.current_user: enough identity for the
+# routes without keeping an ORM User attached to the request.
+Principal = namedtuple('Principal', ['id', 'role', 'username', 'email'])
+
+# The `scope` claim of tokens that only open event streams.
+STREAM_SCOPE = 'stream'
+
+
+class TokenCache:
+    """Bounded LRU of verified tokens. An entry lives for at most `ttl`
+    seconds and never past the token's own expiry; changing or deleting a
+    User evicts every token issued to them in this process."""
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_user = {}
+
+    def get(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            principal, expires_at = entry
+            if expires_at <= time.time():
+                self._evict(token)
+                return None
+            self._entries.move_to_end(token)
+            return principal
+
+    def put(self, token, principal, token_exp):
+        if self.maxsize <= 0:
+            return
+        expires_at = min(time.time() + self.ttl, token_exp)
+        with self._lock:
+            if token in self._entries:
+                self._evict(token)
+            self._entries[token] = (principal, expires_at)
+            self._by_user.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._evict(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in self._by_user.pop(user_id, ()):
+                self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def _evict(self, token):
+        principal, _ = self._entries.pop(token)
+        tokens = self._by_user.get(principal.id)
+        if tokens:
+            tokens.discard(token)
+            if not tokens:
+                del self._by_user[principal.id]
+
+
+token_cache = TokenCache()
+
+
+def init_token_cache(app):
+    token_cache.maxsize = app.config.get('AUTH_CACHE_SIZE', 10000)
+    token_cache.ttl = app.config.get('AUTH_CACHE_TTL', 60)
+    token_cache.clear()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _evict_changed_user(mapper, connection, target):
+    token_cache.invalidate_user(target.id)
+
+
 def generate_token(user):
     payload = {
         'user_id': user.id,
@@ -13,29 +96,71 @@ def generate_token(user):
     token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
     return token
 
-def token_required(f):
+def generate_stream_token(principal):
+    """A token that only opens event streams and expires within
+    STREAM_TOKEN_TTL seconds. EventSource can only send it in the URL, where
+    access logs keep it, so it must be worth nothing by the time anyone reads
+    one there."""
+    payload = {
+        'user_id': principal.id,
+        'role': principal.role,
+        'scope': STREAM_SCOPE,
+        'exp': datetime.utcnow() + timedelta(seconds=current_app.config.get('STREAM_TOKEN_TTL', 60))
+    }
+    return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
+
+def _bearer_token():
+    auth = request.headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        return auth.split(' ', 1)[1].strip()
+    return None
+
+def _authenticated(f, token_getter, scope=None):
+    """Checks the token from token_getter, which must carry `scope` (API
+    tokens carry none). Only API tokens are cached."""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            auth = request.headers.get('Authorization')
-            if auth.startswith('Bearer '):
-                token = auth.split(' ', 1)[1].strip()
+        token = token_getter()
         if not token:
             return jsonify({'error': 'Token is missing'}), 401
-        try:
-            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-            user = User.query.get(data['user_id'])
-            if not user:
-                return jsonify({'error': 'Invalid token user'}), 401
-            request.current_user = user
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expired'}), 401
-        except Exception:
-            return jsonify({'error': 'Invalid token'}), 401
+        with timed_section('auth'):
+            principal = token_cache.get(token) if scope is None else None
+            if principal is None:
+                try:
+                    data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+                    if data.get('scope') != scope:
+                        return jsonify({'error': 'Invalid token'}), 401
+                    user = User.query.get(data['user_id'])
+                    if not user:
+                        return jsonify({'error': 'Invalid token user'}), 401
+                    principal = Principal(user.id, user.role, user.username, user.email)
+                    if scope is None:
+                        token_cache.put(token, principal, data['exp'])
+                except jwt.ExpiredSignatureError:
+                    return jsonify({'error': 'Token expired'}), 401
+                except Exception:
+                    return jsonify({'error': 'Invalid token'}), 401
+        request.current_user = principal
         return f(*args, **kwargs)
     return decorated
 
+def token_required(f):
+    return _authenticated(f, _bearer_token)
+
+def stream_token_required(f):
+    """token_required for EventSource streams, which cannot send headers:
+    also accepts a stream token (generate_stream_token) as ?stream_token=.
+    API tokens are never read from the query string."""
+    from_header = token_required(f)
+    from_query = _authenticated(f, lambda: request.args.get('stream_token'), scope=STREAM_SCOPE)
+
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if 'stream_token' in request.args:
+            return from_query(*args, **kwargs)
+        return from_header(*args, **kwargs)
+    return decorated
+
 def admin_required(f):
     @wraps(f)
     @token_required
@@ -0,0 +1,67 @@
+from flask import current_app
+from sqlalchemy import func, update
+from extensions import db, cache
+from models import ParkingLot, ParkingSpot
+from utils.http_cache import bump_lot_versions
+
+AVAILABLE_LOTS_KEY = 'user_available_lots'
+
+
+def lot_availability():
+    """Occupancy of every lot as a list of dicts, read from the
+    ParkingLot.occupied_count counters and served from the shared cache until a
+    park, unpark or lot change invalidates it."""
+    lots = cache.get(AVAILABLE_LOTS_KEY)
+    if lots is not None:
+        return lots
+
+    rows = db.session.query(
+        ParkingLot.id,
+        ParkingLot.name,
+        ParkingLot.location,
+        ParkingLot.capacity,
+        ParkingLot.rate_per_hour,
+        ParkingLot.occupied_count
+    ).order_by(ParkingLot.id).all()
+
+    lots = [{
+        'id': r.id,
+        'name': r.name,
+        'location': r.location,
+        'capacity': r.capacity,
+        'rate': r.rate_per_hour,
+        'occupied': r.occupied_count,
+        'available': r.capacity - r.occupied_count
+    } for r in rows]
+    cache.set(AVAILABLE_LOTS_KEY, lots, timeout=current_app.config.get('AVAILABILITY_CACHE_TIMEOUT', 30))
+    return lots
+
+
+def availability_by_lot():
+    return {lot['id']: lot for lot in lot_availability()}
+
+
+def invalidate_availability():
+    cache.delete(AVAILABLE_LOTS_KEY)
+
+
+def reconcile_occupancy(repair=True):
+    """Compares ParkingLot.occupied_count with the occupied rows in the spot
+    table and, when repair is set, overwrites drifted counters.
+
+    Returns a list of (lot_id, stored, actual) for every lot that drifted."""
+    actual = dict(db.session.query(ParkingSpot.lot_id, func.count(ParkingSpot.id))
+                  .filter(ParkingSpot.is_occupied == True)
+                  .group_by(ParkingSpot.lot_id).all())
+    drift = []
+    for lot_id, stored in db.session.query(ParkingLot.id, ParkingLot.occupied_count).all():
+        count = actual.get(lot_id, 0)
+        if stored != count:
+            drift.append((lot_id, stored, count))
+
+    if repair and drift:
+        db.session.execute(update(ParkingLot), [{'id': lot_id, 'occupied_count': count} for lot_id, _, count in drift])
+        bump_lot_versions([lot_id for lot_id, _, _ in drift])
+        db.session.commit()
+        invalidate_availability()
+    return drift
@@ -0,0 +1,210 @@
+"""Many entries or exits in one transaction, for gate controllers.
+
+Every item is validated against data loaded up front (one query per kind,
+not per item), so an item that fails never writes anything and the rest of
+the batch still goes through. Each function returns one result dict per
+item, in request order, plus what the caller needs once it has committed.
+"""
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import or_
+from extensions import db
+from models import User, ParkingLot, ParkingSpot, ParkingSession
+from utils.spot_allocator import spot_allocator, claim_spots, free_spots
+from utils.billing import tariffs_for_lots
+from utils.rollups import record_completed_sessions
+from utils.occupancy_series import record_completed_occupancy
+from utils.http_cache import bump_sessions_versions
+from utils.holds import live_holds, claim_hold
+
+# Enough of a spot to release it and announce it after the commit without
+# reloading expired ORM rows.
+SpotRef = namedtuple('SpotRef', ['id', 'lot_id', 'spot_number'])
+
+
+def _error(index, message):
+    return {'index': index, 'ok': False, 'error': message}
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def park_batch(items):
+    """Parks items of {user_id, lot_id, vehicle_number}. A user holding a spot
+    parks in it, as park_vehicle does, and cannot park in another lot.
+    Returns (results, spots, released) where spots are the SpotRefs claimed
+    and released those of holds found expired, for holds.announce_released
+    after the commit; on an exception every claimed spot has already been
+    handed back to the allocator."""
+    results = [None] * len(items)
+    entries = []
+    for index, item in enumerate(items):
+        user_id, lot_id = _int(item.get('user_id')), _int(item.get('lot_id'))
+        vehicle_number = item.get('vehicle_number')
+        if user_id is None or lot_id is None or not vehicle_number:
+            results[index] = _error(index, 'user_id, lot_id and vehicle_number required')
+        else:
+            entries.append((index, user_id, lot_id, vehicle_number))
+
+    user_ids = {e[1] for e in entries}
+    lot_ids = {e[2] for e in entries}
+    known_users = {r.id for r in db.session.query(User.id).filter(User.id.in_(user_ids))} if user_ids else set()
+    known_lots = {r.id for r in db.session.query(ParkingLot.id).filter(ParkingLot.id.in_(lot_ids))} if lot_ids else set()
+    parked = {r.user_id for r in db.session.query(ParkingSession.user_id)
+              .filter(ParkingSession.user_id.in_(user_ids), ParkingSession.status == 'ACTIVE')} if user_ids else set()
+    released = []
+    held = live_holds(user_ids, released=released) if user_ids else {}
+
+    by_lot, from_holds = {}, []
+    for index, user_id, lot_id, vehicle_number in entries:
+        if user_id not in known_users:
+            results[index] = _error(index, 'Unknown user')
+        elif lot_id not in known_lots:
+            results[index] = _error(index, 'Unknown parking lot')
+        elif user_id in parked:
+            results[index] = _error(index, 'User already has a vehicle parked')
+        elif user_id in held and held[user_id].lot_id != lot_id:
+            results[index] = _error(index, 'User holds a spot in another lot')
+        elif user_id in held:
+            parked.add(user_id)
+            from_holds.append((index, user_id, vehicle_number, held[user_id]))
+        else:
+            parked.add(user_id)
+            by_lot.setdefault(lot_id, []).append((index, user_id, vehicle_number))
+
+    claimed = []
+    try:
+        now = datetime.utcnow()
+        placed = []
+        for lot_id, lot_entries in by_lot.items():
+            spots = claim_spots(lot_id, len(lot_entries))
+            claimed.extend(SpotRef(s.id, s.lot_id, s.spot_number) for s in spots)
+            for (index, user_id, vehicle_number), spot in zip(lot_entries, spots):
+                session = ParkingSession(user_id=user_id, lot_id=lot_id, spot_id=spot.id,
+                                         vehicle_number=vehicle_number, entry_time=now, status='ACTIVE')
+                db.session.add(session)
+                placed.append((index, session, spot))
+            for index, _, _ in lot_entries[len(spots):]:
+                results[index] = _error(index, 'Parking Lot is full')
+
+        if from_holds:
+            # Loads the held spots in one query; hold.spot then comes from the session.
+            ParkingSpot.query.filter(ParkingSpot.id.in_([hold.spot_id for *_, hold in from_holds])).all()
+        held_sessions = []
+        for index, user_id, vehicle_number, hold in from_holds:
+            session = ParkingSession(user_id=user_id, lot_id=hold.lot_id, spot_id=hold.spot_id,
+                                     vehicle_number=vehicle_number, entry_time=now, status='ACTIVE')
+            db.session.add(session)
+            held_sessions.append((index, session, hold))
+
+        db.session.flush()
+        for index, session, hold in held_sessions:
+            if claim_hold(hold, session):
+                placed.append((index, session, hold.spot))
+            else:
+                # Expired by the sweep since it was loaded.
+                db.session.delete(session)
+                results[index] = _error(index, 'Hold has expired')
+        bump_sessions_versions({session.user_id for _, session, _ in placed})
+        for index, session, spot in placed:
+            spot.current_session_id = session.id
+            results[index] = {
+                'index': index,
+                'ok': True,
+                'session_id': session.id,
+                'lot_id': session.lot_id,
+                'spot_number': spot.spot_number,
+                'vehicle': session.vehicle_number
+            }
+    except Exception:
+        for spot in claimed:
+            spot_allocator.release(spot.lot_id, spot.id)
+        raise
+    return results, claimed, released
+
+
+def unpark_batch(items):
+    """Completes the active sessions named by items of {session_id} or
+    {vehicle_number}. Returns (results, spots) where spots are the SpotRefs
+    freed, to release once committed."""
+    results = [None] * len(items)
+    session_ids, vehicles = set(), set()
+    for index, item in enumerate(items):
+        if item.get('session_id') is not None and _int(item.get('session_id')) is not None:
+            session_ids.add(_int(item.get('session_id')))
+        elif item.get('vehicle_number'):
+            vehicles.add(item['vehicle_number'])
+        else:
+            results[index] = _error(index, 'session_id or vehicle_number required')
+
+    active = []
+    if session_ids or vehicles:
+        active = ParkingSession.query.filter(
+            ParkingSession.status == 'ACTIVE',
+            or_(ParkingSession.id.in_(session_ids), ParkingSession.vehicle_number.in_(vehicles))
+        ).all()
+    by_id = {session.id: session for session in active}
+    by_vehicle = {}
+    for session in active:
+        by_vehicle.setdefault(session.vehicle_number, []).append(session)
+    spots = {s.id: s for s in ParkingSpot.query.filter(ParkingSpot.id.in_([s.spot_id for s in active]))} if active else {}
+
+    matched = []
+    seen = set()
+    for index, item in enumerate(items):
+        if results[index] is not None:
+            continue
+        session_id = _int(item.get('session_id'))
+        if session_id is not None:
+            match = by_id.get(session_id)
+        else:
+            matches = by_vehicle.get(item['vehicle_number'], [])
+            if len(matches) > 1:
+                results[index] = _error(index, 'Vehicle has several active sessions; use session_id')
+                continue
+            match = matches[0] if matches else None
+        if match is None:
+            results[index] = _error(index, 'No active parking session found')
+            continue
+        if match.id in seen:
+            results[index] = _error(index, 'Session listed more than once')
+            continue
+        seen.add(match.id)
+        matched.append((index, match))
+
+    # Price each lot's exits together.
+    now = datetime.utcnow()
+    tariffs = tariffs_for_lots(session.lot_id for _, session in matched) if matched else {}
+    by_lot = {}
+    for index, session in matched:
+        by_lot.setdefault(session.lot_id, []).append((index, session))
+    completed, freed = [], []
+    for lot_id, lot_matches in by_lot.items():
+        entries = [session.entry_time for _, session in lot_matches]
+        amounts = tariffs[lot_id].price(entries, [now] * len(entries))
+        for (index, session), amount in zip(lot_matches, amounts.tolist()):
+            session.exit_time = now
+            session.amount_paid = amount
+            session.status = 'COMPLETED'
+            spot = spots[session.spot_id]
+            completed.append(session)
+            freed.append(spot)
+            results[index] = {
+                'index': index,
+                'ok': True,
+                'session_id': session.id,
+                'vehicle': session.vehicle_number,
+                'duration_hours': round((now - session.entry_time).total_seconds() / 3600, 2),
+                'amount_paid': amount,
+                'spot_released': spot.spot_number
+            }
+
+    free_spots(freed)
+    record_completed_sessions(completed)
+    record_completed_occupancy(completed)
+    bump_sessions_versions({session.user_id for session in completed})
+    return results, [SpotRef(s.id, s.lot_id, s.spot_number) for s in freed]
@@ -0,0 +1,194 @@
+"""Session pricing.
+
+A lot without a TariffPlan is billed at its flat rate_per_hour for the
+session's hours to two decimals, at least one hour. A tariff plan adds:
+
+- bands: {'start', 'end', 'rate'} in hours of the day, each overriding the
+  lot's rate_per_hour for [start, end);
+- grace_minutes: sessions no longer than this are free;
+- minimum_hours: the least that is billed (replacing the one hour);
+- daily_cap: the most charged for any one calendar day.
+
+Bands and days use the naive UTC timestamps stored on sessions. Prices are
+computed on NumPy arrays, so one session at unpark and millions when
+re-pricing history go through the same code.
+"""
+from datetime import datetime
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import selectinload
+from extensions import db
+from models import ParkingLot, ParkingSession
+from utils.rollups import rebuild_rollups
+from utils.http_cache import bump_sessions_versions
+
+HOURS_PER_DAY = 24.0
+REPRICE_BATCH_SIZE = 100000
+
+
+class TariffError(ValueError):
+    pass
+
+
+def validate_bands(bands):
+    """Returns bands as a sorted list of {'start', 'end', 'rate'} floats, or
+    raises TariffError."""
+    if not isinstance(bands, list):
+        raise TariffError('bands must be a list')
+    clean = []
+    for band in bands:
+        try:
+            start, end, rate = float(band['start']), float(band['end']), float(band['rate'])
+        except (KeyError, TypeError, ValueError):
+            raise TariffError('each band needs numeric start, end and rate')
+        if not 0 <= start < end <= HOURS_PER_DAY or rate < 0:
+            raise TariffError('bands need 0 <= start < end <= 24 and a non-negative rate')
+        clean.append({'start': start, 'end': end, 'rate': rate})
+    clean.sort(key=lambda b: b['start'])
+    for previous, band in zip(clean, clean[1:]):
+        if band['start'] < previous['end']:
+            raise TariffError('bands must not overlap')
+    return clean
+
+
+class Tariff:
+    def __init__(self, base_rate, bands=(), grace_minutes=0, minimum_hours=1.0, daily_cap=None):
+        self.base_rate = float(base_rate or 0.0)
+        self.bands = validate_bands(list(bands))
+        self.grace_minutes = grace_minutes or 0
+        self.minimum_hours = minimum_hours if minimum_hours is not None else 1.0
+        self.daily_cap = daily_cap
+
+        # Cumulative charge from midnight at each rate change; np.interp
+        # between them gives the charge up to any time of day.
+        knots, rates = [0.0], []
+        for band in self.bands:
+            if band['start'] > knots[-1]:
+                rates.append(self.base_rate)
+                knots.append(band['start'])
+            rates.append(band['rate'])
+            knots.append(band['end'])
+        if knots[-1] < HOURS_PER_DAY:
+            rates.append(self.base_rate)
+            knots.append(HOURS_PER_DAY)
+        self._knots = np.array(knots)
+        self._cumulative = np.concatenate(([0.0], np.cumsum(np.diff(self._knots) * rates)))
+        self.day_total = self._cumulative[-1]
+
+    @classmethod
+    def for_lot(cls, lot):
+        plan = lot.tariff
+        if plan is None:
+            return cls(lot.rate_per_hour)
+        return cls(lot.rate_per_hour, plan.bands or (), plan.grace_minutes, plan.minimum_hours, plan.daily_cap)
+
+    def _charge_to(self, hours):
+        # Charge from the epoch to `hours` (hours since the epoch).
+        days = np.floor(hours / HOURS_PER_DAY)
+        return days * self.day_total + np.interp(hours - days * HOURS_PER_DAY, self._knots, self._cumulative)
+
+    def price(self, entry_times, exit_times):
+        """Amounts for arrays of entry and exit times (datetime64 or datetime)."""
+        entry_us = _microseconds(entry_times)
+        # Same arithmetic as timedelta.total_seconds() / 3600, so one session
+        # prices exactly like the original inline formula.
+        duration = (_microseconds(exit_times) - entry_us) / 1e6 / 3600
+        entry = entry_us / 3.6e9
+        billable = np.maximum(round2(duration), self.minimum_hours)
+
+        if not self.bands and self.daily_cap is None:
+            amount = billable * self.base_rate
+        else:
+            end = entry + billable
+            if self.daily_cap is None:
+                amount = self._charge_to(end) - self._charge_to(entry)
+            else:
+                cap = self.daily_cap
+                first_day = np.floor(entry / HOURS_PER_DAY)
+                last_day = np.floor(end / HOURS_PER_DAY)
+                first_midnight = (first_day + 1) * HOURS_PER_DAY
+                first = np.minimum(cap, self._charge_to(np.minimum(end, first_midnight)) - self._charge_to(entry))
+                last = np.where(last_day > first_day,
+                                np.minimum(cap, self._charge_to(end) - self._charge_to(last_day * HOURS_PER_DAY)), 0.0)
+                middle = np.maximum(last_day - first_day - 1, 0) * min(cap, self.day_total)
+                amount = first + middle + last
+
+        if self.grace_minutes:
+            amount = np.where(duration * 60 <= self.grace_minutes, 0.0, amount)
+        return round2(amount)
+
+
+def _microseconds(times):
+    return np.asarray(times, dtype='datetime64[us]').astype(np.int64)
+
+
+def round2(values):
+    """np.round(values, 2), except that values within float error of a
+    half-hundredth go through Python's round() so results agree with it."""
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        rounded[near_tie] = [round(v, 2) for v in values[near_tie].tolist()]
+    return rounded
+
+
+def parking_charge(entry_time, exit_time, tariff):
+    """(duration_hours, amount) of one session under `tariff`."""
+    duration_hours = (exit_time - entry_time).total_seconds() / 3600
+    return duration_hours, float(tariff.price([entry_time], [exit_time])[0])
+
+
+def tariffs_for_lots(lot_ids):
+    lots = ParkingLot.query.options(selectinload(ParkingLot.tariff)).filter(ParkingLot.id.in_(set(lot_ids)))
+    return {lot.id: Tariff.for_lot(lot) for lot in lots}
+
+
+def reprice_sessions(lot_id=None, since=None, tariff=None, apply=True, batch_size=REPRICE_BATCH_SIZE):
+    """Prices completed sessions (of one lot, entered on or after `since`)
+    under each lot's current tariff, or under `tariff` to evaluate a
+    candidate plan. With `apply` the changed amounts are written and the
+    revenue rollups from `since` on are rebuilt.
+
+    Returns {'sessions', 'changed', 'old_revenue', 'new_revenue'}."""
+    lots = ParkingLot.query.options(selectinload(ParkingLot.tariff))
+    if lot_id is not None:
+        lots = lots.filter(ParkingLot.id == lot_id)
+    summary = {'sessions': 0, 'changed': 0, 'old_revenue': 0.0, 'new_revenue': 0.0}
+    for lot in lots.all():
+        lot_tariff = tariff or Tariff.for_lot(lot)
+        filters = [ParkingSession.lot_id == lot.id, ParkingSession.status == 'COMPLETED',
+                   ParkingSession.exit_time.isnot(None)]
+        if since is not None:
+            filters.append(ParkingSession.entry_time >= datetime.combine(since, datetime.min.time()))
+        last_id = 0
+        while True:
+            rows = db.session.query(ParkingSession.id, ParkingSession.user_id, ParkingSession.entry_time,
+                                    ParkingSession.exit_time, ParkingSession.amount_paid)\
+                .filter(*filters, ParkingSession.id > last_id)\
+                .order_by(ParkingSession.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            ids = np.fromiter((r.id for r in rows), dtype=np.int64, count=len(rows))
+            old = np.fromiter((r.amount_paid or 0.0 for r in rows), dtype=np.float64, count=len(rows))
+            new = lot_tariff.price([r.entry_time for r in rows], [r.exit_time for r in rows])
+            changed = np.flatnonzero(np.abs(new - old) >= 0.005)
+
+            summary['sessions'] += len(rows)
+            summary['changed'] += len(changed)
+            summary['old_revenue'] += float(old.sum())
+            summary['new_revenue'] += float(new.sum())
+            if apply and len(changed):
+                db.session.execute(update(ParkingSession), [
+                    {'id': int(ids[i]), 'amount_paid': float(new[i])} for i in changed
+                ])
+                bump_sessions_versions({rows[i].user_id for i in changed})
+                db.session.commit()
+    if apply and summary['changed']:
+        # Also bumps the versions of the lots whose revenue changed.
+        rebuild_rollups(since)
+    summary['old_revenue'] = round(summary['old_revenue'], 2)
+    summary['new_revenue'] = round(summary['new_revenue'], 2)
+    return summary
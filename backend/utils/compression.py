@@ -0,0 +1,88 @@
+"""Compresses API responses for clients that accept it.
+
+JSON and NDJSON responses of at least COMPRESS_MIN_SIZE bytes are sent
+brotli-encoded when the client accepts br and the brotli package is
+installed, otherwise gzip-encoded when it accepts gzip. Streamed NDJSON
+(the history stream) is compressed chunk by chunk as it is produced, and
+each chunk is flushed to the client whole rather than held back until the
+compressor fills a block; streams should yield a batch of lines per chunk.
+Event streams and file downloads are left alone: SSE frames must reach the
+client as they are written, and files are sent as they are stored.
+
+Both codecs run at moderate settings (COMPRESS_GZIP_LEVEL 5 and
+COMPRESS_BROTLI_QUALITY 4, of 9 and 11): API bodies are compressed on every
+response, and the last few percent of ratio cost several times the CPU.
+"""
+import zlib
+from flask import current_app, request
+from utils.metrics import timed_section
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is in requirements.txt
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson')
+
+
+def _encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compressor(encoding, config):
+    """(compress, sync, finish) callables of a streaming compressor: sync
+    returns everything compressed so far, finish ends the stream."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config.get('COMPRESS_BROTLI_QUALITY', 4))
+        return compressor.process, compressor.flush, compressor.finish
+    # wbits 31: a gzip header and trailer around the deflate stream.
+    compressor = zlib.compressobj(config.get('COMPRESS_GZIP_LEVEL', 5), zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _compressed_stream(chunks, compress, sync, finish):
+    try:
+        for chunk in chunks:
+            data = compress(chunk.encode() if isinstance(chunk, str) else chunk) + sync()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        # Closing the original iterable ends stream_with_context's request context.
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response):
+    config = current_app.config
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    encoding = _encoding()
+    if encoding is None:
+        return response
+    compress, sync, finish = _compressor(encoding, config)
+
+    if response.is_streamed:
+        response.response = _compressed_stream(response.response, compress, sync, finish)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config.get('COMPRESS_MIN_SIZE', 1024):
+            return response
+        with timed_section('compress'):
+            response.set_data(compress(data) + finish())
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_compression(app):
+    if app.config.get('COMPRESS_ENABLED', True):
+        app.after_request(compress_response)
@@ -0,0 +1,131 @@
+"""Database performance profile.
+
+engine_options() sizes the connection pool for the configured backend and
+init_db_tuning() applies the SQLite side of the profile to every new
+connection: SQLITE_PRAGMAS (WAL, so readers never wait for the writer,
+busy_timeout and synchronous) and, with SQLITE_IMMEDIATE_WRITES, BEGIN
+IMMEDIATE for transactions of write requests.
+
+SQLite ignores SELECT ... FOR UPDATE, and a deferred transaction that reads
+before it writes cannot wait for the write lock: if another connection
+committed in between, SQLite fails it at once with "database is locked"
+whatever busy_timeout says. BEGIN IMMEDIATE takes the lock up front, where
+busy_timeout applies, so concurrent parks queue instead of failing. Within
+a process they queue on a lock first: SQLite's busy handler retries by
+sleeping, and with dozens of threads polling at once some starve past
+busy_timeout. GET requests and Celery tasks keep deferred transactions; a
+task that streams rows for minutes must not hold the write lock meanwhile.
+
+The lock is held from a write request's first query to its commit, so write
+views do slow work (password hashing) before their first query or after
+ending the transaction; see routes/auth_routes.py. Once a write request has
+committed, any transaction it starts afterwards (reading back expired
+attributes for the response, say) begins deferred and takes no lock, so
+work after the commit never blocks the process's other writers; views
+therefore make their writes before their commit, and build what they
+publish after it (utils.occupancy_events) inside the transaction too.
+"""
+import sqlite3
+import threading
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.engine import make_url
+from extensions import db
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for config's database URI."""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            # One connection per thread; there is no pool to size.
+            return {}
+        # File connections are cheap and never go stale: no pre-ping or recycle.
+        return {
+            'pool_size': config.get('DB_POOL_SIZE', 8),
+            'max_overflow': config.get('DB_MAX_OVERFLOW', 4),
+            'pool_timeout': config.get('DB_POOL_TIMEOUT', 10),
+        }
+    return {
+        'pool_size': config.get('DB_POOL_SIZE', 8),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 4),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': config.get('DB_POOL_PRE_PING', True),
+    }
+
+
+def configure_engine_options(app):
+    """Fills in SQLALCHEMY_ENGINE_OPTIONS unless the config sets them; call
+    before db.init_app."""
+    if not app.config.get('SQLALCHEMY_ENGINE_OPTIONS'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+
+
+def _write_request():
+    return has_request_context() and request.method in WRITE_METHODS
+
+
+def _writes_pending():
+    """Whether a transaction begun now may be one of the request's writes:
+    it is a write request that has not committed yet."""
+    return _write_request() and not getattr(request, 'write_committed', False)
+
+
+def init_db_tuning(app):
+    """Installs the SQLite connection hooks on app's engine; call after
+    db.init_app. A no-op on other backends."""
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = dict(app.config.get('SQLITE_PRAGMAS') or {})
+    immediate = app.config.get('SQLITE_IMMEDIATE_WRITES', False)
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+        if immediate:
+            # Let the begin hook below issue BEGIN instead of pysqlite.
+            dbapi_connection.isolation_level = None
+
+    if immediate:
+        write_lock = threading.Lock()
+        holder = threading.local()
+        lock_timeout = pragmas.get('busy_timeout', 5000) / 1000
+
+        @event.listens_for(engine, 'begin')
+        def _on_begin(conn):
+            # A second connection opened by a thread that already holds the
+            # lock would wait for itself, so it only gets to read.
+            if not _writes_pending() or getattr(holder, 'conn', None) is not None:
+                conn.exec_driver_sql('BEGIN')
+                return
+            if not write_lock.acquire(timeout=lock_timeout):
+                raise OperationalError('BEGIN IMMEDIATE', None, sqlite3.OperationalError('database is locked'))
+            holder.conn = conn
+            try:
+                conn.exec_driver_sql('BEGIN IMMEDIATE')
+            except Exception:
+                _on_end(conn)
+                raise
+
+        def _on_end(conn):
+            if getattr(holder, 'conn', None) is conn:
+                holder.conn = None
+                write_lock.release()
+                return True
+            return False
+
+        def _on_commit(conn):
+            if _on_end(conn) and has_request_context():
+                request.write_committed = True
+
+        event.listen(engine, 'commit', _on_commit)
+        event.listen(engine, 'rollback', _on_end)
@@ -0,0 +1,125 @@
+"""CSV export job lifecycle: reuse, status caching and retention.
+
+A trigger reuses the user's latest job when it is still in flight, or
+finished within EXPORT_REUSE_MAX_AGE, and was queued for the same history
+fingerprint: the count, newest id, completed count and total charged of the
+user's sessions, their sessions_version and the names of their lots (see
+utils.http_cache.sessions_version). Parking, unparking, re-pricing (even
+when it only moves amounts between sessions) and renaming one of the
+user's lots all change it, so a reused file never differs from what a
+fresh export would contain.
+
+Job status is cached per job: briefly while it runs (a worker finishing in
+another process with a non-shared cache is picked up within
+EXPORT_PENDING_STATUS_CACHE_TIMEOUT), longer once it has finished. The
+worker and the sweeper also delete the key when they change a job.
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, delete, func, update
+from extensions import db, cache
+from models import ExportJob, ParkingSession
+from utils.http_cache import sessions_version
+
+EXPORT_STATUS_KEY = 'export_status:{}'
+IN_FLIGHT_STATUSES = ('PENDING', 'STARTED')
+PURGE_BATCH_SIZE = 500
+
+
+def history_fingerprint(user_id):
+    row = db.session.query(
+        func.count(ParkingSession.id),
+        func.max(ParkingSession.id),
+        func.sum(case((ParkingSession.status == 'COMPLETED', 1), else_=0)),
+        func.sum(ParkingSession.amount_paid)
+    ).filter(ParkingSession.user_id == user_id).one()
+    count, last_id, completed, charged = row
+    version, lots = sessions_version(user_id) or (0, [])
+    names = hashlib.blake2b(repr(lots).encode(), digest_size=6).hexdigest()
+    return f'{count}:{last_id or 0}:{completed or 0}:{charged or 0:.2f}:{version}:{names}'
+
+
+def reusable_export(user_id, fingerprint):
+    """The user's latest ExportJob if it can stand in for a new one, else None."""
+    job = ExportJob.query.filter_by(user_id=user_id)\
+        .order_by(ExportJob.created_at.desc(), ExportJob.id.desc()).first()
+    if job is None or job.history_fingerprint != fingerprint:
+        return None
+    config = current_app.config
+    age = datetime.utcnow() - job.created_at
+    if job.status in IN_FLIGHT_STATUSES:
+        return job if age <= timedelta(seconds=config.get('EXPORT_STALE_AFTER', 30 * 60)) else None
+    if job.status == 'SUCCESS' and job.file_path and os.path.exists(job.file_path):
+        fresh = datetime.utcnow() - (job.completed_at or job.created_at)
+        return job if fresh <= timedelta(seconds=config.get('EXPORT_REUSE_MAX_AGE', 24 * 3600)) else None
+    return None
+
+
+def export_status(job_id, user_id):
+    """{'status', 'file_path'} of the user's job, or None if it is not theirs."""
+    key = EXPORT_STATUS_KEY.format(job_id)
+    status = cache.get(key)
+    if status is None:
+        job = db.session.query(ExportJob.user_id, ExportJob.status, ExportJob.file_path)\
+            .filter(ExportJob.id == job_id).first()
+        if job is None:
+            return None
+        status = {'user_id': job.user_id, 'status': job.status, 'file_path': job.file_path}
+        config = current_app.config
+        timeout = config.get('EXPORT_PENDING_STATUS_CACHE_TIMEOUT', 2) if job.status in IN_FLIGHT_STATUSES \
+            else config.get('EXPORT_STATUS_CACHE_TIMEOUT', 300)
+        cache.set(key, status, timeout=timeout)
+    if status['user_id'] != user_id:
+        return None
+    return status
+
+
+def invalidate_export_status(*job_ids):
+    if job_ids:
+        cache.delete_many(*(EXPORT_STATUS_KEY.format(job_id) for job_id in job_ids))
+
+
+def fail_stale_exports(now=None):
+    """Marks jobs in flight for longer than EXPORT_STALE_AFTER (their worker
+    died or the broker lost them) as FAILURE. Returns how many."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=current_app.config.get('EXPORT_STALE_AFTER', 30 * 60))
+    ids = [r.id for r in db.session.query(ExportJob.id).filter(
+        ExportJob.created_at < cutoff, ExportJob.status.in_(IN_FLIGHT_STATUSES))]
+    if ids:
+        db.session.execute(update(ExportJob).where(ExportJob.id.in_(ids)).values(status='FAILURE'))
+        db.session.commit()
+        invalidate_export_status(*ids)
+    return len(ids)
+
+
+def delete_expired_exports(now=None, batch_size=PURGE_BATCH_SIZE):
+    """Deletes export jobs created more than EXPORT_RETENTION seconds ago and
+    their files. Returns (jobs, files) deleted."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=current_app.config.get('EXPORT_RETENTION', 8 * 24 * 3600))
+    jobs = files = 0
+    while True:
+        rows = db.session.query(ExportJob.id, ExportJob.file_path)\
+            .filter(ExportJob.created_at < cutoff).order_by(ExportJob.created_at).limit(batch_size).all()
+        if not rows:
+            return jobs, files
+        ids = [r.id for r in rows]
+        paths = {r.file_path for r in rows if r.file_path}
+        # Files written before job ids were part of the name can be shared
+        # with a newer job of the same user and day.
+        if paths:
+            paths -= {r.file_path for r in db.session.query(ExportJob.file_path).filter(
+                ExportJob.file_path.in_(paths), ExportJob.created_at >= cutoff)}
+        for path in paths:
+            try:
+                os.remove(path)
+                files += 1
+            except FileNotFoundError:
+                pass
+        db.session.execute(delete(ExportJob).where(ExportJob.id.in_(ids)))
+        db.session.commit()
+        invalidate_export_status(*ids)
+        jobs += len(ids)
@@ -0,0 +1,24 @@
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer
+
+_SALT = 'export-download'
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=_SALT)
+
+
+def export_download_token(job_id):
+    return _serializer().dumps(job_id)
+
+
+def load_export_download_token(token):
+    """Returns the ExportJob id signed into token. Raises
+    itsdangerous.BadSignature (or SignatureExpired) if it is forged or older
+    than EXPORT_LINK_MAX_AGE."""
+    return _serializer().loads(token, max_age=current_app.config.get('EXPORT_LINK_MAX_AGE', 7 * 24 * 3600))
+
+
+def export_download_url(job_id):
+    base = current_app.config.get('PUBLIC_BASE_URL', '').rstrip('/')
+    return f"{base}/api/user/export/download/{export_download_token(job_id)}"
@@ -0,0 +1,229 @@
+"""Spot holds: a user keeps a spot in a lot for a few minutes before parking.
+
+A held spot is claimed like a parked one (is_occupied, counted in
+occupied_count, off the allocator's free list) but has no current session,
+so nobody else can take it and lot availability already excludes it.
+park_vehicle turns the user's hold into a session on the same spot.
+
+Expiry never looks at ParkingSpot. Holds are read back in expiry order from
+the (status, expires_at) index, which acts as a delay queue:
+expire_due_holds pops the due head of it, so a sweep costs in proportion to
+the holds that expired, not to the holds or spots that exist. The
+expire_spot_holds task runs it every HOLD_SWEEP_SECONDS, and a hold found
+past its expiry anywhere else (parking, placing a new hold) is expired on
+the spot, so a late sweep never lets anyone use a hold after its time.
+"""
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, func, update
+from extensions import db
+from models import ParkingSession, ParkingSpot, SpotHold
+from utils.spot_allocator import spot_allocator, claim_spot, free_spots, bump_occupied
+from utils.availability import invalidate_availability
+from utils.occupancy_events import spot_change_events, publish_events
+from utils.http_cache import bump_lot_versions
+
+SpotRef = namedtuple('SpotRef', ['id', 'lot_id', 'spot_number'])
+
+
+class HoldError(ValueError):
+    pass
+
+
+def _hold_minutes(minutes):
+    config = current_app.config
+    if minutes is None:
+        return config.get('HOLD_DEFAULT_MINUTES', 10)
+    try:
+        minutes = int(minutes)
+    except (TypeError, ValueError):
+        raise HoldError('minutes must be a whole number')
+    limit = config.get('HOLD_MAX_MINUTES', 30)
+    if not 1 <= minutes <= limit:
+        raise HoldError(f'minutes must be between 1 and {limit}')
+    return minutes
+
+
+def current_hold(user_id):
+    return SpotHold.query.filter_by(user_id=user_id, status='HELD').first()
+
+
+def held_counts(lot_ids=None):
+    """{lot_id: spots held} over lot_ids (every lot when None). occupied_count
+    includes these spots, so occupied_count minus this is the parked count."""
+    query = db.session.query(SpotHold.lot_id, func.count()).filter(SpotHold.status == 'HELD')
+    if lot_ids is not None:
+        query = query.filter(SpotHold.lot_id.in_(set(lot_ids)))
+    return dict(query.group_by(SpotHold.lot_id).all())
+
+
+def _end(hold, status, now, **values):
+    # Conditional, so a hold expired by the sweep and cancelled or claimed by
+    # its user at the same moment ends exactly once.
+    return db.session.execute(
+        update(SpotHold)
+        .where(SpotHold.id == hold.id, SpotHold.status == 'HELD')
+        .values(status=status, released_at=now, **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+
+
+def _release(holds, status, now):
+    """Ends holds and frees their spots inside the current transaction.
+    Returns SpotRefs of the spots freed; the caller builds their events with
+    spot_change_events(spots, False), commits, then calls announce_released."""
+    ended = [hold for hold in holds if _end(hold, status, now)]
+    spots = [hold.spot for hold in ended]
+    free_spots(spots)
+    return [SpotRef(spot.id, spot.lot_id, spot.spot_number) for spot in spots]
+
+
+def announce_released(spots, events):
+    """Hands spots freed by a committed transaction back to the allocator and
+    publishes their events."""
+    for spot in spots:
+        spot_allocator.release(spot.lot_id, spot.id)
+    if spots:
+        invalidate_availability()
+        publish_events(events)
+
+
+def live_holds(user_ids, now=None, released=None):
+    """{user_id: hold} of the users' running holds. With `released`, holds
+    past their expiry are also expired in the current transaction rather
+    than left for the sweep, and SpotRefs of their spots appended to it for
+    the caller to announce after its commit; see _release."""
+    now = now or datetime.utcnow()
+    holds = SpotHold.query.filter(SpotHold.user_id.in_(set(user_ids)), SpotHold.status == 'HELD').all()
+    live = {hold.user_id: hold for hold in holds if hold.expires_at > now}
+    overdue = [hold for hold in holds if hold.expires_at <= now]
+    if overdue and released is not None:
+        released.extend(_release(overdue, 'EXPIRED', now))
+    return live
+
+
+def live_hold(user_id, now=None, released=None):
+    """The user's hold if it is still running; see live_holds."""
+    return live_holds([user_id], now, released).get(user_id)
+
+
+def place_hold(user, lot_id, minutes=None):
+    """Holds a free spot in lot_id for the user and commits. Raises HoldError
+    when the user is parked or already holds a spot, or the lot is full."""
+    minutes = _hold_minutes(minutes)
+    if ParkingSession.query.filter_by(user_id=user.id, status='ACTIVE').first():
+        raise HoldError('You already have a vehicle parked.')
+    released = []
+    if live_hold(user.id, released=released) is not None:
+        db.session.rollback()
+        raise HoldError('You already hold a spot. Park there or cancel the hold first.')
+
+    spot = claim_spot(lot_id)
+    if spot is None:
+        db.session.rollback()
+        raise HoldError('Parking Lot is full')
+    now = datetime.utcnow()
+    hold = SpotHold(user_id=user.id, lot_id=lot_id, spot_id=spot.id, status='HELD',
+                    created_at=now, expires_at=now + timedelta(minutes=minutes))
+    try:
+        db.session.add(hold)
+        freed_events = spot_change_events(released, False)
+        taken_events = spot_change_events([spot], True)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        spot_allocator.release(lot_id, spot.id)
+        raise
+    announce_released(released, freed_events)
+    publish_events(taken_events)
+    return hold
+
+
+def cancel_hold(user_id):
+    """Cancels the user's hold and commits. Returns whether there was one."""
+    released = []
+    hold = live_hold(user_id, released=released)
+    cancelled = _release([hold], 'CANCELLED', datetime.utcnow()) if hold is not None else []
+    released.extend(cancelled)
+    events = spot_change_events(released, False)
+    db.session.commit()
+    announce_released(released, events)
+    return bool(cancelled)
+
+
+def claim_hold(hold, session):
+    """Marks hold as used by session inside the current transaction; the
+    session takes over the held spot, which stays occupied. Returns False if
+    the hold ended in the meantime."""
+    if not _end(hold, 'CLAIMED', datetime.utcnow(), session_id=session.id):
+        return False
+    hold.spot.current_session_id = session.id
+    # The spot stays occupied, so bump_occupied does not mark the lot changed.
+    bump_lot_versions([hold.lot_id])
+    return True
+
+
+def _expire_batch(due, now):
+    """Expires due hold rows and frees their spots with one statement per
+    table and lot. Returns SpotRefs of the spots freed, or None when another
+    writer ended one of the holds first."""
+    ended = db.session.execute(
+        update(SpotHold)
+        .where(SpotHold.id.in_([row.id for row in due]), SpotHold.status == 'HELD')
+        .values(status='EXPIRED', released_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if ended != len(due):
+        return None
+    db.session.execute(
+        update(ParkingSpot)
+        .where(ParkingSpot.id.in_([row.spot_id for row in due]))
+        .values(is_occupied=False, current_session_id=None)
+        .execution_options(synchronize_session=False)
+    )
+    for lot_id, count in Counter(row.lot_id for row in due).items():
+        bump_occupied(lot_id, -count)
+    return [SpotRef(row.spot_id, row.lot_id, row.spot_number) for row in due]
+
+
+def expire_due_holds(now=None, batch_size=None):
+    """Expires every hold due by `now`, in expiry order and in committed
+    batches. Returns the number expired."""
+    now = now or datetime.utcnow()
+    batch_size = batch_size or current_app.config.get('HOLD_SWEEP_BATCH_SIZE', 500)
+    expired = 0
+    while True:
+        # Locked rows are skipped, so two sweeps never pop the same holds.
+        due = db.session.query(SpotHold.id, SpotHold.lot_id, SpotHold.spot_id, ParkingSpot.spot_number)\
+            .join(ParkingSpot, ParkingSpot.id == SpotHold.spot_id)\
+            .filter(SpotHold.status == 'HELD', SpotHold.expires_at <= now)\
+            .order_by(SpotHold.expires_at).limit(batch_size)\
+            .with_for_update(of=SpotHold, skip_locked=True).all()
+        if not due:
+            return expired
+        spots = _expire_batch(due, now)
+        if spots is None:
+            # Lost a race with a cancel or park; redo the batch hold by hold.
+            db.session.rollback()
+            holds = SpotHold.query.filter(SpotHold.id.in_([row.id for row in due])).all()
+            spots = _release(holds, 'EXPIRED', now)
+        events = spot_change_events(spots, False)
+        db.session.commit()
+        announce_released(spots, events)
+        expired += len(spots)
+        if len(due) < batch_size:
+            return expired
+
+
+def purge_finished_holds(now=None):
+    """Deletes holds that ended more than HOLD_RETENTION seconds ago."""
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=current_app.config.get('HOLD_RETENTION', 7 * 24 * 3600))
+    deleted = db.session.execute(
+        delete(SpotHold)
+        .where(SpotHold.status.in_(('CLAIMED', 'CANCELLED', 'EXPIRED')), SpotHold.expires_at < cutoff)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return deleted
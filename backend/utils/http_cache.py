@@ -0,0 +1,113 @@
+"""Conditional GET for the read endpoints, driven by version counters.
+
+ParkingLot.version changes with every change to a lot or its spots:
+bump_occupied bumps it on each park, unpark and hold, and lot edits call
+bump_lot_versions. User.sessions_version changes with every change to a
+user's sessions: parking, unparking, gate batches and re-pricing.
+Rebuilding the rollups bumps both for the lots and users it rewrites.
+History and summary also show the names of the user's lots, so their
+version includes those names and a rename needs no bump of every user. The
+lot lists use the cached availability snapshot they are built from as their
+version, which costs no query while it is cached.
+
+conditional_get reads a view's version before the view runs and derives a
+weak ETag from it, the request path and query and the caller. A request
+whose If-None-Match still matches is answered 304 without running the view
+or its queries. The version is read first, so a response is never tagged
+with a version newer than its data; at worst a client fetches once more.
+
+Responses are marked `private, no-cache`: browsers keep them but revalidate
+on every use, which is what turns a poll of unchanged data into a 304.
+"""
+import hashlib
+from functools import wraps
+from flask import current_app, make_response, request
+from sqlalchemy import func, select, union, update
+from extensions import db
+from models import ParkingLot, ParkingSession, User, UserDailyStat
+
+
+def bump_lot_versions(lot_ids=None):
+    """Marks lot_ids (every lot when None) changed, inside the current transaction."""
+    statement = update(ParkingLot).values(version=ParkingLot.version + 1)
+    if lot_ids is not None:
+        if not lot_ids:
+            return
+        statement = statement.where(ParkingLot.id.in_(set(lot_ids)))
+    db.session.execute(statement.execution_options(synchronize_session=False))
+
+
+def bump_sessions_versions(user_ids=None):
+    """Marks the sessions of user_ids (every user when None) changed, inside
+    the current transaction."""
+    statement = update(User).values(sessions_version=User.sessions_version + 1)
+    if user_ids is not None:
+        if not user_ids:
+            return
+        statement = statement.where(User.id.in_(set(user_ids)))
+    db.session.execute(statement.execution_options(synchronize_session=False))
+
+
+def lot_version(lot_id):
+    # created_at tells a lot apart from a deleted one whose id was reused.
+    row = db.session.query(ParkingLot.version, ParkingLot.created_at).filter(ParkingLot.id == lot_id).first()
+    return tuple(row) if row else None
+
+
+def sessions_version(user_id):
+    """Version of the user's history and summary: their sessions, and the
+    names of the lots those are in. Completed sessions' lots come from the
+    rollups, read through their (user_id, lot_id, day) index."""
+    version = db.session.query(User.sessions_version).filter(User.id == user_id).scalar()
+    if version is None:
+        return None
+    lot_ids = union(
+        select(UserDailyStat.lot_id).where(UserDailyStat.user_id == user_id),
+        select(ParkingSession.lot_id).where(ParkingSession.user_id == user_id, ParkingSession.status == 'ACTIVE')
+    )
+    names = db.session.query(ParkingLot.id, ParkingLot.name).filter(ParkingLot.id.in_(lot_ids))\
+        .order_by(ParkingLot.id).all()
+    return version, [tuple(name) for name in names]
+
+
+def lots_version():
+    """Version of everything the admin summary shows: every lot and the user count."""
+    lots = db.session.query(ParkingLot.id, ParkingLot.version, ParkingLot.created_at)\
+        .order_by(ParkingLot.id).all()
+    users = db.session.query(func.count(User.id)).filter(User.role == 'user').scalar()
+    return users, [tuple(lot) for lot in lots]
+
+
+def _etag(version):
+    principal = getattr(request, 'current_user', None)
+    key = repr((request.path, request.query_string, getattr(principal, 'id', None), version))
+    return hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+
+def _revalidate(response, etag):
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional_get(version_of):
+    """Answers GETs of the decorated view with 304 while version_of(**view_kwargs)
+    is unchanged. A None version disables it for that request."""
+    def decorator(view):
+        @wraps(view)
+        def decorated(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not current_app.config.get('ETAGS_ENABLED', True):
+                return view(*args, **kwargs)
+            version = version_of(**kwargs)
+            if version is None:
+                return view(*args, **kwargs)
+            etag = _etag(version)
+            if request.if_none_match.contains_weak(etag):
+                return _revalidate(current_app.response_class(status=304), etag)
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            return _revalidate(response, etag)
+        return decorated
+    return decorator
@@ -0,0 +1,106 @@
+import smtplib
+import time
+from itertools import islice
+from flask import current_app
+from flask_mail import Message
+from extensions import mail
+
+
+def is_permanent(error):
+    """Whether retrying on a fresh connection will not fix `error`: the
+    server answered 5xx (for every recipient, when it refused them). 4xx
+    replies and connection errors are transient."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def build_message(to_email, subject, body, is_html=False, attachment=None, filename=None, content_type='text/csv'):
+    msg = Message(subject, recipients=[to_email])
+    if is_html:
+        msg.html = body
+        msg.body = "View in HTML"
+    else:
+        msg.body = body
+    if attachment and filename:
+        data = attachment if isinstance(attachment, bytes) else attachment.encode('utf-8')
+        msg.attach(filename, content_type, data)
+    return msg
+
+
+class RateLimiter:
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second else 0
+        self._next = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+            now = self._next
+        self._next = now + self.interval
+
+
+def _open_connection():
+    conn = mail.connect()
+    conn.__enter__()
+    return conn
+
+
+def _close_connection(conn):
+    if conn is None:
+        return
+    try:
+        conn.__exit__(None, None, None)
+    except Exception:
+        pass
+
+
+def send_messages(messages):
+    """Delivers an iterable of flask_mail Messages, reusing one SMTP
+    connection for every MAIL_BATCH_SIZE messages.
+
+    Sending is throttled to MAIL_RATE_LIMIT messages per second (0 disables
+    it). A transient failure reconnects and retries the message up to
+    MAIL_MAX_RETRIES times with exponential backoff from MAIL_RETRY_BACKOFF
+    seconds; a permanent one (see is_permanent) fails it at once. Returns
+    (sent, failed)."""
+    config = current_app.config
+    batch_size = config.get('MAIL_BATCH_SIZE', 100)
+    retries = config.get('MAIL_MAX_RETRIES', 3)
+    backoff = config.get('MAIL_RETRY_BACKOFF', 0.5)
+    limiter = RateLimiter(config.get('MAIL_RATE_LIMIT', 0))
+
+    sent = failed = 0
+    messages = iter(messages)
+    while True:
+        batch = list(islice(messages, batch_size))
+        if not batch:
+            return sent, failed
+        conn = None
+        try:
+            for msg in batch:
+                for attempt in range(retries + 1):
+                    try:
+                        if conn is None:
+                            conn = _open_connection()
+                        limiter.wait()
+                        conn.send(msg)
+                        sent += 1
+                        break
+                    except (smtplib.SMTPException, OSError) as e:
+                        if is_permanent(e):
+                            print(f"Error: {msg.recipients}: {e}")
+                            failed += 1
+                            break
+                        _close_connection(conn)
+                        conn = None
+                        if attempt == retries:
+                            print(f"Error: {msg.recipients}: {e}")
+                            failed += 1
+                            break
+                        time.sleep(backoff * 2 ** attempt)
+        finally:
+            _close_connection(conn)
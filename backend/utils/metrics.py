@@ -0,0 +1,321 @@
+"""Opt-in request instrumentation (METRICS_ENABLED).
+
+Records, per endpoint: latency, SQL query count and SQL time (from
+SQLAlchemy cursor events), time spent authenticating and serializing JSON;
+hit/miss counts of the `cache` extension; and Celery task durations. They
+are served in the Prometheus text format on /metrics, and requests slower
+than SLOW_REQUEST_MS are logged with their most expensive SQL statements.
+
+Every process keeps its own counters. With METRICS_REDIS_URL reachable each
+process publishes a snapshot there every METRICS_FLUSH_INTERVAL seconds and
+/metrics sums the snapshots of all processes (gunicorn workers and Celery
+workers); otherwise /metrics reports the process that served the scrape.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import g, has_request_context, request, Response
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from extensions import cache
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is in requirements.txt
+    redis = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+TASK_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests by endpoint, method and status.', None),
+    'http_request_duration_seconds': ('histogram', 'Request latency.', LATENCY_BUCKETS),
+    'http_request_sql_queries': ('histogram', 'SQL statements executed per request.', QUERY_COUNT_BUCKETS),
+    'http_request_sql_duration_seconds': ('histogram', 'Time spent in SQL per request.', LATENCY_BUCKETS),
+    'http_request_section_duration_seconds': ('histogram', 'Time per request spent in auth or JSON serialization.',
+                                              LATENCY_BUCKETS),
+    'cache_requests_total': ('counter', 'Cache lookups by key and result.', None),
+    'celery_task_duration_seconds': ('histogram', 'Celery task run time.', TASK_BUCKETS),
+}
+
+MAX_RECORDED_STATEMENTS = 200
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+
+    def inc(self, name, labels, value=1.0):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] += value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        series = tuple(sorted(labels.items()))
+        with self._lock:
+            for bound in buckets:
+                if value <= bound:
+                    self._values[(name + '_bucket', series + (('le', str(bound)),))] += 1
+            self._values[(name + '_bucket', series + (('le', '+Inf'),))] += 1
+            self._values[(name + '_sum', series)] += value
+            self._values[(name + '_count', series)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return [[name, list(labels), value] for (name, labels), value in self._values.items()]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+def render(snapshots):
+    """Sums snapshots (all counters, so addition is valid across processes)
+    into the Prometheus text exposition format."""
+    totals = defaultdict(float)
+    for snapshot in snapshots:
+        for name, labels, value in snapshot:
+            totals[(name, tuple(tuple(pair) for pair in labels))] += value
+
+    by_metric = defaultdict(list)
+    for (name, labels), value in totals.items():
+        base = name
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name[:-len(suffix)] in METRICS:
+                base = name[:-len(suffix)]
+        by_metric[base].append((name, labels, value))
+
+    lines = []
+    for base in sorted(by_metric):
+        kind, help_text, _ = METRICS.get(base, ('untyped', '', None))
+        lines.append(f'# HELP {base} {help_text}')
+        lines.append(f'# TYPE {base} {kind}')
+        for name, labels, value in sorted(by_metric[base], key=_series_order):
+            label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f'{name}{{{label_text}}} {_format_value(value)}' if labels else f'{name} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _series_order(series):
+    name, labels, _ = series
+    plain = [pair for pair in labels if pair[0] != 'le']
+    le = [float(v) for k, v in labels if k == 'le']
+    return plain, name, le
+
+
+class Metrics:
+    def __init__(self):
+        self.registry = Registry()
+        self.enabled = False
+        self._redis = None
+        self._last_flush = 0.0
+        self.flush_interval = 5
+        self.prefix = 'parking:metrics:'
+        self.process_key = f'{self.prefix}{socket.gethostname()}:{os.getpid()}'
+
+    def configure(self, config):
+        self.enabled = True
+        self.flush_interval = config.get('METRICS_FLUSH_INTERVAL', self.flush_interval)
+        self.process_key = f'{self.prefix}{socket.gethostname()}:{os.getpid()}'
+        self._redis = None
+        url = config.get('METRICS_REDIS_URL')
+        if url and redis is not None:
+            try:
+                client = redis.Redis.from_url(url, socket_connect_timeout=1)
+                client.ping()
+                self._redis = client
+            except redis.RedisError as e:
+                print(f"Metrics: Redis unavailable ({e}), /metrics will report this process only")
+
+    def flush(self, force=False):
+        if self._redis is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+        try:
+            self._redis.set(self.process_key, json.dumps(self.registry.snapshot()),
+                            ex=max(60, int(self.flush_interval * 12)))
+        except redis.RedisError as e:
+            print(f"Metrics flush failed: {e}")
+
+    def collect(self):
+        local = self.registry.snapshot()
+        if self._redis is None:
+            return [local]
+        self.flush(force=True)
+        try:
+            keys = [k for k in self._redis.scan_iter(match=self.prefix + '*') if k.decode() != self.process_key]
+            others = [json.loads(v) for v in self._redis.mget(keys) if v] if keys else []
+        except redis.RedisError as e:
+            print(f"Metrics collection failed: {e}")
+            others = []
+        return [local] + others
+
+
+metrics = Metrics()
+
+
+@contextmanager
+def timed_section(name):
+    """Adds the time spent in the block to the current request's `name`
+    section (auth, json); a no-op when metrics are off or outside a request."""
+    if not metrics.enabled or not has_request_context() or '_metrics' not in g:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        sections = g._metrics['sections']
+        sections[name] = sections.get(name, 0.0) + time.perf_counter() - start
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        with timed_section('json'):
+            return super().dumps(obj, **kwargs)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    if not metrics.enabled or not has_request_context() or '_metrics' not in g:
+        return
+    state = g._metrics
+    state['sql_count'] += 1
+    state['sql_time'] += elapsed
+    if len(state['statements']) < MAX_RECORDED_STATEMENTS:
+        state['statements'].append((elapsed, statement))
+
+
+def _instrument_cache():
+    if getattr(cache.get, '_metrics_wrapped', False):
+        return
+    original = cache.get
+
+    def get(key, *args, **kwargs):
+        value = original(key, *args, **kwargs)
+        if metrics.enabled:
+            metrics.registry.inc('cache_requests_total', {'key': str(key).split(':', 1)[0],
+                                                          'result': 'miss' if value is None else 'hit'})
+        return value
+
+    get._metrics_wrapped = True
+    cache.get = get
+
+
+def _endpoint_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _log_slow_request(app, endpoint, elapsed, state):
+    worst = sorted(state['statements'], key=lambda s: s[0], reverse=True)[:app.config.get('SLOW_REQUEST_SQL_LIMIT', 5)]
+    parts = [f"{state['sql_count']} queries in {state['sql_time'] * 1000:.1f} ms"]
+    parts += [f'{k} {v * 1000:.1f} ms' for k, v in sorted(state['sections'].items())]
+    lines = [f"Slow request: {request.method} {request.full_path.rstrip('?')} ({endpoint}) {elapsed * 1000:.1f} ms: "
+             + ', '.join(parts)]
+    for duration, statement in worst:
+        lines.append(f"  {duration * 1000:8.1f} ms  {' '.join(statement.split())[:500]}")
+    app.logger.warning('\n'.join(lines))
+
+
+def init_metrics(app):
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    metrics.configure(app.config)
+    app.json = TimedJSONProvider(app)
+    _instrument_cache()
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    slow_threshold = app.config.get('SLOW_REQUEST_MS', 500) / 1000
+
+    @app.before_request
+    def _start_request_metrics():
+        g._metrics = {'start': time.perf_counter(), 'sql_count': 0, 'sql_time': 0.0,
+                      'statements': [], 'sections': {}, 'status': 500}
+
+    @app.after_request
+    def _record_status(response):
+        if '_metrics' in g:
+            g._metrics['status'] = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(exc):
+        state = g.pop('_metrics', None)
+        if state is None:
+            return
+        elapsed = time.perf_counter() - state['start']
+        endpoint = _endpoint_label()
+        registry = metrics.registry
+        registry.inc('http_requests_total', {'endpoint': endpoint, 'method': request.method,
+                                             'status': str(state['status'])})
+        registry.observe('http_request_duration_seconds', {'endpoint': endpoint, 'method': request.method}, elapsed)
+        registry.observe('http_request_sql_queries', {'endpoint': endpoint}, state['sql_count'])
+        registry.observe('http_request_sql_duration_seconds', {'endpoint': endpoint}, state['sql_time'])
+        for section, seconds in state['sections'].items():
+            registry.observe('http_request_section_duration_seconds', {'endpoint': endpoint, 'section': section}, seconds)
+        if elapsed >= slow_threshold:
+            _log_slow_request(app, endpoint, elapsed, state)
+        metrics.flush()
+
+    def metrics_view():
+        token = app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(render(metrics.collect()), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+
+_task_started_at = {}
+
+
+def _task_started(task_id=None, **kwargs):
+    _task_started_at[task_id] = time.perf_counter()
+
+
+def _task_finished(task_id=None, task=None, state=None, **kwargs):
+    start = _task_started_at.pop(task_id, None)
+    if start is None or not metrics.enabled:
+        return
+    metrics.registry.observe('celery_task_duration_seconds',
+                             {'task': task.name, 'state': state or 'UNKNOWN'}, time.perf_counter() - start)
+    metrics.flush()
+
+
+def init_task_metrics(config):
+    """Records Celery task durations in the process that runs them."""
+    if not config.get('METRICS_ENABLED'):
+        return
+    from celery.signals import task_prerun, task_postrun
+
+    metrics.configure(config)
+    task_prerun.connect(_task_started, weak=False, dispatch_uid='metrics_task_prerun')
+    task_postrun.connect(_task_finished, weak=False, dispatch_uid='metrics_task_postrun')
@@ -0,0 +1,196 @@
+"""Live occupancy push over Server-Sent Events.
+
+Park, unpark and lot changes publish a small event after they commit. Every
+open /api/events/occupancy stream holds one queue in its process and blocks
+on it, so idle screens cost no queries or CPU between events.
+
+With OCCUPANCY_EVENTS_REDIS_URL reachable, events go through one Redis
+pub/sub channel and a single listener thread per process fans them out to
+that process's queues, so every worker sees every event. Without Redis the
+broker fans out in-process and only streams served by the publishing
+process receive the event.
+"""
+import json
+import queue
+import threading
+import time
+from extensions import db
+from models import ParkingLot
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - redis is in requirements.txt
+    redis = None
+
+
+class Subscription:
+    def __init__(self, maxsize, lot_id=None):
+        self.queue = queue.Queue(maxsize)
+        self.lot_id = lot_id
+        # Set when the consumer fell behind and an event was dropped; the
+        # stream then tells the client to re-fetch instead of applying deltas.
+        self.lagged = False
+
+    def offer(self, lot_id, frame):
+        if self.lot_id is not None and lot_id is not None and lot_id != self.lot_id:
+            return
+        try:
+            self.queue.put_nowait(frame)
+        except queue.Full:
+            self.lagged = True
+
+
+class OccupancyBroker:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._listener = None
+        self.channel = 'parking:occupancy'
+        self.queue_size = 100
+        self.heartbeat = 15
+
+    def init_app(self, app):
+        self.channel = app.config.get('OCCUPANCY_EVENTS_CHANNEL', self.channel)
+        self.queue_size = app.config.get('OCCUPANCY_EVENTS_QUEUE_SIZE', self.queue_size)
+        self.heartbeat = app.config.get('OCCUPANCY_EVENTS_HEARTBEAT', self.heartbeat)
+        self._redis = None
+        url = app.config.get('OCCUPANCY_EVENTS_REDIS_URL')
+        if url and redis is not None:
+            try:
+                client = redis.Redis.from_url(url, socket_connect_timeout=1)
+                client.ping()
+                self._redis = client
+            except redis.RedisError as e:
+                app.logger.warning('Occupancy events: Redis unavailable (%s), using in-process fan-out', e)
+        app.extensions['occupancy_events'] = self
+
+    @property
+    def backend(self):
+        return 'redis' if self._redis is not None else 'local'
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def subscribe(self, lot_id=None):
+        sub = Subscription(self.queue_size, lot_id)
+        with self._lock:
+            self._subscribers.add(sub)
+        if self._redis is not None:
+            self._ensure_listener()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, kind, data):
+        message = json.dumps({'event': kind, 'data': data})
+        if self._redis is not None:
+            try:
+                self._redis.publish(self.channel, message)
+                return
+            except redis.RedisError as e:
+                print(f"Occupancy event publish failed, delivering locally: {e}")
+        self._deliver(message)
+
+    def _deliver(self, message):
+        if isinstance(message, bytes):
+            message = message.decode('utf-8')
+        event = json.loads(message)
+        frame = f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        lot_id = event['data'].get('lot_id')
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.offer(lot_id, frame)
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='occupancy-events', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self._deliver(message['data'])
+            except redis.RedisError as e:
+                print(f"Occupancy event listener lost Redis, reconnecting: {e}")
+                # Events published while disconnected are gone; make every
+                # stream re-fetch once the channel is back.
+                with self._lock:
+                    for sub in self._subscribers:
+                        sub.lagged = True
+                time.sleep(1)
+
+    def stream(self, sub):
+        """SSE frames for one subscription: events as they arrive, a comment
+        every `heartbeat` seconds so proxies keep the connection open and a
+        dropped client is noticed, and a `resync` event after lost events."""
+        try:
+            yield f"retry: 3000\nevent: ready\ndata: {json.dumps({'backend': self.backend})}\n\n"
+            while True:
+                try:
+                    frame = sub.queue.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    frame = ': keepalive\n\n'
+                if sub.lagged:
+                    sub.lagged = False
+                    while not sub.queue.empty():
+                        sub.queue.get_nowait()
+                    frame = 'event: resync\ndata: {}\n\n'
+                yield frame
+        finally:
+            self.unsubscribe(sub)
+
+
+occupancy_events = OccupancyBroker()
+
+
+def _lot_counts(lot_ids):
+    rows = db.session.query(ParkingLot.id, ParkingLot.capacity, ParkingLot.occupied_count)\
+        .filter(ParkingLot.id.in_(set(lot_ids))).all()
+    counts = {lot_id: {'lot_id': lot_id, 'deleted': True} for lot_id in lot_ids}
+    for row in rows:
+        counts[row.id] = {
+            'lot_id': row.id,
+            'capacity': row.capacity,
+            'occupied': row.occupied_count,
+            'available': row.capacity - row.occupied_count
+        }
+    return counts
+
+
+def spot_change_events(spots, is_occupied):
+    """The events announcing that `spots` were taken or freed, with their
+    lots' new counts read once per lot. Build them inside the transaction
+    that changed the spots and publish them after its commit, so publishing
+    reads nothing and never waits on the database. Spots only need id,
+    lot_id and spot_number."""
+    if not spots:
+        return []
+    counts = _lot_counts([spot.lot_id for spot in spots])
+    events = []
+    for spot in spots:
+        data = dict(counts[spot.lot_id])
+        data.update({'spot_id': spot.id, 'spot_number': spot.spot_number, 'is_occupied': is_occupied})
+        events.append(('spot', data))
+    return events
+
+
+def lot_change_event(lot_id):
+    """The event announcing a created, resized or deleted lot; see spot_change_events."""
+    return [('lot', _lot_counts([lot_id])[lot_id])]
+
+
+def publish_events(events):
+    """Publishes events from spot_change_events or lot_change_event. Call
+    after the commit so subscribers never see uncommitted state."""
+    for event_type, data in events:
+        occupancy_events.publish(event_type, data)
@@ -0,0 +1,219 @@
+"""Per-lot occupancy history in fixed 15 minute buckets.
+
+One LotOccupancyDay row holds a lot's day as a float32 array of occupied
+spot-seconds per bucket, so a year of one lot is 365 small rows instead of
+every session that touched it. Dividing a bucket by its length gives the
+average number of occupied spots during it.
+
+record_completed_occupancy adds sessions inside the transaction that
+completes them; sessions still parked are added at read time from the live
+rows, so today's curve is current. rebuild_occupancy recomputes the rows
+from the session table (backfill and drift repair).
+"""
+import math
+from datetime import datetime, timedelta, date
+import numpy as np
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+from models import ParkingLot, ParkingSession, LotOccupancyDay
+
+BUCKET_MINUTES = 15
+BUCKET_SECONDS = BUCKET_MINUTES * 60
+BUCKETS_PER_DAY = 24 * 60 // BUCKET_MINUTES
+DAY_SECONDS = 24 * 3600
+_DTYPE = np.dtype('<f4')
+_EPOCH = date(1970, 1, 1)
+
+# How quickly a forecast forgets that the lot is fuller or emptier than
+# usual right now.
+FORECAST_DECAY_HOURS = 3.0
+
+_UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _pack(values):
+    return np.asarray(values, dtype=_DTYPE).tobytes()
+
+
+def _unpack(blob):
+    return np.frombuffer(blob, dtype=_DTYPE).astype(np.float64)
+
+
+def _seconds(times):
+    return np.asarray(times, dtype='datetime64[us]').astype(np.int64) / 1e6
+
+
+def _day_start(day):
+    return float((day - _EPOCH).days * DAY_SECONDS)
+
+
+def occupied_seconds(starts, ends, origin, buckets):
+    """Occupied spot-seconds in each of `buckets` consecutive buckets from
+    `origin`, for sessions [starts[i], ends[i]) (all in epoch seconds)."""
+    if len(starts) == 0:
+        return np.zeros(buckets)
+    # Occupancy is a step function that rises at each start and falls at
+    # each end; integrate it once over the event times, then read the
+    # integral off at every bucket edge.
+    times = np.concatenate((starts, ends))
+    steps = np.concatenate((np.ones(len(starts)), -np.ones(len(ends))))
+    order = np.argsort(times, kind='stable')
+    times, steps = times[order], steps[order]
+    level = np.cumsum(steps)
+    area = np.concatenate(([0.0], np.cumsum(level[:-1] * np.diff(times))))
+    edges = origin + BUCKET_SECONDS * np.arange(buckets + 1)
+    last = np.searchsorted(times, edges, side='right') - 1
+    at = last.clip(0)
+    integral = np.where(last >= 0, area[at] + level[at] * (edges - times[at]), 0.0)
+    return np.diff(integral)
+
+
+def _days(first_day, last_day):
+    return [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+
+
+def _locked_days(lot_id, days):
+    rows = db.session.query(LotOccupancyDay.id, LotOccupancyDay.day, LotOccupancyDay.buckets)\
+        .filter(LotOccupancyDay.lot_id == lot_id, LotOccupancyDay.day.in_(days)).with_for_update()
+    return {row.day: row for row in rows}
+
+
+def record_completed_occupancy(sessions):
+    """Adds completed sessions to their lots' occupancy rows, locking the
+    rows it changes."""
+    by_lot = {}
+    for session in sessions:
+        by_lot.setdefault(session.lot_id, []).append(session)
+    table = LotOccupancyDay.__table__
+    dialect_insert = _UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+
+    for lot_id, lot_sessions in by_lot.items():
+        starts = _seconds([s.entry_time for s in lot_sessions])
+        ends = _seconds([s.exit_time for s in lot_sessions])
+        first_day = min(s.entry_time for s in lot_sessions).date()
+        last_day = max(s.exit_time for s in lot_sessions).date()
+        days = _days(first_day, last_day)
+        values = occupied_seconds(starts, ends, _day_start(first_day), len(days) * BUCKETS_PER_DAY)\
+            .reshape(len(days), BUCKETS_PER_DAY)
+        touched = [(day, values[i]) for i, day in enumerate(days) if values[i].any()]
+        if not touched:
+            continue
+        # Usually already loaded by the caller, so no query.
+        capacity = db.session.get(ParkingLot, lot_id).capacity
+        existing = _locked_days(lot_id, [day for day, _ in touched])
+        missing = [day for day, _ in touched if day not in existing]
+        if missing and dialect_insert is not None:
+            # A concurrent writer may be creating the same rows; create them
+            # empty, then lock whichever rows won.
+            empty = _pack(np.zeros(BUCKETS_PER_DAY))
+            db.session.execute(dialect_insert(table).on_conflict_do_nothing(index_elements=['lot_id', 'day']),
+                               [{'lot_id': lot_id, 'day': day, 'capacity': capacity, 'buckets': empty}
+                                for day in missing])
+            existing.update(_locked_days(lot_id, missing))
+        for day, added in touched:
+            row = existing.get(day)
+            if row is None:
+                db.session.execute(insert(table).values(lot_id=lot_id, day=day, capacity=capacity, buckets=_pack(added)))
+            else:
+                db.session.execute(update(table).where(table.c.id == row.id)
+                                   .values(capacity=capacity, buckets=_pack(_unpack(row.buckets) + added)))
+
+
+def rebuild_occupancy(since=None, lot_ids=None, conn=None):
+    """Recomputes the occupancy rows of days on or after `since` (a date;
+    None rebuilds everything) from completed sessions, lot by lot.
+
+    Runs and commits on db.session, or inside the caller's transaction when
+    a connection is given (as schema migrations do)."""
+    executor = conn if conn is not None else db.session
+    lots = select(ParkingLot.id, ParkingLot.capacity)
+    if lot_ids is not None:
+        lots = lots.where(ParkingLot.id.in_(list(lot_ids)))
+    since_time = datetime.combine(since, datetime.min.time()) if since is not None else None
+
+    for lot_id, capacity in executor.execute(lots).all():
+        stale = delete(LotOccupancyDay).where(LotOccupancyDay.lot_id == lot_id)
+        sessions = select(ParkingSession.entry_time, ParkingSession.exit_time).where(
+            ParkingSession.lot_id == lot_id, ParkingSession.exit_time != None, ParkingSession.status == 'COMPLETED')
+        if since_time is not None:
+            stale = stale.where(LotOccupancyDay.day >= since)
+            sessions = sessions.where(ParkingSession.exit_time > since_time)
+        executor.execute(stale)
+        rows = executor.execute(sessions).all()
+        if not rows:
+            continue
+        starts = _seconds([r.entry_time for r in rows])
+        ends = _seconds([r.exit_time for r in rows])
+        first_day = since if since is not None else min(r.entry_time for r in rows).date()
+        last_day = max(r.exit_time for r in rows).date()
+        days = _days(first_day, last_day)
+        values = occupied_seconds(starts, ends, _day_start(first_day), len(days) * BUCKETS_PER_DAY)\
+            .reshape(len(days), BUCKETS_PER_DAY)
+        new_rows = [{'lot_id': lot_id, 'day': day, 'capacity': capacity, 'buckets': _pack(values[i])}
+                    for i, day in enumerate(days) if values[i].any()]
+        if new_rows:
+            executor.execute(insert(LotOccupancyDay), new_rows)
+    if conn is None:
+        db.session.commit()
+
+
+def rebuild_recent_occupancy(days):
+    rebuild_occupancy(since=(datetime.utcnow() - timedelta(days=days)).date())
+
+
+def occupancy_history(lot_id, first_day, last_day, now=None):
+    """(days, matrix) where matrix[i, j] is the average number of occupied
+    spots during bucket j of days[i], including vehicles still parked."""
+    now = now or datetime.utcnow()
+    days = _days(first_day, last_day)
+    index = {day: i for i, day in enumerate(days)}
+    matrix = np.zeros((len(days), BUCKETS_PER_DAY))
+    for day, blob in db.session.query(LotOccupancyDay.day, LotOccupancyDay.buckets).filter(
+            LotOccupancyDay.lot_id == lot_id, LotOccupancyDay.day >= first_day, LotOccupancyDay.day <= last_day):
+        matrix[index[day]] = _unpack(blob)
+
+    parked = [r.entry_time for r in db.session.query(ParkingSession.entry_time).filter(
+        ParkingSession.lot_id == lot_id, ParkingSession.exit_time == None)]
+    if parked:
+        live = occupied_seconds(_seconds(parked), np.full(len(parked), _seconds([now])[0]),
+                                _day_start(first_day), len(days) * BUCKETS_PER_DAY)
+        matrix += live.reshape(len(days), BUCKETS_PER_DAY)
+    return days, matrix / BUCKET_SECONDS
+
+
+def forecast_occupancy(lot, hours=24, weeks=4, now=None, occupied_now=None):
+    """Expected occupied spots in each bucket of the next `hours`, as a list
+    of (bucket start, expected occupied).
+
+    The baseline for a bucket is its mean over the same weekday of the last
+    `weeks` weeks (every past day when there are none). The gap between
+    occupied_now (lot.occupied_count when None) and the baseline for now
+    carries over and fades with FORECAST_DECAY_HOURS. The history counts
+    parked sessions only, so callers pass the parked count when spots are
+    held."""
+    now = now or datetime.utcnow()
+    if occupied_now is None:
+        occupied_now = lot.occupied_count
+    today = now.date()
+    days, history = occupancy_history(lot.id, today - timedelta(days=weeks * 7), today, now)
+    past = history[:-1]
+    weekdays = np.array([day.weekday() for day in days[:-1]])
+
+    def baseline(day, slot):
+        same = past[weekdays == day.weekday(), slot]
+        if len(same):
+            return same.mean()
+        return past[:, slot].mean() if len(past) else float(occupied_now)
+
+    midnight = datetime.combine(today, datetime.min.time())
+    slot_now = int((now - midnight).total_seconds() // BUCKET_SECONDS)
+    gap = occupied_now - baseline(today, slot_now)
+
+    forecast = []
+    for step in range(math.ceil(hours * 3600 / BUCKET_SECONDS)):
+        start = midnight + timedelta(seconds=(slot_now + step) * BUCKET_SECONDS)
+        slot = (slot_now + step) % BUCKETS_PER_DAY
+        expected = baseline(start.date(), slot) + gap * math.exp(-step * BUCKET_SECONDS / 3600 / FORECAST_DECAY_HOURS)
+        forecast.append((start, min(max(expected, 0.0), float(lot.capacity))))
+    return forecast
@@ -0,0 +1,110 @@
+"""Daily per-lot and per-user aggregates of completed sessions.
+
+record_completed_session adds one session to the rollups inside the
+transaction that completes it; rebuild_rollups recomputes them from the
+session table (backfill and drift repair). Sessions are bucketed by the
+day of their entry_time, matching the summaries' old month grouping.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, insert, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+from models import ParkingSession, LotDailyStat, UserDailyStat
+from utils.http_cache import bump_lot_versions, bump_sessions_versions
+
+_UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _add(model, keys, values):
+    table = model.__table__
+    dialect_insert = _UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+    if dialect_insert is not None:
+        stmt = dialect_insert(table).values(**keys, **values)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: table.c[name] + stmt.excluded[name] for name in values}
+        ))
+        return
+    updated = db.session.execute(
+        update(table)
+        .where(*[table.c[name] == value for name, value in keys.items()])
+        .values({name: table.c[name] + value for name, value in values.items()})
+    ).rowcount
+    if not updated:
+        db.session.execute(insert(table).values(**keys, **values))
+
+
+def record_completed_session(session):
+    record_completed_sessions([session])
+
+
+def record_completed_sessions(sessions):
+    """Adds completed sessions to the rollups, one upsert per affected row."""
+    lot_days = {}
+    user_days = {}
+    for session in sessions:
+        day = session.entry_time.date()
+        values = (1, session.amount_paid or 0.0, (session.exit_time - session.entry_time).total_seconds())
+        for totals, key in ((lot_days, (session.lot_id, day)), (user_days, (session.user_id, session.lot_id, day))):
+            current = totals.get(key, (0, 0.0, 0.0))
+            totals[key] = tuple(a + b for a, b in zip(current, values))
+    columns = ('sessions', 'revenue', 'duration_seconds')
+    for (lot_id, day), values in lot_days.items():
+        _add(LotDailyStat, {'lot_id': lot_id, 'day': day}, dict(zip(columns, values)))
+    for (user_id, lot_id, day), values in user_days.items():
+        _add(UserDailyStat, {'user_id': user_id, 'lot_id': lot_id, 'day': day}, dict(zip(columns, values)))
+
+
+def _duration_seconds(dialect):
+    entry, exit_ = ParkingSession.entry_time, ParkingSession.exit_time
+    if dialect == 'sqlite':
+        return (func.julianday(exit_) - func.julianday(entry)) * 86400
+    if dialect == 'mysql':
+        return func.timestampdiff(text('SECOND'), entry, exit_)
+    return func.extract('epoch', exit_ - entry)
+
+
+def rebuild_rollups(since=None, conn=None):
+    """Recomputes every rollup row for entry days on or after `since` (a
+    date; None rebuilds everything) from the completed sessions.
+
+    Runs and commits on db.session, or inside the caller's transaction when
+    a connection is given (as schema migrations do). On db.session it also
+    bumps the versions of the lots and users whose rollup rows it replaced,
+    which the summaries' ETags are read from (utils.http_cache)."""
+    executor = conn if conn is not None else db.session
+    dialect = (conn.dialect if conn is not None else db.session.get_bind().dialect).name
+    day = func.date(ParkingSession.entry_time)
+    completed = [ParkingSession.status == 'COMPLETED']
+    if since is not None:
+        completed.append(ParkingSession.entry_time >= datetime.combine(since, datetime.min.time()))
+
+    aggregates = (
+        func.count(ParkingSession.id),
+        func.coalesce(func.sum(ParkingSession.amount_paid), 0.0),
+        func.coalesce(func.sum(_duration_seconds(dialect)), 0.0),
+    )
+    columns = ['sessions', 'revenue', 'duration_seconds']
+    touched = {}
+
+    for model, keys, owner in ((LotDailyStat, [ParkingSession.lot_id], LotDailyStat.lot_id),
+                               (UserDailyStat, [ParkingSession.user_id, ParkingSession.lot_id], UserDailyStat.user_id)):
+        rebuilt = select(owner).distinct()
+        stale = delete(model)
+        if since is not None:
+            rebuilt = rebuilt.where(model.day >= since)
+            stale = stale.where(model.day >= since)
+        touched[model] = set(executor.execute(rebuilt).scalars())
+        executor.execute(stale)
+        source = select(*keys, day, *aggregates).where(*completed).group_by(*keys, day)
+        target = [k.key for k in keys] + ['day'] + columns
+        executor.execute(insert(model).from_select(target, source))
+        touched[model].update(executor.execute(rebuilt).scalars())
+    if conn is None:
+        bump_lot_versions(touched[LotDailyStat])
+        bump_sessions_versions(touched[UserDailyStat])
+        db.session.commit()
+
+
+def rebuild_recent_rollups(days):
+    rebuild_rollups(since=(datetime.utcnow() - timedelta(days=days)).date())
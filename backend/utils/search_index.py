@@ -0,0 +1,121 @@
+"""Substring search backed by SQLite FTS5 trigram indexes.
+
+Each searchable table has an FTS5 shadow table whose rowid is the source
+row id. Triggers on the source tables keep the shadows in sync for every
+insert, update and delete, including bulk statements and other processes.
+On databases without FTS5 (or for queries shorter than one trigram)
+search_ids returns None and callers fall back to LIKE.
+"""
+from sqlalchemy import text, column, func, or_
+from extensions import db
+
+MIN_QUERY_LENGTH = 3
+
+# name -> (source table, FTS columns, column values, row filter, columns searched by default).
+# {r} stands for the source row alias.
+INDEXES = {
+    'search_users': ('user', 'username, email', "{r}.username, {r}.email", None, 'username email'),
+    'search_lots': ('parking_lot', 'name, location', "{r}.name, {r}.location", None, 'name location'),
+    'search_spots': ('parking_spot', 'spot_number', "{r}.spot_number", "{r}.is_active", 'spot_number'),
+    'search_sessions': ('parking_session', 'vehicle_number, owner', "{r}.vehicle_number, '<' || {r}.user_id || '>'",
+                        None, 'vehicle_number'),
+}
+
+# Source columns whose change has to be reflected in the index.
+WATCHED_COLUMNS = {
+    'search_users': 'username, email',
+    'search_lots': 'name, location',
+    'search_spots': 'spot_number, is_active',
+    'search_sessions': 'vehicle_number, user_id',
+}
+
+_ready = {}
+
+
+def fts_supported(conn):
+    if conn.dialect.name != 'sqlite':
+        return False
+    try:
+        conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts_probe USING fts5(x, tokenize='trigram')"))
+        conn.execute(text("DROP TABLE temp.fts_probe"))
+        return True
+    except Exception:
+        return False
+
+
+def install_search_index(conn):
+    """Creates the FTS tables and triggers and indexes existing rows. Safe to
+    run again: it rebuilds every index from scratch."""
+    if not fts_supported(conn):
+        return False
+    for name, (source, columns, values, condition, _) in INDEXES.items():
+        src = f'"{source}"'
+        where_new = f" WHERE {condition.format(r='new')}" if condition else ''
+        where_src = f" WHERE {condition.format(r=src)}" if condition else ''
+        insert_new = f"INSERT INTO {name}(rowid, {columns}) SELECT new.id, {values.format(r='new')}{where_new};"
+        for suffix in ('ai', 'au', 'ad'):
+            conn.execute(text(f'DROP TRIGGER IF EXISTS {name}_{suffix}'))
+        conn.execute(text(f'DROP TABLE IF EXISTS {name}'))
+        conn.execute(text(f"CREATE VIRTUAL TABLE {name} USING fts5({columns}, tokenize='trigram')"))
+        conn.execute(text(f'CREATE TRIGGER {name}_ai AFTER INSERT ON {src} BEGIN {insert_new} END'))
+        conn.execute(text(
+            f'CREATE TRIGGER {name}_au AFTER UPDATE OF {WATCHED_COLUMNS[name]} ON {src} BEGIN '
+            f'DELETE FROM {name} WHERE rowid = old.id; {insert_new} END'
+        ))
+        conn.execute(text(f'CREATE TRIGGER {name}_ad AFTER DELETE ON {src} BEGIN DELETE FROM {name} WHERE rowid = old.id; END'))
+        conn.execute(text(f'INSERT INTO {name}(rowid, {columns}) SELECT {src}.id, {values.format(r=src)} FROM {src}{where_src}'))
+    _ready.clear()
+    return True
+
+
+def _index_ready():
+    engine = db.engine
+    if engine not in _ready:
+        with engine.connect() as conn:
+            _ready[engine] = conn.dialect.name == 'sqlite' and conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'search_sessions'")
+            ).first() is not None
+    return _ready[engine]
+
+
+def _phrase(value):
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _match_expression(index, query, columns=None, owner_id=None):
+    match = f'{{{columns or INDEXES[index][4]}}} : {_phrase(query)}'
+    if owner_id is not None:
+        match += f' AND owner : {_phrase(f"<{owner_id}>")}'
+    return match
+
+
+def match_subquery(index, query, columns=None, owner_id=None):
+    """A SELECT of the matching source-row ids, for use in column.in_(), or
+    None when the index cannot answer and the caller should use LIKE instead."""
+    if len(query) < MIN_QUERY_LENGTH or not _index_ready():
+        return None
+    return text(f'SELECT rowid FROM {index} WHERE {index} MATCH :match_{index}')\
+        .bindparams(**{f'match_{index}': _match_expression(index, query, columns, owner_id)})\
+        .columns(column('rowid'))
+
+
+def search_ids(index, query, limit, offset=0, columns=None):
+    """Ids of the source rows of `index` containing `query`, best match
+    first, or None when the caller should use LIKE instead."""
+    if len(query) < MIN_QUERY_LENGTH or not _index_ready():
+        return None
+    sql = f'SELECT rowid FROM {index} WHERE {index} MATCH :match ORDER BY rank LIMIT :limit OFFSET :offset'
+    params = {'match': _match_expression(index, query, columns), 'limit': limit, 'offset': offset}
+    return [r[0] for r in db.session.execute(text(sql), params)]
+
+
+def ranked_search(model, index, like_columns, query, limit, offset=0, filters=()):
+    """Rows of model whose like_columns contain query: ranked from the FTS
+    index when it is available, otherwise by id through a LIKE scan."""
+    ids = search_ids(index, query, limit, offset)
+    if ids is None:
+        term = f'%{query}%'
+        return model.query.filter(*filters, or_(*[func.lower(c).like(term) for c in like_columns]))\
+            .order_by(model.id).limit(limit).offset(offset).all()
+    rows = {r.id: r for r in model.query.filter(model.id.in_(ids))} if ids else {}
+    return [rows[i] for i in ids if i in rows]
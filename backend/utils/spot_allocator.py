@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import Counter
+from sqlalchemy import update
+from extensions import db
+from models import ParkingLot, ParkingSpot
+
+
+class SpotAllocator:
+    """Per-lot free lists of spot ids, kept in memory so parking never scans
+    the spot table. The database stays the source of truth: every spot handed
+    out here is still claimed with a conditional UPDATE (see claim_spot), so a
+    stale list in one worker can never double-book a spot taken by another.
+
+    A lot's list is loaded the first time a spot is wanted from it, so
+    processes that never park (Celery workers, beat) never load any. A lot
+    found full in the database is marked full for SPOT_ALLOCATOR_FULL_TTL
+    seconds unless this process frees or adds one of its spots. While it is
+    marked, an attempt to park only checks for any free spot with one
+    indexed LIMIT 1 query instead of reloading the list, and reloads only
+    when another worker has freed or added one."""
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._free = {}
+        self._full_until = {}
+        self.full_ttl = 2.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['spot_allocator'] = self
+        self.full_ttl = app.config.get('SPOT_ALLOCATOR_FULL_TTL', self.full_ttl)
+
+    def load_all(self):
+        rows = db.session.query(ParkingSpot.lot_id, ParkingSpot.id)\
+            .filter(ParkingSpot.is_occupied == False, ParkingSpot.is_active == True)\
+            .order_by(ParkingSpot.lot_id, ParkingSpot.id.desc()).all()
+        free = {}
+        for lot_id, spot_id in rows:
+            free.setdefault(lot_id, {})[spot_id] = None
+        with self._lock:
+            self._free = free
+            self._full_until.clear()
+
+    def reload(self, lot_id):
+        # Ids are inserted highest first so popitem() hands out the lowest free spot.
+        rows = db.session.query(ParkingSpot.id)\
+            .filter(ParkingSpot.lot_id == lot_id, ParkingSpot.is_occupied == False, ParkingSpot.is_active == True)\
+            .order_by(ParkingSpot.id.desc()).all()
+        with self._lock:
+            self._free[lot_id] = dict.fromkeys(r.id for r in rows)
+            if rows:
+                self._full_until.pop(lot_id, None)
+            else:
+                self._full_until[lot_id] = time.monotonic() + self.full_ttl
+
+    def acquire(self, lot_id):
+        with self._lock:
+            free = self._free.get(lot_id)
+            if free:
+                return free.popitem()[0]
+            marked_full = self._full_until.get(lot_id, 0) > time.monotonic()
+        if marked_full and not _has_free_spot(lot_id):
+            return None
+        # Empty or unknown here does not mean full: another worker may have
+        # freed spots or created the lot, so refresh once from the database.
+        self.reload(lot_id)
+        with self._lock:
+            free = self._free.get(lot_id)
+            return free.popitem()[0] if free else None
+
+    def release(self, lot_id, spot_id):
+        with self._lock:
+            self._full_until.pop(lot_id, None)
+            # A lot not loaded yet picks the spot up when it is.
+            free = self._free.get(lot_id)
+            if free is not None:
+                free[spot_id] = None
+
+    def add_spots(self, lot_id, spot_ids):
+        with self._lock:
+            self._full_until.pop(lot_id, None)
+            free = self._free.setdefault(lot_id, {})
+            for spot_id in sorted(spot_ids, reverse=True):
+                free[spot_id] = None
+
+    def remove_spots(self, lot_id, spot_ids):
+        with self._lock:
+            free = self._free.get(lot_id, {})
+            for spot_id in spot_ids:
+                free.pop(spot_id, None)
+
+    def drop_lot(self, lot_id):
+        with self._lock:
+            self._free.pop(lot_id, None)
+            self._full_until.pop(lot_id, None)
+
+    def free_count(self, lot_id):
+        with self._lock:
+            return len(self._free.get(lot_id, ()))
+
+
+def _has_free_spot(lot_id):
+    # Answered from ix_parking_spot_lot_occupied without reading the lot's spots.
+    return db.session.query(ParkingSpot.id)\
+        .filter(ParkingSpot.lot_id == lot_id, ParkingSpot.is_occupied == False, ParkingSpot.is_active == True)\
+        .limit(1).first() is not None
+
+
+spot_allocator = SpotAllocator()
+
+
+def claim_spot(lot_id):
+    """Takes a free spot in lot_id inside the current transaction.
+
+    Returns the ParkingSpot marked occupied, or None when the lot is full.
+    The caller must commit, or call spot_allocator.release on rollback."""
+    spots = claim_spots(lot_id, 1)
+    return spots[0] if spots else None
+
+
+def claim_spots(lot_id, count):
+    """claim_spot for up to `count` spots of one lot, with a single counter
+    update and a single load of the claimed rows. Returns fewer spots than
+    asked for when the lot fills up."""
+    claimed = []
+    while len(claimed) < count:
+        spot_id = spot_allocator.acquire(lot_id)
+        if spot_id is None:
+            break
+        if db.session.execute(
+            update(ParkingSpot)
+            .where(ParkingSpot.id == spot_id, ParkingSpot.is_occupied == False, ParkingSpot.is_active == True)
+            .values(is_occupied=True)
+            .execution_options(synchronize_session=False)
+        ).rowcount:
+            claimed.append(spot_id)
+    if not claimed:
+        return []
+    bump_occupied(lot_id, len(claimed))
+    spots = {s.id: s for s in ParkingSpot.query.filter(ParkingSpot.id.in_(claimed)).populate_existing()}
+    return [spots[spot_id] for spot_id in claimed]
+
+
+def free_spot(spot):
+    """Marks spot free inside the current transaction. The caller must call
+    spot_allocator.release once the transaction has committed."""
+    free_spots([spot])
+
+
+def free_spots(spots):
+    per_lot = Counter()
+    for spot in spots:
+        spot.is_occupied = False
+        spot.current_session_id = None
+        per_lot[spot.lot_id] += 1
+    for lot_id, count in per_lot.items():
+        bump_occupied(lot_id, -count)
+
+
+def bump_occupied(lot_id, delta):
+    # Increment in SQL so concurrent parks never lose an update to ParkingLot.occupied_count.
+    # Every occupancy change goes through here, so it also bumps the lot's version.
+    db.session.execute(
+        update(ParkingLot)
+        .where(ParkingLot.id == lot_id)
+        .values(occupied_count=ParkingLot.occupied_count + delta, version=ParkingLot.version + 1)
+        .execution_options(synchronize_session=False)
+    )
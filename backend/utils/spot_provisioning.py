@@ -0,0 +1,67 @@
+from sqlalchemy import insert, update, func
+from extensions import db
+from models import ParkingSpot
+from utils.spot_allocator import spot_allocator
+
+INSERT_CHUNK = 5000
+
+
+class CapacityError(ValueError):
+    pass
+
+
+def provision_spots(lot_id, count, first_number=1):
+    """Bulk-inserts count free spots numbered SPOT-<first_number>... in
+    executemany chunks instead of one ORM object per spot."""
+    end = first_number + count
+    for start in range(first_number, end, INSERT_CHUNK):
+        db.session.execute(insert(ParkingSpot), [{
+            'lot_id': lot_id,
+            'spot_number': f"SPOT-{i}",
+            'is_occupied': False,
+            'is_active': True
+        } for i in range(start, min(start + INSERT_CHUNK, end))])
+
+
+def resize_lot(lot, capacity):
+    """Grows or shrinks lot to capacity inside the current transaction.
+
+    Growing re-activates retired spots before numbering new ones. Shrinking
+    retires free spots, highest numbered first, and never touches an occupied
+    one; spots are retired rather than deleted so past sessions keep their
+    spot. Raises CapacityError if there are not enough free spots to retire.
+    The caller commits, then calls spot_allocator.reload(lot.id)."""
+    active = ParkingSpot.query.filter_by(lot_id=lot.id, is_active=True).count()
+    delta = capacity - active
+
+    if delta > 0:
+        retired = [r.id for r in db.session.query(ParkingSpot.id)
+                   .filter_by(lot_id=lot.id, is_active=False)
+                   .order_by(ParkingSpot.id).limit(delta)]
+        if retired:
+            db.session.execute(update(ParkingSpot).where(ParkingSpot.id.in_(retired))
+                               .values(is_active=True).execution_options(synchronize_session=False))
+        remaining = delta - len(retired)
+        if remaining:
+            total = db.session.query(func.count(ParkingSpot.id)).filter_by(lot_id=lot.id).scalar()
+            provision_spots(lot.id, remaining, first_number=total + 1)
+
+    elif delta < 0:
+        free = [r.id for r in db.session.query(ParkingSpot.id)
+                .filter_by(lot_id=lot.id, is_active=True, is_occupied=False)
+                .order_by(ParkingSpot.id.desc()).limit(-delta)]
+        if len(free) < -delta:
+            raise CapacityError(f'Only {len(free)} free spots can be removed; {active - len(free)} are occupied.')
+        # Take the spots out of the allocator first so they are not handed out
+        # mid-resize; the conditional UPDATE still wins against a concurrent park.
+        spot_allocator.remove_spots(lot.id, free)
+        retired = db.session.execute(
+            update(ParkingSpot)
+            .where(ParkingSpot.id.in_(free), ParkingSpot.is_occupied == False)
+            .values(is_active=False)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if retired != len(free):
+            raise CapacityError('Spots were taken while resizing; try again.')
+
+    lot.capacity = capacity
@@ -0,0 +1,9 @@
+"""Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+app.py's __main__ block is the single-process development server.
+"""
+from app import create_app
+
+app = create_app()
@@ -0,0 +1,55 @@
+import api from '@/axios';
+
+const RETRY_MS = 5000;
+
+// Opens the occupancy event stream and calls handlers[eventName](data) for
+// 'spot', 'lot' and 'resync' events. Returns a function that closes it.
+//
+// EventSource cannot send the Authorization header, so each connection asks
+// for a short-lived stream token and puts that in the URL instead of the
+// login token. The browser retries a dropped stream with the same URL; once
+// that token has expired the retry is refused, and a new one is opened here.
+export function subscribeOccupancy(handlers, lotId = null) {
+  if (typeof EventSource === 'undefined') return () => {};
+  let source = null;
+  let retry = null;
+  let closed = false;
+  let reopened = false;
+
+  const open = async () => {
+    let token;
+    try {
+      token = (await api.post('/events/token')).data.stream_token;
+    } catch (e) {
+      // Logged out, or the API is down: try again later unless refused.
+      if (!closed && e.response?.status !== 401) retry = setTimeout(open, RETRY_MS);
+      return;
+    }
+    if (closed) return;
+
+    const params = new URLSearchParams({ stream_token: token });
+    if (lotId) params.set('lot_id', lotId);
+    source = new EventSource(`${api.defaults.baseURL}/events/occupancy?${params}`);
+    for (const name of ['spot', 'lot', 'resync']) {
+      if (!handlers[name]) continue;
+      source.addEventListener(name, (e) => handlers[name](JSON.parse(e.data)));
+    }
+    // Events sent while no stream was open are lost; re-fetch like on 'resync'.
+    source.onopen = () => {
+      if (reopened && handlers.resync) handlers.resync({});
+    };
+    source.onerror = () => {
+      if (closed || source.readyState !== EventSource.CLOSED) return;
+      source = null;
+      reopened = true;
+      retry = setTimeout(open, RETRY_MS);
+    };
+  };
+
+  open();
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    if (source) source.close();
+  };
+}